@@ -0,0 +1,315 @@
+"""Asyncio (ASGI) variant of the prediction API.
+
+Same routes and JSON as the Flask services (/, /predict, /predict_batch,
+/status, /metrics and the /models/<name>/... routes), but nothing blocks the
+event loop:
+
+  - uploads are received and parsed asynchronously, so slow or idle clients
+    only cost a socket, not a thread
+  - cache lookup and image decode run on a thread pool
+  - the forward pass runs on the model's batch scheduler thread, awaited
+    through its Future; the images of a /predict_batch request are submitted
+    together, so the scheduler batches them
+
+Detections are built by the same crop/cattle rule modules as the Flask apps.
+
+    python asgi_app.py                 # multi-model API on :5000
+    python asgi_app.py crop            # crop service on :5001
+    uvicorn asgi_app:build_app --factory --port 5000
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from batch_predict import DECODE_WORKERS, MAX_IMAGES_PER_REQUEST
+from metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from model_registry import MODEL_SPECS, ModelRegistry
+from server import SERVER_HOST, SERVER_PORT, allowed_file
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Which API build_app() serves: "all" (multi-model) or one model's legacy routes
+ASGI_SERVICE = os.environ.get("ASGI_SERVICE", "all")
+
+# Cache lookups and decodes; forwards run on each model's scheduler thread
+_decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="asgi-decode")
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def lookup_or_decode(served, image_bytes):
+    """Return (cache_key, probabilities, None) on a cache hit, else (cache_key, None, tensor)"""
+    key, probabilities = served.cached_probabilities(image_bytes)
+    if probabilities is not None:
+        return key, probabilities, None
+    return key, None, served.preprocess(image_bytes)
+
+async def predict_async(served, image_bytes):
+    """Return (predicted_class, confidence) without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    key, probabilities, tensor = await loop.run_in_executor(_decode_pool, lookup_or_decode, served, image_bytes)
+    return await forward_async(served, key, probabilities, tensor)
+
+async def forward_async(served, key, probabilities, tensor):
+    """(predicted_class, confidence) from a cache hit, or from the scheduler for a decoded tensor"""
+    if probabilities is None:
+        probabilities = await asyncio.wrap_future(served.scheduler.submit(tensor))
+        served.cache.put(key, probabilities)
+    return served.top_prediction(probabilities)
+
+async def batch_entry(served, filename, image_bytes):
+    """One /predict_batch result, shaped like the Flask handler's"""
+    if image_bytes is None:
+        return {"success": False, "filename": filename, "message": "Invalid file type. Only PNG, JPG, JPEG, GIF allowed."}
+    loop = asyncio.get_running_loop()
+    try:
+        key, probabilities, tensor = await loop.run_in_executor(_decode_pool, lookup_or_decode, served, image_bytes)
+    except Exception as e:
+        return {"success": False, "filename": filename, "message": f"Could not read image: {str(e)}"}
+
+    predicted_class, confidence = await forward_async(served, key, probabilities, tensor)
+    message, detection = served.spec.rules.build_detection(predicted_class, confidence)
+    return {"success": True, "filename": filename, "message": message, "detection": detection}
+
+def model_not_found(name):
+    return JSONResponse({
+        "success": False,
+        "message": f"Unknown model '{name}'."
+    }, status_code=404)
+
+async def predict_response(served, request):
+    if not served.loaded:
+        return JSONResponse({
+            "success": False,
+            "message": "Model is not loaded. Check model file path and class data."
+        }, status_code=503)
+
+    upload_start = time.perf_counter()
+    async with request.form() as form:
+        file = form.get("image")
+        if file is None or isinstance(file, str):
+            return JSONResponse({
+                "success": False,
+                "message": "No image file uploaded"
+            }, status_code=400)
+
+        image_type = form.get("imageType", served.spec.image_type)
+
+        if file.filename and allowed_file(file.filename):
+            try:
+                image_bytes = await file.read()
+                served.metrics.observe("upload", time.perf_counter() - upload_start)
+                predicted_class, confidence = await predict_async(served, image_bytes)
+                message, detection = served.spec.rules.build_detection(predicted_class, confidence)
+
+                with served.metrics.time("serialize"):
+                    return JSONResponse({
+                        "success": True,
+                        "message": message,
+                        "filename": file.filename,
+                        "imageType": image_type,
+                        "detection": detection
+                    })
+
+            except Exception as e:
+                print(f"Prediction error: {e}")
+                served.metrics.count_error("prediction")
+                return JSONResponse({
+                    "success": False,
+                    "message": f"Prediction error: {str(e)}"
+                }, status_code=500)
+
+        else:
+            return JSONResponse({
+                "success": False,
+                "message": "Invalid file type. Only PNG, JPG, JPEG, GIF allowed."
+            }, status_code=400)
+
+async def predict_batch_response(served, request):
+    if not served.loaded:
+        return JSONResponse({
+            "success": False,
+            "message": "Model is not loaded. Check model file path and class data."
+        }, status_code=503)
+
+    upload_start = time.perf_counter()
+    async with request.form() as form:
+        files = [file for file in form.getlist("images") + form.getlist("image") if not isinstance(file, str)]
+        if not files:
+            return JSONResponse({
+                "success": False,
+                "message": "No image files uploaded. Use one or more 'images' fields."
+            }, status_code=400)
+
+        if len(files) > MAX_IMAGES_PER_REQUEST:
+            return JSONResponse({
+                "success": False,
+                "message": f"Too many images: {len(files)} uploaded, at most {MAX_IMAGES_PER_REQUEST} allowed."
+            }, status_code=413)
+
+        uploads = [await file.read() if file.filename and allowed_file(file.filename) else None for file in files]
+        served.metrics.observe("upload", time.perf_counter() - upload_start)
+
+        try:
+            results = await asyncio.gather(*[
+                batch_entry(served, file.filename, image_bytes) for file, image_bytes in zip(files, uploads)
+            ])
+        except Exception as e:
+            print(f"Batch prediction error: {e}")
+            served.metrics.count_error("forward")
+            return JSONResponse({
+                "success": False,
+                "message": f"Prediction error: {str(e)}"
+            }, status_code=500)
+
+    with served.metrics.time("serialize"):
+        return JSONResponse({
+            "success": True,
+            "count": len(results),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "results": results
+        })
+
+async def instrumented(served, route, handler):
+    """Await a route handler, recording its duration and status in the model's metrics"""
+    start = time.perf_counter()
+    response = await handler()
+    served.metrics.observe_request(route, response.status_code, time.perf_counter() - start)
+    return response
+
+def home_response(served):
+    return JSONResponse({
+        "success": True,
+        "message": f"{served.spec.display_name} Disease Detection API is running!",
+        "model_status": "Loaded" if served.loaded else "Not Loaded",
+        "classes_loaded": len(served.class_names),
+        "api_port": served.spec.legacy_port
+    })
+
+def status_response(served):
+    return JSONResponse({"success": True, **served.status()})
+
+# ====================================================================
+# APP FACTORY
+# ====================================================================
+
+def create_asgi_app(registry, legacy_model=None):
+    """ASGI counterpart of server.create_app()"""
+
+    async def list_models(request):
+        return JSONResponse({
+            "success": True,
+            "models": {name: served.status() for name, served in registry.models.items()}
+        })
+
+    async def model_predict(request):
+        served = registry.get(request.path_params["name"])
+        if not served:
+            return model_not_found(request.path_params["name"])
+        return await instrumented(served, "predict", lambda: predict_response(served, request))
+
+    async def model_predict_batch(request):
+        served = registry.get(request.path_params["name"])
+        if not served:
+            return model_not_found(request.path_params["name"])
+        return await instrumented(served, "predict_batch", lambda: predict_batch_response(served, request))
+
+    async def model_status(request):
+        served = registry.get(request.path_params["name"])
+        return status_response(served) if served else model_not_found(request.path_params["name"])
+
+    async def metrics(request):
+        return Response(render_prometheus(registry), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    routes = [
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/models", list_models, methods=["GET"]),
+        Route("/models/{name}/predict", model_predict, methods=["POST"]),
+        Route("/models/{name}/predict_batch", model_predict_batch, methods=["POST"]),
+        Route("/models/{name}/status", model_status, methods=["GET"]),
+    ]
+
+    if legacy_model is None:
+        async def home(request):
+            return JSONResponse({
+                "success": True,
+                "message": "Agri ML inference server is running!",
+                "models": registry.names()
+            })
+
+        routes += [
+            Route("/", home),
+            Route("/status", list_models, methods=["GET"]),
+        ]
+    else:
+        served = registry.get(legacy_model)
+
+        async def home(request):
+            return home_response(served)
+
+        async def predict(request):
+            return await instrumented(served, "predict", lambda: predict_response(served, request))
+
+        async def predict_batch(request):
+            return await instrumented(served, "predict_batch", lambda: predict_batch_response(served, request))
+
+        async def status(request):
+            return status_response(served)
+
+        routes += [
+            Route("/", home),
+            Route("/predict", predict, methods=["POST"]),
+            Route("/predict_batch", predict_batch, methods=["POST"]),
+            Route("/status", status, methods=["GET"]),
+        ]
+
+    middleware = [Middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_headers=["Content-Type", "Authorization"],
+        allow_methods=["GET", "PUT", "POST", "DELETE", "OPTIONS"]
+    )]
+    return Starlette(routes=routes, middleware=middleware)
+
+def build_app(service=None):
+    """Load the models for a service and return its ASGI app (uvicorn --factory entry point)"""
+    service = service or ASGI_SERVICE
+    if service == "all":
+        return create_asgi_app(ModelRegistry())
+    return create_asgi_app(ModelRegistry([service]), legacy_model=service)
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("service", nargs="?", default=ASGI_SERVICE, choices=["all"] + sorted(MODEL_SPECS.keys()))
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, help="Defaults to 5000, or the model's legacy port")
+    args = parser.parse_args()
+
+    port = args.port or (SERVER_PORT if args.service == "all" else MODEL_SPECS[args.service].legacy_port)
+    print(f"🚀 Async ML API ({args.service}) starting on http://{args.host}:{port}")
+    uvicorn.run(build_app(args.service), host=args.host, port=port)
+
+if __name__ == "__main__":
+    main()
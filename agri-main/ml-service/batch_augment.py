@@ -0,0 +1,149 @@
+"""Batched training augmentation on uint8 tensors, after collation.
+
+The per-image train transform (RandomResizedCrop, RandomHorizontalFlip,
+ToTensor, Normalize on full-resolution PIL images) runs in the DataLoader
+workers and is what the model waits for. With BATCH_AUGMENT=1 the workers
+only produce a fixed BATCH_INPUT_SIZE square of uint8 pixels: a
+DCT-scaled JPEG decode, a resize of the short side and a center crop. The
+collated batch goes to the training device, and BatchAugment does the
+rest for the whole batch at once:
+
+  train  per-image RandomResizedCrop boxes (torchvision's sampling) and
+         horizontal flips, resampled to crop_size with one affine_grid +
+         grid_sample call, then normalization
+  val    CenterCrop(crop_size) by slicing, then normalization
+
+The random crop is drawn from the centered square rather than the whole
+photo, and the resize is bilinear without antialiasing (the crops are at
+most 256 -> 224).
+
+    python benchmark_augmentation.py   # loader-only and loader + model throughput
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import math
+import os
+
+import torch
+import torch.nn.functional as F
+from torchvision import transforms
+
+from preprocessing import FastPreprocessor, CROP_SIZE, RESIZE_SIZE, IMAGENET_MEAN, IMAGENET_STD
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BATCH_AUGMENT = os.environ.get("BATCH_AUGMENT", "0") == "1"
+
+# Side of the uint8 squares the workers produce
+BATCH_INPUT_SIZE = RESIZE_SIZE
+
+# RandomResizedCrop defaults
+CROP_SCALE = (0.08, 1.0)
+CROP_RATIO = (3 / 4, 4 / 3)
+CROP_ATTEMPTS = 10
+
+# ====================================================================
+# WORKER SIDE: FIXED-SIZE UINT8 INPUTS
+# ====================================================================
+
+_decoder = None
+
+def load_batch_input(path):
+    """Loader for the workers: DCT-scaled decode to a BATCH_INPUT_SIZE short side"""
+    global _decoder
+    if _decoder is None:
+        _decoder = FastPreprocessor(resize_size=BATCH_INPUT_SIZE, crop_size=BATCH_INPUT_SIZE, draft=True,
+                                    flatten_alpha=True)
+    with open(path, "rb") as f:
+        return _decoder.decode(f.read())
+
+def batch_input_transform(short_side=BATCH_INPUT_SIZE, tensor_input=False):
+    """Per-image transform to a uint8 CHW BATCH_INPUT_SIZE square.
+
+    For PIL images from load_batch_input, or uint8 tensors (tensor_input)
+    from CachedImageDataset with the given short side.
+    """
+    steps = [] if short_side == BATCH_INPUT_SIZE else [transforms.Resize(BATCH_INPUT_SIZE, antialias=True)]
+    steps.append(transforms.CenterCrop(BATCH_INPUT_SIZE))
+    if not tensor_input:
+        steps.append(transforms.PILToTensor())
+    return transforms.Compose(steps)
+
+# ====================================================================
+# DEVICE SIDE: BATCHED AUGMENTATION
+# ====================================================================
+
+class BatchAugment:
+    """Crop, flip and normalize a uint8 (N, C, H, W) batch on its own device"""
+
+    def __init__(self, crop_size=CROP_SIZE, mean=IMAGENET_MEAN, std=IMAGENET_STD,
+                 scale=CROP_SCALE, ratio=CROP_RATIO, flip_probability=0.5):
+        self.crop_size = crop_size
+        self.mean = torch.tensor(mean).view(1, -1, 1, 1) * 255
+        self.std = torch.tensor(std).view(1, -1, 1, 1) * 255
+        self.scale = scale
+        self.ratio = ratio
+        self.flip_probability = flip_probability
+
+    def crop_boxes(self, count, height, width, device):
+        """(top, left, crop height, crop width) float tensors, sampled like RandomResizedCrop.get_params"""
+        area = height * width
+        shape = (count, CROP_ATTEMPTS)
+        target_area = area * torch.empty(shape, device=device).uniform_(*self.scale)
+        log_ratio = torch.empty(shape, device=device).uniform_(math.log(self.ratio[0]), math.log(self.ratio[1]))
+        aspect = torch.exp(log_ratio)
+        crop_width = torch.sqrt(target_area * aspect).round()
+        crop_height = torch.sqrt(target_area / aspect).round()
+        valid = (crop_width > 0) & (crop_width <= width) & (crop_height > 0) & (crop_height <= height)
+
+        # First valid attempt per image; torchvision's fallback (whole image within the ratio bounds) otherwise
+        attempt = valid.int().argmax(dim=1, keepdim=True)
+        crop_width = crop_width.gather(1, attempt).squeeze(1)
+        crop_height = crop_height.gather(1, attempt).squeeze(1)
+        found = valid.any(dim=1)
+        if not found.all():
+            fallback_width, fallback_height = float(width), float(height)
+            if width / height < self.ratio[0]:
+                fallback_height = float(round(width / self.ratio[0]))
+            elif width / height > self.ratio[1]:
+                fallback_width = float(round(height * self.ratio[1]))
+            crop_width = torch.where(found, crop_width, torch.full_like(crop_width, fallback_width))
+            crop_height = torch.where(found, crop_height, torch.full_like(crop_height, fallback_height))
+
+        top = (torch.rand(count, device=device) * (height - crop_height + 1)).floor()
+        left = (torch.rand(count, device=device) * (width - crop_width + 1)).floor()
+        return top, left, crop_height, crop_width
+
+    def train_crops(self, images):
+        count, _, height, width = images.shape
+        top, left, crop_height, crop_width = self.crop_boxes(count, height, width, images.device)
+        flip = torch.rand(count, device=images.device) < self.flip_probability
+
+        # Map the output grid ([-1, 1] both ways) onto each crop box; a negative x scale flips it
+        theta = torch.zeros(count, 2, 3, device=images.device)
+        theta[:, 0, 0] = torch.where(flip, -crop_width, crop_width) / width
+        theta[:, 0, 2] = (2 * left + crop_width) / width - 1
+        theta[:, 1, 1] = crop_height / height
+        theta[:, 1, 2] = (2 * top + crop_height) / height - 1
+
+        size = (count, images.shape[1], self.crop_size, self.crop_size)
+        grid = F.affine_grid(theta, size, align_corners=False)
+        return F.grid_sample(images.float(), grid, mode="bilinear", padding_mode="border", align_corners=False)
+
+    def center_crops(self, images):
+        height, width = images.shape[-2:]
+        top = int(round((height - self.crop_size) / 2.0))
+        left = int(round((width - self.crop_size) / 2.0))
+        return images[..., top:top + self.crop_size, left:left + self.crop_size].float()
+
+    def __call__(self, images, train=True):
+        """Float32 normalized (N, C, crop_size, crop_size) batch from uint8 images"""
+        crops = self.train_crops(images) if train else self.center_crops(images)
+        if self.mean.device != crops.device:
+            self.mean, self.std = self.mean.to(crops.device), self.std.to(crops.device)
+        return (crops - self.mean) / self.std
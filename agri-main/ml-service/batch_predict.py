@@ -0,0 +1,156 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+
+import torch
+
+from cpu_tuning import inference_context
+from model_registry import device
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Upper bound on images accepted by one /predict_batch request
+MAX_IMAGES_PER_REQUEST = int(os.environ.get("MAX_IMAGES_PER_REQUEST", 64))
+# Images per forward pass; larger requests are run in several chunks
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 32))
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", min(8, os.cpu_count() or 1)))
+
+# PIL releases the GIL while decoding, so a thread pool decodes in parallel
+_decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def decode_images(images, preprocess):
+    """Decode and transform encoded images in parallel.
+
+    Returns a list of (tensor, error) pairs in input order; exactly one of
+    the two is None for each image.
+    """
+    pending = [_decode_pool.submit(preprocess, image_bytes) for image_bytes in images]
+
+    decoded = []
+    for future in pending:
+        try:
+            decoded.append((future.result(), None))
+        except Exception as e:
+            decoded.append((None, f"Could not read image: {str(e)}"))
+    return decoded
+
+def run_batch(model, inputs, device, chunk_size=BATCH_CHUNK_SIZE, forward_slots=None, metrics=None):
+    """Run a list of CHW tensors through the model, returning softmax probabilities."""
+    slots = forward_slots if forward_slots is not None else contextlib.nullcontext()
+    probabilities = []
+    for start in range(0, len(inputs), chunk_size):
+        forward_start = time.perf_counter()
+        batch = torch.stack(inputs[start:start + chunk_size]).to(device)
+        with slots, inference_context():
+            outputs = model(batch)
+            probabilities.append(torch.nn.functional.softmax(outputs, dim=1).cpu())
+        if metrics is not None:
+            metrics.observe_batch(len(batch), time.perf_counter() - forward_start)
+    return torch.cat(probabilities)
+
+def predict_batch_response(request, served, allowed_file):
+    """Shared /predict_batch handler for every served model.
+
+    Per-image results are built with the model's own `build_detection`
+    rule, so each entry matches the `detection` object of /predict.
+    """
+    if not served.loaded:
+        return jsonify({
+            "success": False,
+            "message": "Model is not loaded. Check model file path and class data."
+        }), 503
+
+    upload_start = time.perf_counter()
+    files = request.files.getlist("images") + request.files.getlist("image")
+    if not files:
+        return jsonify({
+            "success": False,
+            "message": "No image files uploaded. Use one or more 'images' fields."
+        }), 400
+
+    if len(files) > MAX_IMAGES_PER_REQUEST:
+        return jsonify({
+            "success": False,
+            "message": f"Too many images: {len(files)} uploaded, at most {MAX_IMAGES_PER_REQUEST} allowed."
+        }), 413
+
+    uploads = [file.read() if file and allowed_file(file.filename) else None for file in files]
+    served.metrics.observe("upload", time.perf_counter() - upload_start)
+
+    # Per-file entries: (cache_key, probabilities, error). Cached images skip decoding.
+    entries = []
+    misses = []
+    for index, image_bytes in enumerate(uploads):
+        if image_bytes is None:
+            entries.append((None, None, "Invalid file type. Only PNG, JPG, JPEG, GIF allowed."))
+            continue
+        key, probabilities = served.cached_probabilities(image_bytes)
+        entries.append((key, probabilities, None))
+        if probabilities is None:
+            misses.append((index, image_bytes))
+
+    decoded = decode_images([image_bytes for _, image_bytes in misses], served.preprocess)
+    valid = []
+    for (index, _), (tensor, error) in zip(misses, decoded):
+        if tensor is None:
+            entries[index] = (None, None, error)
+        else:
+            valid.append((index, tensor))
+
+    try:
+        probabilities = run_batch(
+            served.model, [tensor for _, tensor in valid], device,
+            forward_slots=served.forward_slots, metrics=served.metrics
+        ) if valid else None
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        served.metrics.count_error("forward")
+        return jsonify({
+            "success": False,
+            "message": f"Prediction error: {str(e)}"
+        }), 500
+
+    for row, (index, _) in enumerate(valid):
+        key = entries[index][0]
+        served.cache.put(key, probabilities[row])
+        entries[index] = (key, probabilities[row], None)
+
+    results = []
+    for file, (_, file_probabilities, error) in zip(files, entries):
+        if file_probabilities is None:
+            results.append({
+                "success": False,
+                "filename": file.filename,
+                "message": error
+            })
+            continue
+
+        predicted_class, confidence = served.top_prediction(file_probabilities)
+        message, detection = served.spec.rules.build_detection(predicted_class, confidence)
+        results.append({
+            "success": True,
+            "filename": file.filename,
+            "message": message,
+            "detection": detection
+        })
+
+    with served.metrics.time("serialize"):
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "results": results
+        })
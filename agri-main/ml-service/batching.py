@@ -0,0 +1,129 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import contextlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from cpu_tuning import inference_context
+
+# ====================================================================
+# DYNAMIC MICRO-BATCHING
+# ====================================================================
+
+class BatchScheduler:
+    """Collects single-image requests for a few milliseconds and runs them
+    through the model as one batched forward pass.
+
+    Each caller gets back a Future that resolves to its own row of softmax
+    probabilities (a 1-D CPU tensor), so route handlers keep their existing
+    per-image response logic.
+    """
+
+    def __init__(self, model, device, max_batch_size=16, max_wait_ms=5.0, name="model", forward_slots=None,
+                 metrics=None):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        # Optional semaphore shared between models so their forwards do not
+        # oversubscribe the intra-op thread pool
+        self.forward_slots = forward_slots
+        # Optional metrics.ModelMetrics receiving batch sizes, forward and queue-wait times
+        self.metrics = metrics
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._owner_pid = None
+
+    def submit(self, input_tensor):
+        """Queue one preprocessed CHW tensor and return a Future for its probabilities."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((input_tensor, future, time.perf_counter()))
+        return future
+
+    def predict(self, input_tensor, timeout=None):
+        """Blocking helper: submit one tensor and wait for its probabilities."""
+        return self.submit(input_tensor).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # ----------------------------------------------------------------
+    # Worker thread
+    # ----------------------------------------------------------------
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a scheduler created before the
+        # process forks must start a fresh worker in the child.
+        pid = os.getpid()
+        if self._thread is not None and self._owner_pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._owner_pid == pid:
+                return
+            if self._owner_pid != pid:
+                self._queue = queue.Queue()
+            self._owner_pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name=f"batch-scheduler-{self.name}", daemon=True
+            )
+            self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Still drain anything that is already waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _forward(self, inputs):
+        slots = self.forward_slots if self.forward_slots is not None else contextlib.nullcontext()
+        with slots, inference_context():
+            return torch.nn.functional.softmax(self.model(inputs), dim=1).cpu()
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            futures = [future for _, future, _ in batch]
+
+            try:
+                start = time.perf_counter()
+                inputs = torch.stack([tensor for tensor, _, _ in batch]).to(self.device)
+                probabilities = self._forward(inputs)
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.count_error("forward")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            if self.metrics is not None:
+                self.metrics.observe_batch(
+                    len(batch), time.perf_counter() - start, [start - queued for _, _, queued in batch]
+                )
+
+            for row, future in enumerate(futures):
+                future.set_result(probabilities[row])
@@ -0,0 +1,179 @@
+"""Training input throughput: per-image PIL augmentation vs batch_augment.py.
+
+    python benchmark_augmentation.py                          # synthetic phone-sized photos
+    python benchmark_augmentation.py --images plant_disease_data/Tomato___healthy --workers 8
+
+  per-image  the trainers' default: full PIL decode in the workers, then
+             RandomResizedCrop, RandomHorizontalFlip, ToTensor, Normalize
+  batched    BATCH_AUGMENT=1: DCT-scaled decode to uint8 256x256 squares in
+             the workers, crop/flip/normalize per batch on the device
+
+Reports images/second for the loader alone (including the device-side
+augmentation) and for the loader feeding a ResNet50 training step.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+from torchvision import models, transforms
+
+from batch_augment import BatchAugment, batch_input_transform, load_batch_input
+from benchmark_preprocessing import synthetic_photo
+from distributed_training import loader_options
+from preprocessing import CROP_SIZE, IMAGENET_MEAN, IMAGENET_STD, load_rgb
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# (width, height) of the synthetic photos, cycled
+SYNTHETIC_SIZES = [(4032, 3024), (3024, 4032), (1920, 1080)]
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+class ImageFiles(Dataset):
+    """Flat list of image files with a dummy label"""
+
+    def __init__(self, paths, transform, loader):
+        self.paths = paths
+        self.transform = transform
+        self.loader = loader
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        return self.transform(self.loader(self.paths[index])), 0
+
+def image_paths(args, scratch_dir):
+    if args.images:
+        names = sorted(name for name in os.listdir(args.images) if name.lower().endswith(IMAGE_EXTENSIONS))
+        return [os.path.join(args.images, name) for name in names[:args.limit]]
+    print(f"Writing {args.count} synthetic photos...")
+    paths = []
+    for seed in range(args.count):
+        width, height = SYNTHETIC_SIZES[seed % len(SYNTHETIC_SIZES)]
+        path = os.path.join(scratch_dir, f"synthetic_{seed}.jpg")
+        with open(path, "wb") as f:
+            f.write(synthetic_photo(width, height, "JPEG", seed))
+        paths.append(path)
+    return paths
+
+def pipelines(paths):
+    """name -> (dataset, device-side augmentation or None)"""
+    per_image = transforms.Compose([
+        transforms.RandomResizedCrop(CROP_SIZE),
+        transforms.RandomHorizontalFlip(),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)
+    ])
+    return {
+        "per-image": (ImageFiles(paths, per_image, load_rgb), None),
+        "batched": (ImageFiles(paths, batch_input_transform(), load_batch_input),
+                    BatchAugment(mean=IMAGENET_MEAN, std=IMAGENET_STD)),
+    }
+
+def images_per_sec(loader, augment, device, steps, train_step=None):
+    """Throughput over `steps` batches after one warm-up batch, cycling the loader as needed"""
+    def batches():
+        while True:
+            yield from loader
+
+    images, start = 0, None
+    for step, (inputs, labels) in enumerate(batches()):
+        if step == steps + 1:
+            break
+        if step == 1:
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            images, start = 0, time.perf_counter()
+        inputs = inputs.to(device, non_blocking=True)
+        labels = labels.to(device, non_blocking=True)
+        if augment is not None:
+            inputs = augment(inputs, train=True)
+        if train_step is not None:
+            train_step(inputs, labels)
+        images += inputs.shape[0]
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return images / (time.perf_counter() - start)
+
+def resnet_train_step(device):
+    model = models.resnet50(weights=None).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.001, momentum=0.9)
+
+    def train_step(inputs, labels):
+        optimizer.zero_grad(set_to_none=True)
+        loss = criterion(model(inputs), labels)
+        loss.backward()
+        optimizer.step()
+
+    return train_step
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of images to use instead of synthetic photos")
+    parser.add_argument("--limit", type=int, default=512, help="Maximum images to read from --images")
+    parser.add_argument("--count", type=int, default=96, help="Synthetic photos to generate")
+    parser.add_argument("--workers", type=int, default=4, help="DataLoader worker processes")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=20, help="Timed batches per measurement")
+    parser.add_argument("--skip-model", action="store_true", help="Only measure the loader")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        paths = image_paths(args, scratch_dir)
+        print(f"{len(paths)} images, batch size {args.batch_size}, {args.workers} worker(s), device {device}")
+        train_step = None if args.skip_model else resnet_train_step(device)
+
+        results = {}
+        for name, (dataset, augment) in pipelines(paths).items():
+            loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True,
+                                **loader_options(args.workers, device))
+            results[name] = {"loader_images_per_sec": images_per_sec(loader, augment, device, args.steps)}
+            if train_step is not None:
+                results[name]["loader_model_images_per_sec"] = images_per_sec(
+                    loader, augment, device, args.steps, train_step
+                )
+            del loader
+
+    print(f"\n{'pipeline':<12}{'loader img/s':>15}{'loader+model img/s':>21}")
+    for name, result in results.items():
+        with_model = result.get("loader_model_images_per_sec")
+        print(f"{name:<12}{result['loader_images_per_sec']:>15.1f}"
+              f"{(f'{with_model:.1f}' if with_model else '-'):>21}")
+    baseline, batched = results["per-image"], results["batched"]
+    print(f"Loader speed-up x{batched['loader_images_per_sec'] / baseline['loader_images_per_sec']:.2f}")
+    if train_step is not None:
+        print(f"End-to-end speed-up x{batched['loader_model_images_per_sec'] / baseline['loader_model_images_per_sec']:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images": len(paths), "batch_size": args.batch_size, "workers": args.workers,
+                       "device": str(device), "results": results}, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
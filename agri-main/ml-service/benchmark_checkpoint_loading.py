@@ -0,0 +1,146 @@
+"""Startup-time benchmark: eager checkpoint loading vs memory-mapped loading.
+
+For ResNet-50 and EfficientNet-B4 this writes a stand-in checkpoint bundle,
+then loads it in fresh processes with both loaders and reports:
+
+  - seconds from nothing to a model ready for eval
+  - RssAnon: private memory the process owns (copied weights live here)
+  - RssFile: file-backed pages, shared with every process mapping the same file
+
+    python benchmark_checkpoint_loading.py
+    python benchmark_checkpoint_loading.py --runs 5 --num-classes 38
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BACKBONES = ["resnet50", "efficientnet_b4"]
+LOADERS = ["eager", "mmap"]
+
+# ====================================================================
+# CHILD PROCESS: LOAD ONCE AND REPORT
+# ====================================================================
+
+def memory_status():
+    """RssAnon / RssFile in MB for this process (Linux only)"""
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+def load_once(loader, backbone, num_classes, path):
+    from model_registry import build_backbone
+    from checkpoint_bundle import load_checkpoint
+
+    before = memory_status()
+    start = time.perf_counter()
+
+    if loader == "eager":
+        # What the services did before: allocate + init, read, then copy in
+        model = build_backbone(backbone, num_classes)
+        model.load_state_dict(load_checkpoint(path)["state_dict"])
+    else:
+        with torch.device("meta"):
+            model = build_backbone(backbone, num_classes)
+        model.load_state_dict(load_checkpoint(path, mmap=True)["state_dict"], assign=True)
+    model.eval()
+
+    seconds = time.perf_counter() - start
+
+    # Touch every weight once, as the first forward pass would
+    checksum = sum(float(tensor.float().sum()) for tensor in model.state_dict().values())
+    after = memory_status()
+
+    return {
+        "seconds": seconds,
+        "rss_anon_mb": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+        "rss_file_mb": after.get("RssFile", 0) - before.get("RssFile", 0),
+        "checksum": checksum,
+    }
+
+# ====================================================================
+# PARENT PROCESS
+# ====================================================================
+
+def run_child(loader, backbone, num_classes, path):
+    output = subprocess.check_output([
+        sys.executable, os.path.abspath(__file__),
+        "--child", loader, backbone, str(num_classes), path
+    ], cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per backbone and loader")
+    parser.add_argument("--num-classes", type=int, default=38)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--child", nargs=4, metavar=("LOADER", "BACKBONE", "NUM_CLASSES", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        loader, backbone, num_classes, path = args.child
+        print(json.dumps(load_once(loader, backbone, int(num_classes), path)))
+        return
+
+    from model_registry import build_backbone
+    from checkpoint_bundle import save_bundle
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for backbone in BACKBONES:
+            path = os.path.join(workdir, f"{backbone}.pth")
+            class_names = [f"class_{index}" for index in range(args.num_classes)]
+            save_bundle(path, build_backbone(backbone, args.num_classes).state_dict(), class_names, backbone)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+
+            results[backbone] = {"checkpoint_mb": size_mb}
+            checksums = set()
+            for loader in LOADERS:
+                runs = [run_child(loader, backbone, args.num_classes, path) for _ in range(args.runs)]
+                checksums.update(round(run["checksum"], 2) for run in runs)
+                results[backbone][loader] = {
+                    "seconds_median": statistics.median(run["seconds"] for run in runs),
+                    "rss_anon_mb": statistics.median(run["rss_anon_mb"] for run in runs),
+                    "rss_file_mb": statistics.median(run["rss_file_mb"] for run in runs),
+                }
+            results[backbone]["weights_identical"] = len(checksums) == 1
+
+    print(f"{'backbone':<17}{'loader':<8}{'startup':>10}{'RssAnon':>12}{'RssFile':>12}")
+    for backbone, result in results.items():
+        for loader in LOADERS:
+            row = result[loader]
+            print(f"{backbone:<17}{loader:<8}{row['seconds_median']:>9.3f}s"
+                  f"{row['rss_anon_mb']:>10.1f}MB{row['rss_file_mb']:>10.1f}MB")
+        speedup = result["eager"]["seconds_median"] / result["mmap"]["seconds_median"]
+        print(f"{'':<17}checkpoint {result['checkpoint_mb']:.1f}MB, mmap speed-up x{speedup:.2f}, "
+              f"weights identical: {result['weights_identical']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
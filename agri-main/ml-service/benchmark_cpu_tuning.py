@@ -0,0 +1,201 @@
+"""A/B benchmark for the optimized CPU serving mode.
+
+Runs the serving load path (load_model + the scheduler's grad context) for a
+stand-in checkpoint in fresh processes, one per simulated server worker, all
+measuring at the same time so they compete for cores the way they do in
+production. Variants:
+
+  default           torch defaults: NCHW, no_grad, every worker uses every core
+  threads           thread budget sized to the worker count (and optional pinning)
+  optimized         threads + channels_last + inference_mode   (OPTIMIZE_CPU=1)
+  optimized+compile optimized + torch.compile with warm-up     (TORCH_COMPILE=1)
+
+For each variant it reports single-image latency (p50/p90 per worker) and the
+aggregate throughput of all workers at --batch-size.
+
+    python benchmark_cpu_tuning.py
+    python benchmark_cpu_tuning.py --workers 4 --pin --backbones resnet50
+    python benchmark_cpu_tuning.py --variants default optimized --output cpu_ab.json
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BACKBONES = ["resnet50", "efficientnet_b4"]
+
+# Environment each variant's worker processes are started with
+VARIANTS = {
+    "default": {"OPTIMIZE_CPU": "0", "TORCH_COMPILE": "0"},
+    "threads": {"OPTIMIZE_CPU": "0", "TORCH_COMPILE": "0"},
+    "optimized": {"OPTIMIZE_CPU": "1", "TORCH_COMPILE": "0"},
+    "optimized+compile": {"OPTIMIZE_CPU": "1", "TORCH_COMPILE": "1"},
+}
+
+# ====================================================================
+# CHILD PROCESS: ONE SIMULATED SERVER WORKER
+# ====================================================================
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_worker(variant, backbone, path, batch_size, iterations):
+    # Imported here so the variant's environment is in place first
+    import torch
+    import model_registry
+    from cpu_tuning import inference_context
+
+    if variant != "default":
+        model_registry.configure_thread_budget()
+
+    spec = model_registry.ModelSpec(
+        name=backbone, display_name=backbone, backbone=backbone, data_dir="",
+        checkpoint_path=path, quantized_path="", rules=None, image_type="", legacy_port=0
+    )
+    start = time.perf_counter()
+    backend, metadata = model_registry.load_model(spec)
+    startup = time.perf_counter() - start
+    size = metadata["input_size"]
+
+    single = torch.randn(1, 3, size, size)
+    batch = torch.randn(batch_size, 3, size, size)
+    with inference_context():
+        backend(single)
+        backend(batch)
+
+    # Wait for every worker to be loaded before measuring
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    with inference_context():
+        for _ in range(iterations):
+            start = time.perf_counter()
+            backend(single)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for _ in range(max(1, iterations // 4)):
+            backend(batch)
+        batch_seconds = time.perf_counter() - start
+
+    return {
+        "startup_seconds": startup,
+        "threads": torch.get_num_threads(),
+        "optimizations": backend.optimizations,
+        "latency_p50_ms": percentile(latencies, 0.5),
+        "latency_p90_ms": percentile(latencies, 0.9),
+        "images_per_second": max(1, iterations // 4) * batch_size / batch_seconds,
+    }
+
+# ====================================================================
+# PARENT PROCESS
+# ====================================================================
+
+def run_variant(variant, backbone, path, args):
+    env = dict(os.environ, **VARIANTS[variant])
+    env.update({
+        "MMAP_WEIGHTS": "1",
+        "CPU_THREADS": str(args.cpu_threads),
+        "WORKER_PROCESSES": str(args.workers),
+        "PIN_CPU_CORES": "1" if args.pin and variant != "default" else "0",
+        "MAX_BATCH_SIZE": str(args.batch_size),
+    })
+
+    workers = []
+    for index in range(args.workers):
+        workers.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--child", variant, backbone, path,
+             "--batch-size", str(args.batch_size), "--iterations", str(args.iterations)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(env, WORKER_INDEX=str(index)),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        ))
+
+    # Release all workers at once, after the slowest one has loaded
+    for worker in workers:
+        while worker.stdout.readline().strip() != "ready":
+            if worker.poll() is not None:
+                raise SystemExit(f"❌ {variant} worker exited before it was ready")
+    for worker in workers:
+        worker.stdin.write("go\n")
+        worker.stdin.flush()
+
+    results = []
+    for worker in workers:
+        output, _ = worker.communicate()
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        "threads_per_worker": results[0]["threads"],
+        "optimizations": results[0]["optimizations"],
+        "startup_seconds": max(result["startup_seconds"] for result in results),
+        "latency_p50_ms": statistics.median(result["latency_p50_ms"] for result in results),
+        "latency_p90_ms": statistics.median(result["latency_p90_ms"] for result in results),
+        "images_per_second": sum(result["images_per_second"] for result in results),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backbones", nargs="+", choices=BACKBONES, default=BACKBONES)
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--workers", type=int, default=1, help="Server processes sharing the machine")
+    parser.add_argument("--cpu-threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its own cores (Linux)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--num-classes", type=int, default=38)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--child", nargs=3, metavar=("VARIANT", "BACKBONE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        variant, backbone, path = args.child
+        print(json.dumps(run_worker(variant, backbone, path, args.batch_size, args.iterations)))
+        return
+
+    from model_registry import build_backbone
+    from checkpoint_bundle import save_bundle
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for backbone in args.backbones:
+            path = os.path.join(workdir, f"{backbone}.pth")
+            class_names = [f"class_{index}" for index in range(args.num_classes)]
+            save_bundle(path, build_backbone(backbone, args.num_classes).state_dict(), class_names, backbone)
+
+            results[backbone] = {}
+            for variant in args.variants:
+                print(f"Running {backbone} / {variant} with {args.workers} worker(s)...")
+                results[backbone][variant] = run_variant(variant, backbone, path, args)
+
+    print(f"\n{'backbone':<17}{'variant':<19}{'threads':>8}{'p50':>10}{'p90':>10}{'img/s':>10}{'startup':>10}")
+    for backbone, variants in results.items():
+        baseline = variants.get("default")
+        for variant, row in variants.items():
+            gain = f"  x{row['images_per_second'] / baseline['images_per_second']:.2f}" if baseline else ""
+            print(f"{backbone:<17}{variant:<19}{row['threads_per_worker']:>8}"
+                  f"{row['latency_p50_ms']:>8.1f}ms{row['latency_p90_ms']:>8.1f}ms"
+                  f"{row['images_per_second']:>10.1f}{row['startup_seconds']:>9.1f}s{gain}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"workers": args.workers, "cpu_threads": args.cpu_threads, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
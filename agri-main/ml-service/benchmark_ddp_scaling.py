@@ -0,0 +1,184 @@
+"""Scaling curve for data-parallel training (DDP over gloo) on one host.
+
+For each process count, starts that many training processes that split the
+host's cores between them (the way train_distributed.py does) and times
+full training steps on synthetic batches: forward, backward, gradient
+all-reduce and optimizer step. Each process keeps the same per-process batch
+(weak scaling), so the global batch grows with the process count.
+
+Reports aggregate images/s, speed-up over one process and scaling
+efficiency (speed-up / processes).
+
+    python benchmark_ddp_scaling.py
+    python benchmark_ddp_scaling.py --processes 1 2 4 8 --backbone efficientnet_b4 --batch-size 8
+    python benchmark_ddp_scaling.py --trainable layer3 layer4 fc --output ddp_scaling.json
+
+For several hosts, the same numbers come from timing train_distributed.py
+runs: the all-reduce then crosses the network, so also check the
+efficiency between 1 and 2 hosts.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BACKBONES = ["resnet50", "efficientnet_b4"]
+NUM_CLASSES = 10
+
+# ====================================================================
+# CHILD PROCESS: ONE TRAINING RANK
+# ====================================================================
+
+def build_model(backbone, trainable):
+    from torchvision import models
+
+    if backbone == "resnet50":
+        model = models.resnet50(weights=None, num_classes=NUM_CLASSES)
+    else:
+        model = models.efficientnet_b4(weights=None, num_classes=NUM_CLASSES)
+
+    if trainable:
+        for name, param in model.named_parameters():
+            param.requires_grad = name.split(".")[0] in trainable
+    return model
+
+def run_rank(rank, world_size, port, backbone, trainable, batch_size, steps, warmup):
+    import torch
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    torch.set_num_threads(max(1, cores // world_size))
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size)
+
+    torch.manual_seed(rank)
+    model = build_model(backbone, trainable)
+    ddp_model = DistributedDataParallel(model) if world_size > 1 else model
+    optimizer = torch.optim.Adam([param for param in model.parameters() if param.requires_grad], lr=1e-4)
+    criterion = torch.nn.CrossEntropyLoss()
+    inputs = torch.randn(batch_size, 3, 224, 224)
+    labels = torch.randint(NUM_CLASSES, (batch_size,))
+
+    def step():
+        optimizer.zero_grad(set_to_none=True)
+        loss = criterion(ddp_model(inputs), labels)
+        loss.backward()
+        optimizer.step()
+
+    model.train()
+    for _ in range(warmup):
+        step()
+    dist.barrier()
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        print(json.dumps({
+            "processes": world_size,
+            "threads_per_process": torch.get_num_threads(),
+            "step_ms": elapsed / steps * 1000,
+            "images_per_sec": steps * batch_size * world_size / elapsed,
+        }))
+    dist.destroy_process_group()
+
+# ====================================================================
+# PARENT PROCESS
+# ====================================================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure(processes, args):
+    """Start one benchmark run with `processes` ranks and return rank 0's result"""
+    port = free_port()
+    children = []
+    for rank in range(processes):
+        command = [
+            sys.executable, os.path.abspath(__file__), "--child", str(rank), str(processes), str(port),
+            "--backbone", args.backbone, "--batch-size", str(args.batch_size),
+            "--steps", str(args.steps), "--warmup", str(args.warmup),
+        ]
+        if args.trainable:
+            command += ["--trainable", *args.trainable]
+        env = dict(os.environ, OMP_NUM_THREADS=str(max(1, available_cores() // processes)))
+        children.append(subprocess.Popen(command, stdout=subprocess.PIPE, text=True, env=env))
+
+    outputs = [child.communicate()[0] for child in children]
+    if any(child.returncode for child in children):
+        raise SystemExit(f"❌ Benchmark run with {processes} process(es) failed")
+    return json.loads(outputs[0].strip().splitlines()[-1])
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+def default_process_counts():
+    counts, count = [], 1
+    while count <= available_cores():
+        counts.append(count)
+        count *= 2
+    return counts
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", help="Process counts (default: 1, 2, 4 ... cores)")
+    parser.add_argument("--backbone", default="resnet50", choices=BACKBONES)
+    parser.add_argument("--trainable", nargs="+", help="Top-level modules left trainable (default: all)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Images per process per step")
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--child", nargs=3, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        rank, world_size, port = args.child
+        run_rank(rank, world_size, port, args.backbone, args.trainable, args.batch_size, args.steps, args.warmup)
+        return
+
+    process_counts = args.processes or default_process_counts()
+    print(f"DDP scaling: {args.backbone}, {args.batch_size} images/process/step, "
+          f"{available_cores()} cores, trainable: {', '.join(args.trainable) if args.trainable else 'all'}")
+
+    results = []
+    for processes in process_counts:
+        result = measure(processes, args)
+        results.append(result)
+        baseline = results[0]["images_per_sec"] / results[0]["processes"]
+        result["speedup"] = result["images_per_sec"] / baseline
+        result["efficiency"] = result["speedup"] / processes
+        print(f"  {processes:>3} process(es) x {result['threads_per_process']:>2} threads: "
+              f"{result['images_per_sec']:8.1f} img/s  step {result['step_ms']:7.0f}ms  "
+              f"speed-up {result['speedup']:.2f}x  efficiency {result['efficiency']:.0%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backbone": args.backbone, "batch_size": args.batch_size,
+                       "trainable": args.trainable, "cores": available_cores(), "results": results}, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""Load-test harness for the crop and cattle /predict endpoints.
+
+Generates synthetic leaf and cattle photos at phone resolutions, starts each
+service locally on a stand-in checkpoint (untrained weights, same backbone
+and input pipeline as production), and drives /predict with a concurrency
+ramp. For every step it reports throughput, p50/p95/p99 latency, errors and
+the server's memory (RSS, and PSS where the kernel provides it, summed over
+the whole process tree).
+
+    python benchmark_load.py
+    python benchmark_load.py --services crop --concurrency 1 8 32 --duration 20
+    python benchmark_load.py --server asgi --output asgi.json
+    python benchmark_load.py --server prefork --workers 4 --compare release_1_2.json
+
+Results are written as JSON (--output) so releases can be compared; with
+--compare, the run exits with status 1 if any step's throughput drops or p95
+latency grows by more than --tolerance against the baseline file.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+SERVICES = {
+    "crop": {
+        "backbone": "resnet50",
+        "env_prefix": "CROP",
+        "class_names": ["Tomato_Early_blight", "Tomato_Late_blight", "Tomato_healthy",
+                        "Potato_Early_blight", "Potato_healthy", "Pepper_bell_Bacterial_spot"],
+    },
+    "cattle": {
+        "backbone": "efficientnet_b4",
+        "env_prefix": "CATTLE",
+        "class_names": ["healthy", "lumpy_skin", "mastitis", "foot-and-mouth"],
+    },
+}
+
+# How each service is started; {service} and {port} are filled in
+SERVER_COMMANDS = {
+    "prefork": ["serve.py", "{service}", "--port", "{port}", "--workers", "{workers}"],
+    "asgi": ["asgi_app.py", "{service}", "--port", "{port}"],
+}
+
+# Phone camera output: 12 MP landscape/portrait, 16:9 video frame, older 2 MP
+PHONE_RESOLUTIONS = [(4032, 3024), (3024, 4032), (1920, 1080), (1600, 1200)]
+
+STARTUP_TIMEOUT = 600
+
+# ====================================================================
+# SYNTHETIC IMAGES
+# ====================================================================
+
+def _finish(image, rng, quality):
+    """Add sensor noise and encode like a phone camera"""
+    pixels = np.asarray(image, dtype=np.int16)
+    pixels = pixels + rng.normal(0, 6, size=pixels.shape).astype(np.int16)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+def synthetic_leaf(width, height, seed):
+    """A leaf with veins and brown lesions on a soil background"""
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (width, height), tuple(int(v) for v in rng.integers(60, 110, 3)))
+    draw = ImageDraw.Draw(image)
+
+    cx, cy = width / 2, height / 2
+    rx, ry = width * rng.uniform(0.3, 0.42), height * rng.uniform(0.2, 0.3)
+    green = (int(rng.integers(40, 90)), int(rng.integers(120, 190)), int(rng.integers(30, 70)))
+    draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=green)
+
+    vein = tuple(min(255, channel + 40) for channel in green)
+    line_width = max(2, width // 400)
+    draw.line([cx - rx, cy, cx + rx, cy], fill=vein, width=line_width * 2)
+    for offset in np.linspace(-0.7, 0.7, 8):
+        x = cx + offset * rx
+        draw.line([x, cy, x + rx * 0.25, cy - ry * 0.8 * np.sign(offset or 1)], fill=vein, width=line_width)
+
+    for _ in range(int(rng.integers(0, 25))):
+        x = cx + rng.uniform(-0.8, 0.8) * rx
+        y = cy + rng.uniform(-0.7, 0.7) * ry
+        r = rng.uniform(0.005, 0.03) * width
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=(int(rng.integers(90, 140)), int(rng.integers(60, 90)), 30))
+
+    image = image.filter(ImageFilter.GaussianBlur(radius=max(1, width // 1500)))
+    return _finish(image, rng, quality=int(rng.integers(85, 95)))
+
+def synthetic_cattle(width, height, seed):
+    """A cow-shaped silhouette with patches, standing on grass under sky"""
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (width, height), (135, 180, 230))
+    draw = ImageDraw.Draw(image)
+    horizon = height * rng.uniform(0.35, 0.55)
+    draw.rectangle([0, horizon, width, height], fill=(70, int(rng.integers(120, 160)), 50))
+
+    coat = [(90, 60, 40), (30, 25, 20), (150, 110, 70)][int(rng.integers(0, 3))]
+    body = [width * 0.2, height * 0.35, width * 0.75, height * 0.7]
+    draw.ellipse(body, fill=coat)
+    draw.ellipse([width * 0.68, height * 0.3, width * 0.85, height * 0.48], fill=coat)
+    leg_width = width * 0.04
+    for x in (0.28, 0.38, 0.58, 0.66):
+        draw.rectangle([width * x, height * 0.62, width * x + leg_width, height * 0.88], fill=coat)
+
+    for _ in range(int(rng.integers(3, 12))):
+        x = rng.uniform(body[0], body[2])
+        y = rng.uniform(body[1], body[3])
+        r = rng.uniform(0.01, 0.05) * width
+        draw.ellipse([x - r, y - r * 0.7, x + r, y + r * 0.7], fill=(235, 230, 225))
+
+    image = image.filter(ImageFilter.GaussianBlur(radius=max(1, width // 1500)))
+    return _finish(image, rng, quality=int(rng.integers(85, 95)))
+
+def build_image_pool(service, count):
+    generator = synthetic_leaf if service == "crop" else synthetic_cattle
+    return [
+        generator(*PHONE_RESOLUTIONS[index % len(PHONE_RESOLUTIONS)], seed=index)
+        for index in range(count)
+    ]
+
+# ====================================================================
+# SERVER PROCESS
+# ====================================================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def write_standin_checkpoint(service, path):
+    from checkpoint_bundle import save_bundle
+    from model_registry import build_backbone
+
+    spec = SERVICES[service]
+    model = build_backbone(spec["backbone"], len(spec["class_names"]))
+    save_bundle(path, model.state_dict(), spec["class_names"], spec["backbone"])
+
+def process_tree(pid):
+    """pid plus all of its descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+def memory_mb(pid):
+    """Summed RSS and PSS of a process tree in MB; None where unavailable"""
+    if not os.path.isdir("/proc"):
+        return {"rss_mb": None, "pss_mb": None}
+    rss = pss = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/smaps_rollup") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key == "Rss":
+                        rss += int(value.split()[0])
+                    elif key == "Pss":
+                        pss += int(value.split()[0])
+        except OSError:
+            continue
+    return {"rss_mb": rss / 1024, "pss_mb": pss / 1024}
+
+class ServiceProcess:
+    """One locally started crop or cattle service"""
+
+    def __init__(self, service, checkpoint_path, args, log):
+        self.service = service
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+        command = [part.format(service=service, port=self.port, workers=args.workers)
+                   for part in SERVER_COMMANDS[args.server]]
+        prefix = SERVICES[service]["env_prefix"]
+        env = dict(os.environ, **{f"{prefix}_MODEL_PATH": checkpoint_path, "PYTHONUNBUFFERED": "1"})
+        self.process = subprocess.Popen(
+            [sys.executable] + command,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+    def wait_until_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"❌ {self.service} service exited during startup (see the server log)")
+            try:
+                with urllib.request.urlopen(self.base_url + "/status", timeout=2) as response:
+                    if json.load(response).get("model_loaded"):
+                        return
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.5)
+        raise SystemExit(f"❌ {self.service} service did not become ready in {STARTUP_TIMEOUT}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+# ====================================================================
+# LOAD GENERATION
+# ====================================================================
+
+def multipart_body(image_bytes, filename):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def post_image(url, image_bytes, filename):
+    """Return (latency_seconds, ok)"""
+    body, content_type = multipart_body(image_bytes, filename)
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            ok = json.load(response).get("success", False)
+    except (OSError, ValueError, urllib.error.HTTPError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_step(url, images, concurrency, duration, unique):
+    """Hammer url with `concurrency` clients for `duration` seconds"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        count = 0
+        while time.monotonic() < deadline:
+            image_bytes = rng.choice(images)
+            if unique:
+                # Make every upload distinct so the prediction cache never answers
+                image_bytes = image_bytes + f"{index}-{count}".encode()
+            latency, ok = post_image(url, image_bytes, f"photo_{index}_{count}.jpg")
+            count += 1
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    errors[0] += 1
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+# ====================================================================
+# REGRESSION COMPARISON
+# ====================================================================
+
+def compare(results, baseline, tolerance):
+    """Print per-step deltas against a baseline run; return True if any step regressed"""
+    regressed = False
+    print(f"\n--- Comparison with baseline (tolerance {tolerance:.0%}) ---")
+    for service, current in results["services"].items():
+        previous = {step["concurrency"]: step for step in baseline.get("services", {}).get(service, {}).get("steps", [])}
+        for step in current["steps"]:
+            before = previous.get(step["concurrency"])
+            if not before or not before["throughput_rps"] or not step["latency_p95_ms"]:
+                continue
+            throughput = step["throughput_rps"] / before["throughput_rps"] - 1
+            p95 = step["latency_p95_ms"] / before["latency_p95_ms"] - 1
+            bad = throughput < -tolerance or p95 > tolerance
+            regressed = regressed or bad
+            print(f"{'❌' if bad else '✅'} {service} c={step['concurrency']}: "
+                  f"throughput {throughput:+.1%}, p95 {p95:+.1%}")
+    return regressed
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", nargs="+", choices=list(SERVICES), default=list(SERVICES))
+    parser.add_argument("--server", choices=list(SERVER_COMMANDS), default="prefork")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --server prefork")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent clients per step")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per step")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests sent before measuring")
+    parser.add_argument("--images", type=int, default=16, help="Synthetic images per service")
+    parser.add_argument("--cache-hits", action="store_true",
+                        help="Re-send identical images (default makes every upload unique)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression (fraction)")
+    parser.add_argument("--server-log", default=os.devnull, help="Where to send the services' output")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "torch": __import__("torch").__version__,
+            "cpu_count": os.cpu_count(),
+            "server": args.server,
+            "workers": args.workers,
+            "duration": args.duration,
+            "cache_hits": args.cache_hits,
+        },
+        "services": {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir, open(args.server_log, "a") as log:
+        for service in args.services:
+            print(f"\n🌱 {service}: generating {args.images} synthetic phone photos...")
+            images = build_image_pool(service, args.images)
+            checkpoint_path = os.path.join(workdir, f"{service}_standin.pth")
+            write_standin_checkpoint(service, checkpoint_path)
+
+            server = ServiceProcess(service, checkpoint_path, args, log)
+            try:
+                start = time.monotonic()
+                server.wait_until_ready()
+                startup_seconds = time.monotonic() - start
+                idle_memory = memory_mb(server.process.pid)
+                print(f"🚀 {service} ready on port {server.port} in {startup_seconds:.1f}s "
+                      f"(RSS {idle_memory['rss_mb']:.0f}MB)")
+
+                url = server.base_url + "/predict"
+                for index in range(args.warmup):
+                    post_image(url, images[index % len(images)] + b"warmup%d" % index, "warmup.jpg")
+
+                steps = []
+                for concurrency in args.concurrency:
+                    step = run_step(url, images, concurrency, args.duration, unique=not args.cache_hits)
+                    step.update(memory_mb(server.process.pid))
+                    steps.append(step)
+                    p95 = f"{step['latency_p95_ms']:.0f}ms" if step["latency_p95_ms"] is not None else "-"
+                    print(f"   c={concurrency:<4} {step['throughput_rps']:7.2f} req/s  p95 {p95:>8}  "
+                          f"errors {step['errors']}  RSS {step['rss_mb']:.0f}MB")
+            finally:
+                server.stop()
+
+            results["services"][service] = {
+                "backbone": SERVICES[service]["backbone"],
+                "startup_seconds": startup_seconds,
+                "idle_memory": idle_memory,
+                "steps": steps,
+            }
+
+    print(f"\n{'service':<9}{'conc':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'RSS MB':>9}{'PSS MB':>9}")
+    for service, result in results["services"].items():
+        for step in result["steps"]:
+            def ms(value):
+                return f"{value:.0f}" if value is not None else "-"
+            pss = f"{step['pss_mb']:.0f}" if step["pss_mb"] is not None else "-"
+            rss = f"{step['rss_mb']:.0f}" if step["rss_mb"] is not None else "-"
+            print(f"{service:<9}{step['concurrency']:>6}{step['throughput_rps']:>9.2f}"
+                  f"{ms(step['latency_p50_ms']):>9}{ms(step['latency_p95_ms']):>9}{ms(step['latency_p99_ms']):>9}"
+                  f"{step['errors']:>8}{rss:>9}{pss:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Parity check and micro-benchmark for the fast preprocessing path.
+
+Compares preprocessing.FastPreprocessor against the torchvision pipeline the
+services used before (full-resolution PIL decode, Resize(256), CenterCrop(224),
+ToTensor, Normalize):
+
+    python benchmark_preprocessing.py                 # synthetic phone-sized photos
+    python benchmark_preprocessing.py --images DIR    # your own photos
+
+Exits with status 1 if the non-draft fast path does not reproduce the
+torchvision tensors.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import torch
+from torchvision import transforms
+
+from preprocessing import FastPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# (width, height, format) of the synthetic test images
+SYNTHETIC_IMAGES = [
+    (4032, 3024, "JPEG"),   # 12 MP phone photo, landscape
+    (3024, 4032, "JPEG"),   # 12 MP phone photo, portrait
+    (1920, 1080, "JPEG"),
+    (640, 480, "JPEG"),
+    (1200, 900, "PNG"),
+]
+
+# Fast path without DCT scaling must match torchvision to float rounding
+EXACT_TOLERANCE = 1e-5
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def synthetic_photo(width, height, image_format, seed=0):
+    """Smooth gradients plus sensor-like noise, encoded like a phone upload"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        120 + 80 * np.sin(x / 211.0),
+        140 + 60 * np.cos(y / 173.0),
+        90 + 50 * np.sin((x + y) / 97.0),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+def load_images(args):
+    if args.images:
+        names = sorted(os.listdir(args.images))
+        images = []
+        for name in names[:args.limit]:
+            with open(os.path.join(args.images, name), "rb") as f:
+                images.append((name, f.read()))
+        return images
+    return [
+        (f"synthetic_{width}x{height}.{image_format.lower()}", synthetic_photo(width, height, image_format, seed))
+        for seed, (width, height, image_format) in enumerate(SYNTHETIC_IMAGES)
+    ]
+
+def torchvision_pipeline():
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)
+    ])
+
+    def preprocess(image_bytes):
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        return transform(image)
+
+    return preprocess
+
+def time_ms(fn, image_bytes, repeats):
+    fn(image_bytes)  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(image_bytes)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of images to use instead of synthetic photos")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum images to read from --images")
+    parser.add_argument("--repeats", type=int, default=10, help="Timed runs per image and pipeline")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    pipelines = {
+        "torchvision": torchvision_pipeline(),
+        "fast": FastPreprocessor(draft=False),
+        "fast+draft": FastPreprocessor(draft=True),
+    }
+
+    parity_ok = True
+    totals = {name: 0.0 for name in pipelines}
+    print(f"{'image':<34}{'torchvision':>13}{'fast':>10}{'fast+draft':>12}   parity (max|Δ| exact, mean|Δ| draft)")
+
+    for name, image_bytes in load_images(args):
+        reference = pipelines["torchvision"](image_bytes)
+        exact_diff = (pipelines["fast"](image_bytes) - reference).abs().max().item()
+        draft_diff = (pipelines["fast+draft"](image_bytes) - reference).abs().mean().item()
+        if exact_diff > EXACT_TOLERANCE:
+            parity_ok = False
+
+        timings = {pipeline: time_ms(fn, image_bytes, args.repeats) for pipeline, fn in pipelines.items()}
+        for pipeline, ms in timings.items():
+            totals[pipeline] += ms
+
+        print(f"{name:<34}{timings['torchvision']:>11.1f}ms{timings['fast']:>8.1f}ms{timings['fast+draft']:>10.1f}ms"
+              f"   {exact_diff:.2e}, {draft_diff:.4f}")
+
+    print("-" * 100)
+    baseline = totals["torchvision"]
+    for pipeline, total in totals.items():
+        print(f"{pipeline:<14} total {total:8.1f}ms   speed-up x{baseline / total:.2f}")
+
+    if not parity_ok:
+        print(f"❌ Parity check failed: fast path differs from torchvision by more than {EXACT_TOLERANCE}")
+        sys.exit(1)
+    print("✅ Parity check passed: fast path reproduces the torchvision tensors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# ====================================================================
+# CATTLE DISEASE RULES
+# ====================================================================
+
+def is_disease_detected(class_name):
+    class_lower = class_name.lower()
+    
+    if 'healthy' in class_lower or 'normal' in class_lower:
+        return False
+    
+    disease_indicators = ['lumpy', 'mastitis', 'foot-and-mouth']
+    for indicator in disease_indicators:
+        if indicator in class_lower:
+            return True
+    
+    return False
+
+def format_disease_name(class_name):
+    formatted = class_name.replace('__', ' ').replace('_', ' ').replace('-', ' ')
+    formatted = ' '.join(word.capitalize() for word in formatted.split())
+    return formatted
+
+def build_detection(predicted_class, confidence):
+    """Build the response message and detection payload for one prediction"""
+    detected = is_disease_detected(predicted_class)
+    formatted_disease = format_disease_name(predicted_class)
+    
+    # Generate appropriate message and treatment
+    if detected:
+        message = f"Disease detected: {formatted_disease}"
+        treatment = get_treatment_recommendation(predicted_class)
+    else:
+        message = f"Animal is healthy: {formatted_disease}"
+        # Call helper function to get the 'healthy' treatment
+        treatment = get_treatment_recommendation(predicted_class) 
+
+    return message, {
+        "detected": detected,
+        "disease": formatted_disease,
+        "confidence": confidence,
+        "treatment": treatment
+    }
+
+def get_treatment_recommendation(disease_class):
+    """Treatment recommendations for cattle diseases"""
+    class_lower = disease_class.lower()
+    
+    treatments = {
+        "lumpy": "Isolate the affected animal. Provide supportive care and pain relief. Consult a veterinarian immediately.",
+        "mastitis": "Administer antibiotics (as prescribed by a vet) and strip the udder frequently. Improve sanitation and bedding.",
+        "foot-and-mouth": "Quarantine the animal immediately. Provide soft food and clean, cool water. Follow local veterinary guidelines for managing outbreaks.",
+    }
+    
+    for key, treatment in treatments.items():
+        if key in class_lower:
+            return treatment
+    
+    if is_disease_detected(disease_class):
+        return "Consult with a veterinarian or agricultural expert for specific treatment recommendations."
+    
+    # FIX: Add the final return statement for healthy/normal cases
+    return "No treatment needed - animal is healthy. Continue regular maintenance."
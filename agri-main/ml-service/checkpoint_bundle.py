@@ -0,0 +1,150 @@
+"""Self-describing checkpoint bundles.
+
+A bundle stores the trained weights together with everything the servers need
+to rebuild and serve the model: ordered class names, backbone type, input size
+and normalization stats. Servers never have to look at the training dataset.
+
+Convert a weights-only .pth written by older trainers:
+
+    python checkpoint_bundle.py convert resnet50_crop_disease_best.pth \\
+        --backbone resnet50 --data-dir plant_disease_data
+    python checkpoint_bundle.py info resnet50_crop_disease_best.pth
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+
+import torch
+from torchvision.datasets.folder import find_classes
+
+from preprocessing import RESIZE_SIZE, CROP_SIZE, IMAGENET_MEAN, IMAGENET_STD
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BUNDLE_FORMAT = "agri-ml-bundle"
+BUNDLE_VERSION = 1
+
+METADATA_KEYS = ["backbone", "class_names", "input_size", "resize_size", "mean", "std"]
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def is_bundle(checkpoint):
+    return isinstance(checkpoint, dict) and checkpoint.get("format") == BUNDLE_FORMAT
+
+def make_metadata(backbone, class_names, input_size=CROP_SIZE, resize_size=RESIZE_SIZE,
+                  mean=IMAGENET_MEAN, std=IMAGENET_STD):
+    return {
+        "backbone": backbone,
+        "class_names": list(class_names),
+        "input_size": int(input_size),
+        "resize_size": int(resize_size),
+        "mean": [float(value) for value in mean],
+        "std": [float(value) for value in std],
+    }
+
+def bundle_metadata(bundle):
+    return {key: bundle[key] for key in METADATA_KEYS}
+
+def save_bundle(path, state_dict, class_names, backbone, **metadata):
+    """Write weights plus serving metadata to a single checkpoint file"""
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        **make_metadata(backbone, class_names, **metadata),
+        "state_dict": state_dict,
+    }
+    torch.save(bundle, path)
+
+def load_checkpoint(path, map_location="cpu", mmap=False):
+    """Load a bundle or a legacy weights-only checkpoint.
+
+    With mmap=True the tensors are backed by a private mapping of the file
+    instead of being read into fresh memory: pages come from the page cache
+    on first touch and are shared by every process that maps the same file.
+    """
+    if mmap:
+        try:
+            return torch.load(path, map_location=map_location, weights_only=True, mmap=True)
+        except RuntimeError as e:
+            # Only zip-format checkpoints (torch >= 1.6) can be memory-mapped
+            print(f"⚠️ Cannot memory-map {path} ({e}); loading it into memory instead.")
+    return torch.load(path, map_location=map_location, weights_only=True)
+
+def load_weights(path, map_location="cpu"):
+    """Weights from either checkpoint format"""
+    checkpoint = load_checkpoint(path, map_location)
+    return checkpoint["state_dict"] if is_bundle(checkpoint) else checkpoint
+
+def derived_artifact_path(checkpoint_path, suffix):
+    """Default location of an artifact derived from a checkpoint, e.g. *_int8.pt"""
+    return os.path.splitext(checkpoint_path)[0] + suffix
+
+def save_scripted(path, module, metadata, **extra):
+    """Save a TorchScript module with the bundle metadata embedded in the archive"""
+    payload = {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION, **metadata, **extra}
+    torch.jit.save(module, path, _extra_files={"metadata.json": json.dumps(payload)})
+
+def load_scripted(path, map_location="cpu"):
+    """Return (module, metadata) for an archive written by save_scripted"""
+    extra_files = {"metadata.json": ""}
+    module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+    payload = json.loads(extra_files["metadata.json"])
+    return module, payload
+
+def dataset_class_names(data_dir):
+    """Class names as ImageFolder orders them, without walking every image"""
+    if not os.path.isdir(data_dir):
+        return []
+    classes, _ = find_classes(data_dir)
+    return classes
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="Wrap a weights-only .pth into a bundle")
+    convert.add_argument("checkpoint")
+    convert.add_argument("output", nargs="?", help="Defaults to overwriting the input file")
+    convert.add_argument("--backbone", required=True, choices=["resnet50", "efficientnet_b4"])
+    source = convert.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data-dir", help="Training folder whose sub-folders are the classes")
+    source.add_argument("--classes", help="Comma-separated class names in training order")
+
+    info = commands.add_parser("info", help="Print the metadata stored in a checkpoint")
+    info.add_argument("checkpoint")
+
+    args = parser.parse_args()
+    checkpoint = load_checkpoint(args.checkpoint)
+
+    if args.command == "info":
+        if not is_bundle(checkpoint):
+            print("⚠️ Legacy weights-only checkpoint (no class manifest).")
+            return
+        for key, value in bundle_metadata(checkpoint).items():
+            print(f"{key}: {value}")
+        return
+
+    if is_bundle(checkpoint):
+        print("✅ Checkpoint is already a bundle; nothing to do.")
+        return
+
+    class_names = dataset_class_names(args.data_dir) if args.data_dir else args.classes.split(",")
+    output = args.output or args.checkpoint
+    save_bundle(output, checkpoint, class_names, args.backbone)
+    print(f"✅ Wrote bundle with {len(class_names)} classes to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Background checkpoint writer for the trainers.
+
+save() copies the weights into a host snapshot and returns right away.
+The bundle is serialized and written on a separate thread. Each file is
+written to a temporary name, fsynced, and renamed into place, so a crash
+or a server reading the checkpoint mid-write never sees a partial file.
+
+On CUDA the snapshot buffers are pinned and reused. The device-to-host
+copy is asynchronous, and the writer thread waits for it to finish. On CPU
+the snapshot is dropped once it has been written. The trainers reload the
+best weights from disk at the end instead of keeping a deep copy in memory.
+
+KEEP_CHECKPOINTS > 1 keeps the last K saves as <name>-epochNNN.pth, with
+the usual checkpoint path pointing at the newest one.
+
+save_state() queues arbitrary training state (see training_state.py) on
+the same thread. It is written atomically in order with the bundles.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from checkpoint_bundle import load_weights, save_bundle
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+KEEP_CHECKPOINTS = int(os.environ.get("KEEP_CHECKPOINTS", 1))
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def replace_atomically(write, path):
+    """Call write(temporary_path), fsync it and rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write(temporary_path)
+        with open(temporary_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+def link_atomically(source, path):
+    """Point path at the same file as source (hard link; copy where unsupported)"""
+    def write(temporary_path):
+        try:
+            os.link(source, temporary_path)
+        except OSError:
+            with open(source, "rb") as src, open(temporary_path, "wb") as dst:
+                while chunk := src.read(1 << 24):
+                    dst.write(chunk)
+    replace_atomically(write, path)
+
+# ====================================================================
+# CHECKPOINT WRITER
+# ====================================================================
+
+class CheckpointWriter:
+    """Writes checkpoint bundles to path on a background thread, one at a time"""
+
+    def __init__(self, path, keep=KEEP_CHECKPOINTS, device=None):
+        self.path = path
+        self.keep = max(1, keep)
+        self.pinned = device is not None and device.type == "cuda"
+        self._buffers = None
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self.saved = 0
+
+    def versioned_path(self, epoch):
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}-epoch{epoch:03d}{ext}"
+
+    def snapshot(self, state_dict):
+        """Host copy of state_dict; (snapshot, event to wait for before reading it)"""
+        if not self.pinned:
+            return {name: tensor.detach().to("cpu", copy=True) for name, tensor in state_dict.items()}, None
+
+        if self._buffers is None or self._buffers.keys() != state_dict.keys():
+            self._buffers = {
+                name: torch.empty(tensor.shape, dtype=tensor.dtype, device="cpu", pin_memory=True)
+                for name, tensor in state_dict.items()
+            }
+        for name, tensor in state_dict.items():
+            self._buffers[name].copy_(tensor.detach(), non_blocking=True)
+        event = torch.cuda.Event()
+        event.record()
+        return self._buffers, event
+
+    def copy_to_host(self, value):
+        """Detached CPU copy of every tensor in a nested dict/list/tuple"""
+        if isinstance(value, torch.Tensor):
+            return value.detach().to("cpu", copy=True)
+        if isinstance(value, dict):
+            return {key: self.copy_to_host(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.copy_to_host(item) for item in value)
+        return value
+
+    def save(self, state_dict, epoch, class_names, backbone, **metadata):
+        """Snapshot the weights and queue the write; on CUDA, waits for the previous writes first"""
+        if self.pinned:
+            # The pinned buffers are reused, so earlier writes must be done with them
+            self.wait()
+        snapshot, copied = self.snapshot(state_dict)
+        self.collect()
+        self._pending.append(self._executor.submit(
+            self._write, snapshot, copied, epoch, class_names, backbone, metadata
+        ))
+
+    def save_state(self, state, path):
+        """Copy a training-state dict to the host and queue an atomic torch.save to path"""
+        snapshot = self.copy_to_host(state)
+        self.collect()
+        self._pending.append(self._executor.submit(
+            replace_atomically, lambda temporary_path: torch.save(snapshot, temporary_path), path
+        ))
+
+    def _write(self, snapshot, copied, epoch, class_names, backbone, metadata):
+        start = time.time()
+        if copied is not None:
+            copied.synchronize()
+
+        def write(temporary_path):
+            save_bundle(temporary_path, snapshot, class_names, backbone, **metadata)
+
+        if self.keep == 1:
+            replace_atomically(write, self.path)
+        else:
+            versioned_path = self.versioned_path(epoch)
+            replace_atomically(write, versioned_path)
+            link_atomically(versioned_path, self.path)
+            self.prune()
+        self.saved += 1
+        return time.time() - start
+
+    def prune(self):
+        """Delete versioned checkpoints beyond the newest `keep`"""
+        stem, ext = os.path.splitext(self.path)
+        versions = sorted(glob.glob(f"{glob.escape(stem)}-epoch[0-9][0-9][0-9]{ext}"), key=os.path.getmtime)
+        for old_path in versions[:-self.keep]:
+            os.remove(old_path)
+
+    def collect(self):
+        """Forget writes that already succeeded; failures stay queued for wait() to report"""
+        self._pending = [future for future in self._pending if not future.done() or future.exception()]
+
+    def wait(self):
+        """Block until the queued writes are on disk; a failed write is reported, not raised"""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Writing checkpoint {self.path} failed: {e}")
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
+        self._buffers = None
+
+    def load_latest(self, map_location="cpu"):
+        """Weights of the newest checkpoint, once every queued write has finished"""
+        self.wait()
+        return load_weights(self.path, map_location=map_location)
@@ -0,0 +1,63 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+
+import torch
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# "Optimized CPU" serving mode: channels_last weights and inputs, and
+# torch.inference_mode instead of no_grad around every forward pass.
+# Note that channels_last rewrites the conv weights into fresh memory, so
+# those tensors are no longer shared through the memory-mapped checkpoint.
+OPTIMIZE_CPU = os.environ.get("OPTIMIZE_CPU", "0") == "1"
+
+# Compile the eager model with torch.compile (needs a C++ toolchain) and
+# warm it up at startup so no request pays for compilation.
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+TORCH_COMPILE_MODE = os.environ.get("TORCH_COMPILE_MODE", "default")
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def inference_context():
+    """Grad-mode context every served forward pass runs under"""
+    return torch.inference_mode() if OPTIMIZE_CPU else torch.no_grad()
+
+def warm_up(backend, input_size, batch_sizes, device="cpu"):
+    """Run dummy batches through a backend before it takes traffic.
+
+    Triggers torch.compile (one static graph for a single image, then one
+    with a dynamic batch dimension) and oneDNN kernel selection. If
+    compilation fails, the backend is switched back to plain eager.
+    """
+    for batch_size in batch_sizes:
+        inputs = torch.zeros(batch_size, 3, input_size, input_size, device=device)
+        try:
+            with inference_context():
+                backend(inputs)
+        except Exception as e:
+            if not getattr(backend, "compiled", False):
+                raise
+            print(f"⚠️ torch.compile failed ({e}); serving the uncompiled model.")
+            backend.disable_compile()
+            with inference_context():
+                backend(inputs)
+
+def pin_to_cores(worker_index, worker_count):
+    """Restrict this process to its own contiguous slice of the allowed cores"""
+    if not hasattr(os, "sched_setaffinity"):
+        print("⚠️ CPU pinning is only supported on Linux; skipping.")
+        return None
+
+    cores = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cores) // max(1, worker_count))
+    start = (worker_index % max(1, worker_count)) * per_worker
+    assigned = cores[start:start + per_worker] or cores
+    os.sched_setaffinity(0, assigned)
+    return assigned
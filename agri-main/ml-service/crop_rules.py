@@ -0,0 +1,74 @@
+# ====================================================================
+# CROP DISEASE RULES
+# ====================================================================
+
+def build_detection(predicted_class, confidence):
+    """Build the response message and detection payload for one prediction"""
+    # FIXED: Better disease detection logic
+    detected = is_disease_detected(predicted_class)
+    
+    # Generate appropriate message and treatment
+    if detected:
+        message = f"Disease detected: {format_disease_name(predicted_class)}"
+        treatment = get_treatment_recommendation(predicted_class)
+    else:
+        message = f"Plant is healthy: {format_disease_name(predicted_class)}"
+        treatment = "No treatment needed - plant is healthy. Continue regular maintenance."
+
+    return message, {
+        "detected": detected,
+        "disease": format_disease_name(predicted_class),
+        "confidence": confidence,
+        "treatment": treatment
+    }
+
+def is_disease_detected(class_name):
+    """Determine if the prediction indicates a disease"""
+    class_lower = class_name.lower()
+    
+    # If class name contains 'healthy', it's not a disease
+    if 'healthy' in class_lower:
+        return False
+    
+    # If class name contains common disease indicators, it's a disease
+    disease_indicators = ['blight', 'spot', 'rot', 'mold', 'mildew', 'rust', 'powdery', 'bacterial', 'fungal', 'virus']
+    for indicator in disease_indicators:
+        if indicator in class_lower:
+            return True
+    
+    # Default: assume it's a disease if not explicitly healthy
+    return 'healthy' not in class_lower
+
+def format_disease_name(class_name):
+    """Format the class name for better display"""
+    # Remove file naming conventions and make it readable
+    formatted = class_name.replace('__', ' ').replace('_', ' ').replace('  ', ' ')
+    
+    # Capitalize first letter of each word
+    formatted = ' '.join(word.capitalize() for word in formatted.split())
+    
+    return formatted
+
+def get_treatment_recommendation(disease_class):
+    """Simple treatment recommendations based on disease"""
+    class_lower = disease_class.lower()
+    
+    treatments = {
+        "powdery_mildew": "Apply sulfur-based fungicide and improve air circulation. Remove severely infected leaves.",
+        "leaf_spot": "Remove affected leaves and apply copper-based fungicide. Avoid overhead watering.",
+        "blight": "Apply fungicide and avoid overhead watering. Remove and destroy infected plants.",
+        "rust": "Apply fungicide and remove infected plant parts. Ensure good air circulation.",
+        "mold": "Improve ventilation and reduce humidity. Apply appropriate fungicide.",
+        "rot": "Improve drainage and avoid overwatering. Remove affected parts immediately.",
+        "spot": "Apply fungicide and ensure proper spacing between plants for air flow.",
+    }
+    
+    for key, treatment in treatments.items():
+        if key in class_lower:
+            return treatment
+    
+    # If no specific treatment found but it's a disease
+    if is_disease_detected(disease_class):
+        return "Consult with agricultural expert for specific treatment recommendations. Isolate affected plants and maintain proper sanitation."
+    
+    return "No treatment needed - plant is healthy. Continue regular maintenance."
@@ -0,0 +1,318 @@
+"""Pre-decoded, pre-resized training cache for the trainers.
+
+ImageFolder re-decodes and re-resizes every full-size photo on every epoch.
+This compiles a class-folder dataset once: every image is decoded (at a
+reduced JPEG scale where possible) and resized to a fixed short side, and its
+uint8 pixels are appended to memory-mapped shard files. A label index records
+where each image lives.
+
+    python dataset_cache.py build plant_disease_data plant_disease_cache
+    python dataset_cache.py build livestock_data livestock_cache --short-side 320 --workers 8
+    python dataset_cache.py info plant_disease_cache
+
+CachedImageDataset serves the images as zero-copy views into the shards as
+uint8 CHW tensors, so the tensor versions of the usual augmentations
+(RandomResizedCrop, RandomHorizontalFlip, CenterCrop) run on the cached pixels.
+Budget about 200KB of disk per image at a 256px short side.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import torch
+from torch.utils.data import Dataset
+from torchvision import transforms
+from torchvision.datasets.folder import IMG_EXTENSIONS, find_classes
+
+from preprocessing import FastPreprocessor, RESIZE_SIZE, CROP_SIZE, IMAGENET_MEAN, IMAGENET_STD
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+CACHE_FORMAT = "agri-ml-dataset-cache"
+CACHE_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.npz"
+SHARD_PATTERN = "shard-{:05d}.u8"
+
+# Start a new shard file once the current one reaches this size
+SHARD_SIZE_MB = 1024
+
+# ====================================================================
+# SOURCE SCANNING
+# ====================================================================
+
+def scan_image_folder(data_dir):
+    """(class_names, [(relative_path, label)]) in ImageFolder order"""
+    class_names, class_to_idx = find_classes(data_dir)
+    samples = []
+    for class_name in class_names:
+        class_dir = os.path.join(data_dir, class_name)
+        for root, _, files in sorted(os.walk(class_dir, followlinks=True)):
+            for name in sorted(files):
+                if name.lower().endswith(IMG_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    samples.append((os.path.relpath(path, data_dir), class_to_idx[class_name]))
+    return class_names, samples
+
+def source_fingerprint(data_dir, samples):
+    """Hash of every source file's path, size and mtime; changes when the dataset does"""
+    digest = hashlib.sha256()
+    for relative_path, label in samples:
+        stat = os.stat(os.path.join(data_dir, relative_path))
+        digest.update(f"{relative_path}|{label}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+# ====================================================================
+# BUILD
+# ====================================================================
+
+_decoder = None
+
+def _init_decoder(short_side):
+    global _decoder
+    _decoder = FastPreprocessor(resize_size=short_side, crop_size=short_side, draft=True,
+                                flatten_alpha=True)
+
+def _decode(path):
+    """Return (HWC uint8 array, None) or (None, error) for one source image"""
+    try:
+        with open(path, "rb") as f:
+            image = _decoder.decode(f.read())
+        return np.asarray(image, dtype=np.uint8), None
+    except Exception as e:
+        return None, str(e)
+
+def build_cache(data_dir, output_dir, short_side=RESIZE_SIZE, workers=None, shard_size_mb=SHARD_SIZE_MB):
+    """Decode every image under data_dir once and write the shards and index to output_dir"""
+    class_names, samples = scan_image_folder(data_dir)
+    if not samples:
+        raise SystemExit(f"❌ No images found under {data_dir}")
+    print(f"Found {len(samples)} images in {len(class_names)} classes; decoding to a {short_side}px short side...")
+
+    # Build next to the destination and swap it in at the end, so an
+    # interrupted build never leaves a half-written cache behind
+    staging_dir = output_dir.rstrip(os.sep) + ".partial"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    shard_limit = int(shard_size_mb * 1024 * 1024)
+    records = {key: [] for key in ("shard", "offset", "height", "width", "label")}
+    kept_paths = []
+    skipped = []
+    shard_id, shard_bytes = 0, 0
+    shard_file = open(os.path.join(staging_dir, SHARD_PATTERN.format(shard_id)), "wb")
+
+    start = time.time()
+    paths = [os.path.join(data_dir, relative_path) for relative_path, _ in samples]
+    with Pool(workers or os.cpu_count(), initializer=_init_decoder, initargs=(short_side,)) as pool:
+        for count, ((relative_path, label), (pixels, error)) in enumerate(
+                zip(samples, pool.imap(_decode, paths, chunksize=16)), 1):
+            if pixels is None:
+                skipped.append({"path": relative_path, "error": error})
+                continue
+
+            if shard_bytes and shard_bytes + pixels.nbytes > shard_limit:
+                shard_file.close()
+                shard_id, shard_bytes = shard_id + 1, 0
+                shard_file = open(os.path.join(staging_dir, SHARD_PATTERN.format(shard_id)), "wb")
+
+            shard_file.write(pixels.tobytes())
+            records["shard"].append(shard_id)
+            records["offset"].append(shard_bytes)
+            records["height"].append(pixels.shape[0])
+            records["width"].append(pixels.shape[1])
+            records["label"].append(label)
+            kept_paths.append(relative_path)
+            shard_bytes += pixels.nbytes
+
+            if count % 1000 == 0:
+                print(f"  {count}/{len(samples)} images ({count / (time.time() - start):.0f} img/s)")
+    shard_file.close()
+
+    np.savez(
+        os.path.join(staging_dir, INDEX_FILE),
+        shard=np.array(records["shard"], dtype=np.int32),
+        offset=np.array(records["offset"], dtype=np.int64),
+        height=np.array(records["height"], dtype=np.int32),
+        width=np.array(records["width"], dtype=np.int32),
+        label=np.array(records["label"], dtype=np.int64),
+    )
+    manifest = {
+        "format": CACHE_FORMAT,
+        "version": CACHE_VERSION,
+        "source_dir": os.path.abspath(data_dir),
+        "source_fingerprint": source_fingerprint(data_dir, samples),
+        "class_names": class_names,
+        "short_side": short_side,
+        "num_samples": len(kept_paths),
+        "num_shards": shard_id + 1,
+        "samples": kept_paths,
+        "skipped": skipped,
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(staging_dir, output_dir)
+
+    for entry in skipped:
+        print(f"⚠️ Skipped unreadable image {entry['path']}: {entry['error']}")
+    print(f"✅ Cached {len(kept_paths)} images in {shard_id + 1} shard(s) at {output_dir} "
+          f"({time.time() - start:.0f}s)")
+    return manifest
+
+def read_manifest(cache_dir):
+    with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != CACHE_FORMAT or manifest.get("version") != CACHE_VERSION:
+        raise ValueError(f"{cache_dir} is not a version {CACHE_VERSION} dataset cache; rebuild it.")
+    return manifest
+
+def cache_is_current(cache_dir, data_dir, source_index=None):
+    """False when images were added, removed or modified since the cache was built.
+
+    With a dataset_index.DatasetIndex of data_dir, compares against the indexed
+    file stats instead of walking data_dir.
+    """
+    if source_index is not None:
+        return read_manifest(cache_dir)["source_fingerprint"] == source_index.source_fingerprint()
+    if not os.path.isdir(data_dir):
+        # Source not available here (cache copied to a training box): trust it
+        return True
+    _, samples = scan_image_folder(data_dir)
+    return read_manifest(cache_dir)["source_fingerprint"] == source_fingerprint(data_dir, samples)
+
+# ====================================================================
+# DATASET
+# ====================================================================
+
+class CachedImageDataset(Dataset):
+    """ImageFolder-compatible dataset over a compiled cache.
+
+    Items are (uint8 CHW tensor, label). The tensor is a zero-copy view into
+    a copy-on-write mapping of the shard, so nothing is read or allocated
+    until a transform touches the pixels. Shards are opened lazily in each
+    DataLoader worker.
+    """
+
+    def __init__(self, cache_dir, transform=None):
+        self.cache_dir = cache_dir
+        self.transform = transform
+
+        manifest = read_manifest(cache_dir)
+        self.classes = manifest["class_names"]
+        self.class_to_idx = {name: index for index, name in enumerate(self.classes)}
+        self.short_side = manifest["short_side"]
+
+        index = np.load(os.path.join(cache_dir, INDEX_FILE))
+        self.shard_ids = index["shard"]
+        self.offsets = index["offset"]
+        self.heights = index["height"]
+        self.widths = index["width"]
+        self.targets = index["label"].tolist()
+        self.samples = list(zip(manifest["samples"], self.targets))
+
+        self._shards = {}
+        self._owner_pid = None
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getstate__(self):
+        # Worker processes map the shards themselves
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        state["_owner_pid"] = None
+        return state
+
+    def _shard(self, shard_id):
+        if self._owner_pid != os.getpid():
+            self._shards = {}
+            self._owner_pid = os.getpid()
+        if shard_id not in self._shards:
+            path = os.path.join(self.cache_dir, SHARD_PATTERN.format(shard_id))
+            # mode="c": private copy-on-write mapping, writable views without touching the file
+            self._shards[shard_id] = np.memmap(path, dtype=np.uint8, mode="c")
+        return self._shards[shard_id]
+
+    def pixels(self, index):
+        """HWC uint8 numpy view of one cached image"""
+        height, width = int(self.heights[index]), int(self.widths[index])
+        offset = int(self.offsets[index])
+        shard = self._shard(int(self.shard_ids[index]))
+        return shard[offset:offset + height * width * 3].reshape(height, width, 3)
+
+    def __getitem__(self, index):
+        image = torch.from_numpy(self.pixels(index)).permute(2, 0, 1)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[index]
+
+def cached_transforms(short_side, crop_size=CROP_SIZE, resize_size=RESIZE_SIZE,
+                      mean=IMAGENET_MEAN, std=IMAGENET_STD):
+    """Train/val transforms for uint8 tensors from CachedImageDataset.
+
+    Same augmentation and evaluation pipeline as the ImageFolder transforms;
+    validation skips the Resize when the cache is already at resize_size.
+    """
+    to_float = [transforms.ConvertImageDtype(torch.float32), transforms.Normalize(mean, std)]
+    val_resize = [] if short_side == resize_size else [transforms.Resize(resize_size, antialias=True)]
+    return {
+        "train": transforms.Compose([
+            transforms.RandomResizedCrop(crop_size, antialias=True),
+            transforms.RandomHorizontalFlip(),
+        ] + to_float),
+        "val": transforms.Compose(val_resize + [transforms.CenterCrop(crop_size)] + to_float),
+    }
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Compile a class-folder dataset into a cache")
+    build.add_argument("data_dir")
+    build.add_argument("output_dir")
+    build.add_argument("--short-side", type=int, default=RESIZE_SIZE)
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    build.add_argument("--shard-size-mb", type=int, default=SHARD_SIZE_MB)
+
+    info = commands.add_parser("info", help="Describe a cache and check it against its source")
+    info.add_argument("cache_dir")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_cache(args.data_dir, args.output_dir, args.short_side, args.workers, args.shard_size_mb)
+        return
+
+    manifest = read_manifest(args.cache_dir)
+    size_mb = sum(
+        os.path.getsize(os.path.join(args.cache_dir, SHARD_PATTERN.format(shard)))
+        for shard in range(manifest["num_shards"])
+    ) / 1024 / 1024
+    print(f"source: {manifest['source_dir']}")
+    print(f"classes: {len(manifest['class_names'])}  images: {manifest['num_samples']}  "
+          f"skipped: {len(manifest['skipped'])}")
+    print(f"short side: {manifest['short_side']}px  shards: {manifest['num_shards']} ({size_mb:.0f}MB)")
+    print(f"up to date: {cache_is_current(args.cache_dir, manifest['source_dir'])}")
+
+if __name__ == "__main__":
+    main()
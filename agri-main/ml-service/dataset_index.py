@@ -0,0 +1,363 @@
+"""Persistent index of a class-folder dataset and its train/val split.
+
+ImageFolder walks and stats the whole directory tree on every trainer start.
+The index records each image's relative path, label, size, mtime and a
+content hash once, in a single file next to the data directory
+(<data_dir>.index.npz). The trainers load it instead of walking the tree.
+
+    python dataset_index.py update plant_disease_data
+    python dataset_index.py info plant_disease_data
+
+`update` builds the index, or refreshes an existing one: it rescans the tree
+and only hashes files that are new or whose size or mtime changed. Run it
+after adding or removing images (or set DATASET_INDEX_REFRESH=1 for one
+trainer run).
+
+Images listed in <data_dir>.quarantine.txt (written by validate_dataset.py)
+stay in the index and in the split computation; split_without_quarantined()
+removes them from the train and val indices afterwards. Every loader therefore gets
+the split validate_dataset.py analysed, quarantine or not.
+
+The train/val split is derived from the index, not from a random permutation,
+and stratified by class. Each class's images are ranked by their content
+hash mixed with DATASET_SPLIT_SEED, and the lowest ceil(val_ratio * n) go to
+validation (at least one for every class with two or more images). The split
+is the same in every run and in every script that uses it. Adding or
+removing an image moves at most one other image of its class across the
+cutoff, and identical files in a class land on the same side.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+import numpy as np
+
+from torch.utils.data import Dataset
+
+from checkpoint_writer import replace_atomically
+from dataset_cache import scan_image_folder
+from distributed_training import log
+from preprocessing import load_rgb
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+INDEX_FORMAT = "agri-ml-dataset-index"
+INDEX_VERSION = 1
+
+# Rescan DATA_DIR at trainer startup (default: trust the existing index)
+DATASET_INDEX_REFRESH = os.environ.get("DATASET_INDEX_REFRESH", "0") == "1"
+
+# Changing the seed draws a different (still deterministic) split
+DATASET_SPLIT_SEED = os.environ.get("DATASET_SPLIT_SEED", "agri-ml")
+
+HASH_BYTES = 16
+HASH_CHUNK_SIZE = 1 << 20
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def dataset_index_path(data_dir):
+    return os.path.normpath(data_dir) + ".index.npz"
+
+def quarantine_path(data_dir):
+    return os.path.normpath(data_dir) + ".quarantine.txt"
+
+def read_quarantine(path):
+    """Relative paths listed in a quarantine file (`path<TAB>reason` lines); empty when there is none"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.split("\t", 1)[0] for line in f.read().splitlines() if line and not line.startswith("#")}
+
+def drop_quarantined(indices, relative_paths, quarantined):
+    """indices without the images whose relative path is quarantined"""
+    return [position for position in indices if relative_paths[position] not in quarantined]
+
+def split_without_quarantined(data_dir, relative_paths, train_indices, val_indices):
+    """(train_indices, val_indices) minus the images in data_dir's quarantine file.
+
+    Takes the split of the full dataset, so the result matches what
+    validate_dataset.py analysed.
+    """
+    quarantined = read_quarantine(quarantine_path(data_dir))
+    if not quarantined:
+        return train_indices, val_indices
+    log(f"🚫 Leaving out {len(quarantined)} image(s) listed in {quarantine_path(data_dir)}")
+    return (drop_quarantined(train_indices, relative_paths, quarantined),
+            drop_quarantined(val_indices, relative_paths, quarantined))
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=HASH_BYTES)
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+def path_hash(relative_path):
+    """Stand-in key for an image whose content hash is not indexed"""
+    return hashlib.blake2b(relative_path.encode(), digest_size=HASH_BYTES).digest()
+
+def hashes_to_keys(hashes):
+    """First 8 bytes of each (N, HASH_BYTES) hash as uint64 split keys"""
+    return np.ascontiguousarray(hashes[:, :8]).view("<u8").ravel()
+
+# ====================================================================
+# INDEX
+# ====================================================================
+
+class DatasetIndex:
+    """Relative paths, labels, sizes, mtimes and content hashes of a class-folder dataset"""
+
+    def __init__(self, data_dir, class_names, paths, labels, sizes, mtimes, hashes, indexed_at=None):
+        self.data_dir = data_dir
+        self.class_names = list(class_names)
+        self.paths = list(paths)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.mtimes = np.asarray(mtimes, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        self.indexed_at = indexed_at or time.time()
+
+    def __len__(self):
+        return len(self.paths)
+
+    @cached_property
+    def samples(self):
+        """(absolute path, label) pairs in ImageFolder order, shared by every dataset over this index"""
+        root = os.path.join(self.data_dir, "")
+        return [(root + path, label) for path, label in zip(self.paths, self.labels.tolist())]
+
+    def keys(self):
+        return hashes_to_keys(self.hashes)
+
+    def subset(self, positions):
+        """A copy of the index with only the given positions, in that order"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return DatasetIndex(
+            self.data_dir, self.class_names, [self.paths[position] for position in positions.tolist()],
+            self.labels[positions], self.sizes[positions], self.mtimes[positions], self.hashes[positions],
+            self.indexed_at,
+        )
+
+    def source_fingerprint(self):
+        """dataset_cache.source_fingerprint() computed from the indexed stats, without touching the files"""
+        digest = hashlib.sha256()
+        stats = zip(self.paths, self.labels.tolist(), self.sizes.tolist(), self.mtimes.tolist())
+        for path, label, size, mtime in stats:
+            digest.update(f"{path}|{label}|{size}|{mtime}\n".encode())
+        return digest.hexdigest()
+
+    def save(self, index_path):
+        meta = {
+            "format": INDEX_FORMAT,
+            "version": INDEX_VERSION,
+            "class_names": self.class_names,
+            "indexed_at": self.indexed_at,
+        }
+
+        def write(temporary_path):
+            with open(temporary_path, "wb") as f:
+                np.savez(
+                    f,
+                    meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+                    # One newline-separated blob: far smaller and faster to load than a string array
+                    paths=np.frombuffer("\n".join(self.paths).encode(), dtype=np.uint8),
+                    labels=self.labels, sizes=self.sizes, mtimes=self.mtimes, hashes=self.hashes,
+                )
+        replace_atomically(write, index_path)
+
+    @classmethod
+    def load(cls, index_path, data_dir):
+        with np.load(index_path) as arrays:
+            meta = json.loads(arrays["meta"].tobytes())
+            if meta.get("format") != INDEX_FORMAT or meta.get("version") != INDEX_VERSION:
+                raise ValueError(f"{index_path} is not a version {INDEX_VERSION} dataset index; rebuild it.")
+            blob = arrays["paths"].tobytes().decode()
+            return cls(
+                data_dir, meta["class_names"], blob.split("\n") if blob else [],
+                arrays["labels"], arrays["sizes"], arrays["mtimes"], arrays["hashes"], meta["indexed_at"],
+            )
+
+def update_index(data_dir, index_path, workers=None):
+    """Scan data_dir and write its index, hashing only files the previous index doesn't match"""
+    start = time.time()
+    previous = DatasetIndex.load(index_path, data_dir) if os.path.exists(index_path) else None
+    known = {}
+    if previous is not None:
+        for position, path in enumerate(previous.paths):
+            known[path] = (int(previous.sizes[position]), int(previous.mtimes[position]), previous.hashes[position])
+
+    class_names, samples = scan_image_folder(data_dir)
+    if not samples:
+        raise SystemExit(f"❌ No images found under {data_dir}")
+
+    sizes, mtimes = [], []
+    hashes = np.zeros((len(samples), HASH_BYTES), dtype=np.uint8)
+    to_hash = []
+    for position, (path, _) in enumerate(samples):
+        stat = os.stat(os.path.join(data_dir, path))
+        sizes.append(stat.st_size)
+        mtimes.append(stat.st_mtime_ns)
+        entry = known.get(path)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            hashes[position] = entry[2]
+        else:
+            to_hash.append(position)
+
+    # hashlib releases the GIL on large reads, so threads overlap I/O and hashing
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        digests = pool.map(content_hash, [os.path.join(data_dir, samples[position][0]) for position in to_hash])
+        for position, digest in zip(to_hash, digests):
+            hashes[position] = np.frombuffer(digest, dtype=np.uint8)
+
+    index = DatasetIndex(data_dir, class_names, [path for path, _ in samples], [label for _, label in samples],
+                         sizes, mtimes, hashes)
+    index.save(index_path)
+
+    removed = len(set(known) - set(index.paths))
+    log(f"📇 Indexed {len(index)} images in {len(class_names)} classes at {index_path} "
+          f"({len(to_hash)} hashed, {removed} removed, {time.time() - start:.1f}s)")
+    return index
+
+def load_dataset_index(data_dir, index_path=None, refresh=DATASET_INDEX_REFRESH):
+    """The index of data_dir; built on first use, rescanned only when refresh is set"""
+    index_path = index_path or dataset_index_path(data_dir)
+    if refresh or not os.path.exists(index_path):
+        index = update_index(data_dir, index_path)
+    else:
+        index = DatasetIndex.load(index_path, data_dir)
+        age_hours = (time.time() - index.indexed_at) / 3600
+        log(f"📇 Loaded dataset index {index_path}: {len(index)} images, indexed {age_hours:.1f}h ago "
+              f"(refresh with `python dataset_index.py update`)")
+
+    return index
+
+def sample_keys(relative_paths, index=None):
+    """Split keys for images given by relative path: content hashes where indexed, else path hashes"""
+    hashes = {}
+    if index is not None:
+        hashes = dict(zip(index.paths, index.hashes))
+    return hashes_to_keys(np.stack([
+        hashes[path] if path in hashes else np.frombuffer(path_hash(path), dtype=np.uint8)
+        for path in relative_paths
+    ]))
+
+# ====================================================================
+# SPLIT
+# ====================================================================
+
+def class_val_count(class_size, val_ratio):
+    """Validation images for a class: ceil(val_ratio * n), at least 1 once the class has 2 images"""
+    if class_size < 2 or val_ratio <= 0:
+        return 0
+    return min(max(math.ceil(val_ratio * class_size), 1), class_size)
+
+def hash_split(keys, labels, val_ratio, seed=DATASET_SPLIT_SEED):
+    """(train_indices, val_indices), sorted and stratified by label.
+
+    Within each class the images are ordered by their mixed key and the
+    lowest class_val_count() go to val, so adding or removing an image only
+    moves the image at that class's cutoff. Equal keys (identical files)
+    share a side.
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    labels = np.asarray(labels, dtype=np.int64)
+    seed_key = np.uint64(int.from_bytes(hashlib.blake2b(str(seed).encode(), digest_size=8).digest(), "little"))
+    # Bijective mix of the keys: a different seed gives an unrelated split
+    with np.errstate(over="ignore"):
+        ranks = (keys ^ seed_key) * np.uint64(0x9E3779B97F4A7C15)
+
+    is_val = np.zeros(len(keys), dtype=bool)
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        val_count = class_val_count(len(members), val_ratio)
+        if val_count:
+            class_ranks = ranks[members]
+            # Ties at the cutoff all go to val, so identical files stay together
+            cutoff = np.partition(class_ranks, val_count - 1)[val_count - 1]
+            is_val[members] = class_ranks <= cutoff
+    return np.flatnonzero(~is_val).tolist(), np.flatnonzero(is_val).tolist()
+
+# ====================================================================
+# DATASET
+# ====================================================================
+
+class IndexedImageDataset(Dataset):
+    """ImageFolder over a DatasetIndex: same samples, classes and items, no directory walk.
+
+    Images are loaded with preprocessing.load_rgb, which flattens transparency
+    onto white (see validate_dataset.py).
+    """
+
+    def __init__(self, index, transform=None, loader=load_rgb):
+        self.root = index.data_dir
+        self.transform = transform
+        self.loader = loader
+        self.classes = index.class_names
+        self.class_to_idx = {name: position for position, name in enumerate(self.classes)}
+        self.samples = index.samples
+        self.targets = index.labels.tolist()
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, position):
+        path, label = self.samples[position]
+        image = self.loader(path)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, label
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="Build or incrementally refresh the index of a dataset")
+    update.add_argument("data_dir")
+    update.add_argument("--index", help="Index file (default: <data_dir>.index.npz)")
+    update.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing threads")
+
+    info = commands.add_parser("info", help="Describe an index and the train/val split it gives")
+    info.add_argument("data_dir")
+    info.add_argument("--index", help="Index file (default: <data_dir>.index.npz)")
+    info.add_argument("--val-ratio", type=float, default=0.2)
+
+    args = parser.parse_args()
+    index_path = args.index or dataset_index_path(args.data_dir)
+
+    if args.command == "update":
+        update_index(args.data_dir, index_path, args.workers)
+        return
+
+    start = time.time()
+    index = DatasetIndex.load(index_path, args.data_dir)
+    load_seconds = time.time() - start
+    train_indices, val_indices = hash_split(index.keys(), index.labels, args.val_ratio)
+    val_labels = np.bincount(index.labels[val_indices], minlength=len(index.class_names))
+    all_labels = np.bincount(index.labels, minlength=len(index.class_names))
+
+    print(f"index: {index_path} (loaded in {load_seconds * 1000:.0f}ms)")
+    print(f"images: {len(index)}  classes: {len(index.class_names)}  size: {index.sizes.sum() / 1024 / 1024:.0f}MB")
+    print(f"split (seed '{DATASET_SPLIT_SEED}', ratio {args.val_ratio}): {len(train_indices)} train / {len(val_indices)} val")
+    for name, total, val in zip(index.class_names, all_labels.tolist(), val_labels.tolist()):
+        print(f"    {name}: {total} images, {val} val")
+
+if __name__ == "__main__":
+    main()
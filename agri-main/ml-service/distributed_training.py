@@ -0,0 +1,214 @@
+"""DistributedDataParallel support for the trainers (gloo, CPU hosts).
+
+The trainers call init_distributed() at startup. Without torchrun's
+environment (WORLD_SIZE unset or 1) every helper here is a no-op and
+training runs in one process as before. Under train_distributed.py or
+torchrun, each process:
+
+  - joins a gloo process group and uses its share of the host's cores for
+    torch's intra-op threads
+  - uses the same index-derived train/val split as every other rank
+  - trains on its own shard of the train subset (DistributedSampler,
+    reshuffled every epoch) and evaluates its own shard of the val subset
+  - all-reduces gradients once per optimizer step (not per micro-batch)
+    and the epoch metrics once per phase
+  - logs (log()) and writes checkpoints only on rank 0; warnings and errors
+    printed with print() still show on every rank
+
+The effective batch size is BATCH_SIZE x WORLD_SIZE; scale LEARNING_RATE
+accordingly if needed.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, Sampler
+
+from cpu_tuning import pin_to_cores
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+DIST_BACKEND = os.environ.get("DIST_BACKEND", "gloo")
+
+# Pin each local rank to its own contiguous slice of cores (Linux)
+DDP_PIN_CORES = os.environ.get("DDP_PIN_CORES", "0") == "1"
+
+# Keep log() output on every rank (default: rank 0 only)
+DDP_LOG_ALL_RANKS = os.environ.get("DDP_LOG_ALL_RANKS", "0") == "1"
+
+# Batches each DataLoader worker prepares ahead of the training loop
+DATALOADER_PREFETCH_FACTOR = int(os.environ.get("DATALOADER_PREFETCH_FACTOR", 4))
+
+# ====================================================================
+# LOGGING
+# ====================================================================
+
+# Turned off on non-zero ranks by init_distributed()
+_log_enabled = True
+
+def log(*args, **kwargs):
+    """print() for training progress: rank 0 only under DDP, unless DDP_LOG_ALL_RANKS"""
+    if _log_enabled:
+        print(*args, **kwargs)
+
+# ====================================================================
+# PROCESS GROUP
+# ====================================================================
+
+@dataclass
+class DistContext:
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+    local_world_size: int = 1
+
+    @property
+    def enabled(self):
+        return self.world_size > 1
+
+    @property
+    def is_main(self):
+        return self.rank == 0
+
+def init_distributed():
+    """Join the process group when started by torchrun; returns a DistContext"""
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size <= 1:
+        return DistContext()
+
+    context = DistContext(
+        rank=int(os.environ["RANK"]),
+        world_size=world_size,
+        local_rank=int(os.environ.get("LOCAL_RANK", 0)),
+        local_world_size=int(os.environ.get("LOCAL_WORLD_SIZE", 1)),
+    )
+    dist.init_process_group(backend=DIST_BACKEND)
+
+    if DDP_PIN_CORES:
+        pin_to_cores(context.local_rank, context.local_world_size)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    # When pinned, the affinity mask already holds only this rank's cores
+    threads = cores if DDP_PIN_CORES else cores // context.local_world_size
+    torch.set_num_threads(max(1, threads))
+
+    global _log_enabled
+    _log_enabled = context.is_main or DDP_LOG_ALL_RANKS
+    log(f"🧵 DDP: {world_size} processes ({DIST_BACKEND}), {torch.get_num_threads()} threads each")
+    return context
+
+def device_for(context):
+    """CUDA device for this local rank when available, else CPU"""
+    if torch.cuda.is_available():
+        return torch.device(f"cuda:{context.local_rank % torch.cuda.device_count()}")
+    return torch.device("cpu")
+
+def barrier(context):
+    if context.enabled:
+        dist.barrier()
+
+@contextmanager
+def main_process_first(context):
+    """Rank 0 runs the block first (e.g. builds a cache); the others follow once it is done"""
+    if not context.is_main:
+        barrier(context)
+    yield
+    if context.is_main:
+        barrier(context)
+
+def broadcast_flag(flag, context):
+    """Rank 0's value of a bool, so every rank takes the same decision (e.g. to stop)"""
+    if not context.enabled:
+        return flag
+    tensor = torch.tensor([int(flag)])
+    dist.broadcast(tensor, src=0)
+    return bool(tensor.item())
+
+# ====================================================================
+# DATA
+# ====================================================================
+
+class ShardSampler(Sampler):
+    """Every world_size-th index starting at rank, without padding.
+
+    DistributedSampler repeats samples to even out the shards, which would
+    count some validation images twice.
+    """
+
+    def __init__(self, dataset, context):
+        self.indices = list(range(context.rank, len(dataset), context.world_size))
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+def loader_options(num_workers, device=None):
+    """Pinned host memory for CUDA; workers that persist across epochs and prefetch ahead"""
+    options = {"num_workers": num_workers, "pin_memory": device is not None and device.type == "cuda"}
+    if num_workers > 0:
+        options.update(persistent_workers=True, prefetch_factor=DATALOADER_PREFETCH_FACTOR)
+    return options
+
+def make_dataloaders(image_datasets, batch_size, context, num_workers=4, device=None):
+    """Train/val DataLoaders, sharded across ranks when distributed"""
+    options = loader_options(num_workers, device)
+    if not context.enabled:
+        return {
+            'train': DataLoader(image_datasets['train'], batch_size=batch_size, shuffle=True, **options),
+            'val': DataLoader(image_datasets['val'], batch_size=batch_size, shuffle=False, **options)
+        }
+    train_sampler = DistributedSampler(
+        image_datasets['train'], num_replicas=context.world_size, rank=context.rank, shuffle=True
+    )
+    return {
+        'train': DataLoader(image_datasets['train'], batch_size=batch_size, sampler=train_sampler, **options),
+        'val': DataLoader(image_datasets['val'], batch_size=batch_size, sampler=ShardSampler(image_datasets['val'], context),
+                          **options)
+    }
+
+def set_epoch(dataloader, epoch):
+    """Reshuffle a DistributedSampler for this epoch"""
+    if isinstance(dataloader.sampler, DistributedSampler):
+        dataloader.sampler.set_epoch(epoch)
+
+# ====================================================================
+# MODEL
+# ====================================================================
+
+def wrap_model(model, context, device):
+    """DistributedDataParallel wrapper when distributed, else the model itself"""
+    if not context.enabled:
+        return model
+    device_ids = [device.index] if device.type == "cuda" else None
+    return DistributedDataParallel(model, device_ids=device_ids)
+
+def unwrap_model(model):
+    """The module inside a DDP wrapper: for state_dict() and evaluation"""
+    return model.module if isinstance(model, DistributedDataParallel) else model
+
+def broadcast_module(module, context):
+    """Copy rank 0's parameters and buffers into module on every rank"""
+    if context.enabled:
+        for tensor in module.state_dict().values():
+            dist.broadcast(tensor, src=0)
+
+def gradient_sync(model, will_step):
+    """Skip the gradient all-reduce on micro-batches that don't end in an optimizer step"""
+    if isinstance(model, DistributedDataParallel) and not will_step:
+        return model.no_sync()
+    return nullcontext()
+
+def cleanup(context):
+    if context.enabled:
+        dist.destroy_process_group()
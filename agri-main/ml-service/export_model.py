@@ -0,0 +1,120 @@
+"""Export the crop and cattle models for the non-eager inference backends.
+
+Writes, next to the checkpoint bundle (or to --output-dir):
+
+  <checkpoint>_scripted.pt   TorchScript, served with INFERENCE_BACKEND=torchscript
+  <checkpoint>.onnx          ONNX (dynamic batch axis), served with INFERENCE_BACKEND=onnx
+
+Both artifacts embed the bundle metadata (classes, input size, normalization),
+so the servers need nothing else. Every export is checked against the eager
+model on a random batch.
+
+    python export_model.py crop
+    python export_model.py cattle --formats onnx
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+
+import torch
+
+from checkpoint_bundle import save_scripted
+from inference_backends import (
+    ONNX_INPUT_NAME, ONNX_OUTPUT_NAME, ONNX_METADATA_KEY,
+    TorchScriptBackend, OnnxRuntimeBackend, artifact_path
+)
+from model_registry import MODEL_SPECS, load_trained_model
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+EXPORT_FORMATS = ["torchscript", "onnx"]
+ONNX_OPSET = 17
+# Largest acceptable |eager - exported| logit difference
+VERIFY_TOLERANCE = 1e-3
+
+# ====================================================================
+# EXPORTERS
+# ====================================================================
+
+def export_torchscript(model, metadata, example_inputs, path):
+    with torch.no_grad():
+        scripted = torch.jit.trace(model, example_inputs)
+    save_scripted(path, torch.jit.freeze(scripted), metadata, precision="fp32")
+
+def export_onnx(model, metadata, example_inputs, path):
+    import onnx
+
+    torch.onnx.export(
+        model, (example_inputs,), path,
+        input_names=[ONNX_INPUT_NAME],
+        output_names=[ONNX_OUTPUT_NAME],
+        dynamic_axes={ONNX_INPUT_NAME: {0: "batch"}, ONNX_OUTPUT_NAME: {0: "batch"}},
+        opset_version=ONNX_OPSET,
+        dynamo=False,
+    )
+
+    # Embed the bundle metadata so the ONNX file is self-describing
+    exported = onnx.load(path)
+    entry = exported.metadata_props.add()
+    entry.key = ONNX_METADATA_KEY
+    entry.value = json.dumps(metadata)
+    onnx.save(exported, path)
+
+def verify(model, runtime, input_size):
+    inputs = torch.randn(3, 3, input_size, input_size)
+    with torch.no_grad():
+        expected = model(inputs)
+        actual = runtime(inputs)
+    return (expected - actual).abs().max().item()
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", choices=sorted(MODEL_SPECS.keys()))
+    parser.add_argument("--checkpoint", help="FP32 bundle (defaults to the model's checkpoint path)")
+    parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=EXPORT_FORMATS)
+    parser.add_argument("--output-dir", help="Directory for the artifacts (defaults to next to the checkpoint)")
+    args = parser.parse_args()
+
+    spec = MODEL_SPECS[args.model]
+    checkpoint_path = args.checkpoint or spec.checkpoint_path
+    model, metadata = load_trained_model(checkpoint_path)
+    example_inputs = torch.randn(2, 3, metadata["input_size"], metadata["input_size"])
+    print(f"✅ Loaded {metadata['backbone']} with {len(metadata['class_names'])} classes from {checkpoint_path}")
+
+    failed = False
+    for export_format in args.formats:
+        path = artifact_path(checkpoint_path, export_format)
+        if args.output_dir:
+            path = os.path.join(args.output_dir, os.path.basename(path))
+
+        print(f"Exporting {export_format} -> {path}")
+        if export_format == "torchscript":
+            export_torchscript(model, metadata, example_inputs, path)
+            runtime = TorchScriptBackend(path)
+        else:
+            export_onnx(model, metadata, example_inputs, path)
+            runtime = OnnxRuntimeBackend(path)
+
+        difference = verify(model, runtime, metadata["input_size"])
+        if difference > VERIFY_TOLERANCE:
+            failed = True
+            print(f"❌ {export_format}: max |Δlogit| = {difference:.2e} exceeds {VERIFY_TOLERANCE}")
+        else:
+            print(f"✅ {export_format}: max |Δlogit| = {difference:.2e}")
+
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Frozen-backbone feature caching for partial fine-tuning.
+
+With FREEZE_LAYERS the trainers only update the tail of the network, yet the
+frozen head (ResNet stem + layer1 + layer2, or the whole EfficientNet feature
+extractor) still runs on every batch of every epoch and always produces the
+same activations for the same pixels. This computes those activations once
+for a fixed set of deterministic views of every image (center crop, corner
+crops, their mirror images), stores them in a memory-mapped .npy file
+(float16 by default), and trains only the unfrozen suffix from there.
+
+Each training epoch picks one cached view per image at random, which keeps
+some augmentation; validation always uses the center view, like the usual
+Resize + CenterCrop transform.
+
+The cache covers the whole dataset, so it survives a different train/val
+split, and it is rebuilt whenever the frozen weights, the images or the view
+settings change. Budget per image and view: about 800KB at float16 for the
+ResNet-50 layer2 output, 3.5KB for the EfficientNet-B4 pooled features.
+
+Note: the frozen layers run in eval mode here, so their BatchNorm running
+statistics stay at the pretrained values instead of drifting during training.
+
+    python feature_cache.py info plant_disease_features
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+from torchvision.transforms import functional as F
+
+from distributed_training import log
+from preprocessing import RESIZE_SIZE, CROP_SIZE, IMAGENET_MEAN, IMAGENET_STD
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+CACHE_FORMAT = "agri-ml-feature-cache"
+CACHE_VERSION = 1
+
+META_FILE = "meta.json"
+FEATURES_FILE = "features.npy"
+LABELS_FILE = "labels.npy"
+
+# Deterministic views cached per image. The first one is what validation uses.
+VIEWS = ["center", "center_flip", "top_left", "top_right", "bottom_left", "bottom_right",
+         "top_left_flip", "top_right_flip", "bottom_left_flip", "bottom_right_flip"]
+FEATURE_CACHE_VIEWS = int(os.environ.get("FEATURE_CACHE_VIEWS", 4))
+
+# float16 halves the disk and page-cache footprint; the suffix trains in float32
+FEATURE_CACHE_DTYPE = os.environ.get("FEATURE_CACHE_DTYPE", "float16")
+FEATURE_CACHE_BATCH_SIZE = int(os.environ.get("FEATURE_CACHE_BATCH_SIZE", 32))
+
+# Final classification module per backbone: the forward pass flattens before it
+BACKBONE_HEADS = {
+    "resnet50": "fc",
+    "efficientnet_b4": "classifier",
+}
+
+# ====================================================================
+# MODEL SPLITTING
+# ====================================================================
+
+class TrainableSuffix(nn.Module):
+    """Runs the unfrozen tail of a backbone on cached prefix activations.
+
+    Parameters, train()/eval() and state_dict()/load_state_dict() are those of
+    the full model, so the training loop and save_bundle() are unaffected.
+    """
+
+    def __init__(self, model, names, head):
+        super().__init__()
+        self.model = model
+        self.names = list(names)
+        self.head = head
+
+    def forward(self, x):
+        for name in self.names:
+            if name == self.head:
+                x = torch.flatten(x, 1)
+            x = getattr(self.model, name)(x)
+        return x
+
+    def state_dict(self, *args, **kwargs):
+        return self.model.state_dict(*args, **kwargs)
+
+    def load_state_dict(self, state_dict, strict=True, assign=False):
+        return self.model.load_state_dict(state_dict, strict=strict, assign=assign)
+
+def split_frozen_model(model, backbone):
+    """(prefix, suffix, prefix_names): the leading fully-frozen children and the rest.
+
+    Raises ValueError when the first layer is trainable or nothing is.
+    """
+    children = list(model.named_children())
+    trainable = [any(param.requires_grad for param in module.parameters()) for _, module in children]
+    if not any(trainable) or trainable[0]:
+        raise ValueError("The model has no frozen prefix followed by trainable layers to cache.")
+
+    cut = trainable.index(True)
+    prefix_names = [name for name, _ in children[:cut]]
+    prefix = nn.Sequential(*[module for _, module in children[:cut]])
+    suffix = TrainableSuffix(model, [name for name, _ in children[cut:]], BACKBONE_HEADS[backbone])
+    return prefix, suffix, prefix_names
+
+def weights_fingerprint(module):
+    """Hash of a module's parameters and buffers"""
+    digest = hashlib.sha256()
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+# ====================================================================
+# VIEWS
+# ====================================================================
+
+class ViewTransform:
+    """Image (PIL or uint8 CHW tensor) -> stacked [V, 3, crop, crop] normalized views"""
+
+    def __init__(self, views, resize_size=RESIZE_SIZE, crop_size=CROP_SIZE, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.views = list(views)
+        self.resize_size = resize_size
+        self.crop_size = crop_size
+        self.normalize = transforms.Normalize(mean, std)
+
+    def crop(self, image, view):
+        name = view[:-len("_flip")] if view.endswith("_flip") else view
+        height, width = image.shape[-2:]
+        size = self.crop_size
+        if name == "center":
+            crop = F.center_crop(image, [size, size])
+        else:
+            top = 0 if name.startswith("top") else height - size
+            left = 0 if name.endswith("left") else width - size
+            crop = image[..., top:top + size, left:left + size]
+        return F.hflip(crop) if view.endswith("_flip") else crop
+
+    def __call__(self, image):
+        if not isinstance(image, torch.Tensor):
+            image = F.pil_to_tensor(image)
+        if min(image.shape[-2:]) != self.resize_size:
+            image = F.resize(image, self.resize_size, antialias=True)
+        image = self.normalize(F.convert_image_dtype(image, torch.float32))
+        return torch.stack([self.crop(image, view) for view in self.views])
+
+# ====================================================================
+# BUILD
+# ====================================================================
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != CACHE_FORMAT or meta.get("version") != CACHE_VERSION:
+        return None
+    return meta
+
+def cache_key(prefix, prefix_names, samples, views, resize_size, crop_size, mean, std, dtype):
+    """Everything the cached activations depend on"""
+    digest = hashlib.sha256()
+    for path, label in samples:
+        digest.update(f"{path}|{label}\n".encode())
+    return {
+        "prefix": prefix_names,
+        "prefix_weights": weights_fingerprint(prefix),
+        "samples": digest.hexdigest(),
+        "views": list(views),
+        "resize_size": resize_size,
+        "crop_size": crop_size,
+        "mean": [float(value) for value in mean],
+        "std": [float(value) for value in std],
+        "dtype": dtype,
+    }
+
+def build_feature_cache(prefix, prefix_names, dataset, cache_dir, device, views=None,
+                        resize_size=RESIZE_SIZE, crop_size=CROP_SIZE, mean=IMAGENET_MEAN, std=IMAGENET_STD,
+                        dtype=FEATURE_CACHE_DTYPE, batch_size=FEATURE_CACHE_BATCH_SIZE, num_workers=4):
+    """Run the frozen prefix once over every view of every image in dataset.
+
+    dataset is an ImageFolder or CachedImageDataset; its transform is replaced
+    with the view transform. Reuses an existing cache when its key matches.
+    """
+    views = list(views or VIEWS[:FEATURE_CACHE_VIEWS])
+    key = cache_key(prefix, prefix_names, dataset.samples, views, resize_size, crop_size, mean, std, dtype)
+    meta = _read_meta(cache_dir)
+    if meta and meta["key"] == key:
+        log(f"✅ Reusing frozen-layer features from {cache_dir}")
+        return meta
+
+    log(f"Caching frozen-layer features ({' + '.join(prefix_names)}) for {len(dataset)} images "
+          f"x {len(views)} views...")
+    dataset.transform = ViewTransform(views, resize_size, crop_size, mean, std)
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+
+    prefix = prefix.to(device).eval()
+    with torch.inference_mode():
+        probe = prefix(torch.zeros(1, 3, crop_size, crop_size, device=device))
+    feature_shape = tuple(probe.shape[1:])
+
+    staging_dir = cache_dir.rstrip(os.sep) + ".partial"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    features = np.lib.format.open_memmap(
+        os.path.join(staging_dir, FEATURES_FILE), mode="w+", dtype=np.dtype(dtype),
+        shape=(len(dataset), len(views)) + feature_shape,
+    )
+    labels = np.empty(len(dataset), dtype=np.int64)
+
+    start = time.time()
+    position = 0
+    with torch.inference_mode():
+        for inputs, targets in loader:
+            count = inputs.shape[0]
+            outputs = prefix(inputs.flatten(0, 1).to(device))
+            outputs = outputs.view(count, len(views), *feature_shape)
+            features[position:position + count] = outputs.cpu().numpy().astype(dtype, copy=False)
+            labels[position:position + count] = targets.numpy()
+            position += count
+    features.flush()
+    del features
+    np.save(os.path.join(staging_dir, LABELS_FILE), labels)
+
+    meta = {
+        "format": CACHE_FORMAT,
+        "version": CACHE_VERSION,
+        "key": key,
+        "num_samples": len(dataset),
+        "feature_shape": list(feature_shape),
+    }
+    with open(os.path.join(staging_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.rename(staging_dir, cache_dir)
+    log(f"✅ Cached features at {cache_dir} ({time.time() - start:.0f}s)")
+    return meta
+
+# ====================================================================
+# DATASET
+# ====================================================================
+
+class FeatureCacheDataset(Dataset):
+    """(float32 activations, label) items from a feature cache.
+
+    random_view=True picks one of the cached views per item (training);
+    otherwise the first, center view is used (validation).
+    """
+
+    def __init__(self, cache_dir, random_view=False):
+        self.cache_dir = cache_dir
+        self.random_view = random_view
+        self.targets = np.load(os.path.join(cache_dir, LABELS_FILE)).tolist()
+        self._features = None
+        self._owner_pid = None
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_features"] = None
+        state["_owner_pid"] = None
+        return state
+
+    def features(self):
+        if self._owner_pid != os.getpid():
+            # mode="c": writable copy-on-write view, no copy until written to
+            self._features = np.load(os.path.join(self.cache_dir, FEATURES_FILE), mmap_mode="c")
+            self._owner_pid = os.getpid()
+        return self._features
+
+    def __getitem__(self, index):
+        features = self.features()
+        view = int(torch.randint(features.shape[1], ())) if self.random_view else 0
+        return torch.from_numpy(features[index, view]).float(), self.targets[index]
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="Describe a feature cache")
+    info.add_argument("cache_dir")
+    args = parser.parse_args()
+
+    meta = _read_meta(args.cache_dir)
+    if meta is None:
+        raise SystemExit(f"❌ {args.cache_dir} is not a version {CACHE_VERSION} feature cache")
+    size_mb = os.path.getsize(os.path.join(args.cache_dir, FEATURES_FILE)) / 1024 / 1024
+    key = meta["key"]
+    print(f"frozen prefix: {' + '.join(key['prefix'])}")
+    print(f"images: {meta['num_samples']}  views: {', '.join(key['views'])}")
+    print(f"features: {meta['feature_shape']} {key['dtype']} ({size_mb:.0f}MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import json
+import os
+
+import torch
+
+from checkpoint_bundle import load_scripted, bundle_metadata, derived_artifact_path
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+BACKENDS = ["eager", "torchscript", "onnx", "quantized"]
+
+# Artifact written by export_model.py / quantize_model.py next to the checkpoint
+ARTIFACT_SUFFIXES = {
+    "torchscript": "_scripted.pt",
+    "onnx": ".onnx",
+    "quantized": "_int8.pt",
+}
+
+ONNX_INPUT_NAME = "input"
+ONNX_OUTPUT_NAME = "logits"
+ONNX_METADATA_KEY = "agri_metadata"
+
+# ====================================================================
+# BACKENDS
+# ====================================================================
+
+# Every backend is a callable taking a float32 NCHW batch and returning
+# NxC logits as a CPU/device torch tensor, so the batch scheduler and the
+# /predict_batch path do not care which runtime sits behind them.
+
+class EagerBackend:
+    """Plain torchvision module in eager mode, optionally channels_last and/or compiled"""
+    name = "eager"
+    precision = "fp32"
+
+    def __init__(self, module, channels_last=False, compile_mode=None):
+        self.module = module.eval()
+        self.channels_last = channels_last
+        if channels_last:
+            self.module = self.module.to(memory_format=torch.channels_last)
+
+        self.forward = self.module
+        self.compiled = compile_mode is not None
+        if self.compiled:
+            self.forward = torch.compile(self.module, mode=compile_mode)
+
+    @property
+    def optimizations(self):
+        enabled = []
+        if self.channels_last:
+            enabled.append("channels_last")
+        if self.compiled:
+            enabled.append("torch.compile")
+        return enabled
+
+    def disable_compile(self):
+        self.forward = self.module
+        self.compiled = False
+
+    def __call__(self, inputs):
+        if self.channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+        return self.forward(inputs)
+
+class TorchScriptBackend:
+    """TorchScript archive (FP32 export or INT8 from quantize_model.py)"""
+    name = "torchscript"
+    optimizations = []
+
+    def __init__(self, path, map_location="cpu"):
+        module, payload = load_scripted(path, map_location=map_location)
+        self.module = module.eval()
+        self.metadata = bundle_metadata(payload)
+        self.precision = payload.get("precision", "fp32")
+
+    def __call__(self, inputs):
+        return self.module(inputs)
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime CPU session with full graph optimizations.
+
+    ORT thread pools do not survive fork(), so a backend loaded before the
+    process forks opens a fresh session in each child on first use.
+    """
+    name = "onnx"
+    precision = "fp32"
+    optimizations = []
+
+    def __init__(self, path, intra_op_threads=None):
+        self.path = path
+        self.intra_op_threads = intra_op_threads
+        self._owner_pid = None
+        self._session = None
+
+        custom = self.session().get_modelmeta().custom_metadata_map
+        self.metadata = bundle_metadata(json.loads(custom[ONNX_METADATA_KEY]))
+
+    def session(self):
+        import onnxruntime as ort
+
+        if self._session is not None and self._owner_pid == os.getpid():
+            return self._session
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Default to this process's torch thread budget
+        options.intra_op_num_threads = self.intra_op_threads or torch.get_num_threads()
+        self._session = ort.InferenceSession(self.path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._owner_pid = os.getpid()
+        return self._session
+
+    def __call__(self, inputs):
+        feed = {ONNX_INPUT_NAME: inputs.detach().cpu().contiguous().numpy()}
+        logits = self.session().run([ONNX_OUTPUT_NAME], feed)[0]
+        return torch.from_numpy(logits)
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def artifact_path(checkpoint_path, backend):
+    """Default artifact location for a backend, derived from the checkpoint path"""
+    if backend == "eager":
+        return checkpoint_path
+    return derived_artifact_path(checkpoint_path, ARTIFACT_SUFFIXES[backend])
@@ -0,0 +1,439 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Per-model request instrumentation. Recording is a few perf_counter calls
+# and a bucket increment under a lock, cheap enough to leave on.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Latency buckets in seconds, as Prometheus expects
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Where a /predict request spends its time, in order
+STAGES = ["upload", "cache_lookup", "decode", "transform", "queue_wait", "forward", "serialize"]
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Under serve.py every worker writes its metrics to a shared directory this
+# often, and /metrics and /status report the sum over all workers
+METRICS_PUBLISH_INTERVAL = float(os.environ.get("METRICS_PUBLISH_INTERVAL", 1.0))
+
+# A worker whose snapshot is older than this no longer counts for the gauges
+METRICS_STALE_AFTER = 5 * METRICS_PUBLISH_INTERVAL
+
+# Counters of exited workers, folded together by the serve.py master
+RETIRED_METRICS_FILE = "retired.json"
+
+# ====================================================================
+# HISTOGRAM
+# ====================================================================
+
+class Histogram:
+    """Fixed-bucket histogram; callers serialize access"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        # One extra slot for observations above the largest bucket (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def state(self):
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count, "min": self.min, "max": self.max}
+
+    def merge(self, state):
+        """Add another histogram's state (same buckets)"""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, state["counts"])]
+        self.sum += state["sum"]
+        self.count += state["count"]
+        self.min = min(self.min, state["min"])
+        self.max = max(self.max, state["max"])
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield upper, total
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating linearly inside the matching one
+        and clamping to the observed range"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        seen = 0
+        estimate = self.max
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                break
+            seen += count
+            lower = upper
+        return min(max(estimate, self.min), self.max)
+
+    def summary(self, scale=1.0):
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count * scale,
+            "p50": self.quantile(0.5) * scale,
+            "p95": self.quantile(0.95) * scale,
+            "p99": self.quantile(0.99) * scale,
+        }
+
+# ====================================================================
+# PER-MODEL METRICS
+# ====================================================================
+
+class ModelMetrics:
+    """Stage timings, batch sizes, request and error counts for one served model"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.stages = {stage: Histogram(LATENCY_BUCKETS) for stage in STAGES}
+        self.routes = {}
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.requests = Counter()
+        self.errors = Counter()
+
+    def observe(self, stage, seconds):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe_batch(self, size, forward_seconds, queue_waits=()):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.batch_sizes.observe(size)
+            self.stages["forward"].observe(forward_seconds)
+            for seconds in queue_waits:
+                self.stages["queue_wait"].observe(seconds)
+
+    def observe_request(self, route, status, seconds):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            if route not in self.routes:
+                self.routes[route] = Histogram(LATENCY_BUCKETS)
+            self.routes[route].observe(seconds)
+            self.requests[(route, status)] += 1
+
+    def count_error(self, kind):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.errors[kind] += 1
+
+    def state(self):
+        """JSON-serializable copy of everything recorded so far"""
+        with self._lock:
+            return {
+                "stages": {stage: histogram.state() for stage, histogram in self.stages.items()},
+                "routes": {route: histogram.state() for route, histogram in self.routes.items()},
+                "batch_sizes": self.batch_sizes.state(),
+                "requests": [[route, status, count] for (route, status), count in self.requests.items()],
+                "errors": dict(self.errors),
+            }
+
+    def merge(self, state):
+        """Add the state() of another process's metrics for the same model"""
+        with self._lock:
+            for stage, histogram in state["stages"].items():
+                self.stages[stage].merge(histogram)
+            for route, histogram in state["routes"].items():
+                self.routes.setdefault(route, Histogram(LATENCY_BUCKETS)).merge(histogram)
+            self.batch_sizes.merge(state["batch_sizes"])
+            for route, status, count in state["requests"]:
+                self.requests[(route, status)] += count
+            self.errors.update(state["errors"])
+
+    def summary(self):
+        """Compact view for /status: latencies in milliseconds"""
+        with self._lock:
+            return {
+                "enabled": METRICS_ENABLED,
+                "stages_ms": {stage: histogram.summary(1000) for stage, histogram in self.stages.items()},
+                "requests_ms": {route: histogram.summary(1000) for route, histogram in self.routes.items()},
+                "batch_size": self.batch_sizes.summary(),
+                "requests": {f"{route} {status}": count for (route, status), count in sorted(self.requests.items())},
+                "errors": dict(self.errors),
+            }
+
+# ====================================================================
+# WORKER AGGREGATION
+# ====================================================================
+
+def served_state(served):
+    """Metrics plus the live gauges of one ServedModel"""
+    cache = served.cache.stats()
+    return {
+        "metrics": served.metrics.state(),
+        "queue_depth": served.scheduler.queue_depth(),
+        "loaded": served.loaded,
+        "cache": {key: cache[key] for key in ("hits", "misses", "entries", "bytes")},
+    }
+
+def read_snapshot(path):
+    """A published snapshot, or None if it is gone or half-written"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_snapshot(path, snapshot):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(temporary_path, path)
+
+def read_retired(directory):
+    retired = read_snapshot(os.path.join(directory, RETIRED_METRICS_FILE))
+    return retired or {"pid": None, "updated_at": 0.0, "stopped": True, "models": {}, "folded": {}}
+
+def retire_worker_metrics(directory, pid):
+    """Fold the last snapshot of an exited worker into retired.json and delete its file.
+
+    Called by the serve.py master for every worker it reaps, so the directory
+    holds one file per live worker plus retired.json however many workers
+    have come and gone. retired.json lists the files it absorbed ("folded")
+    and readers skip those, so a scrape racing the fold never counts a
+    worker twice or drops it.
+    """
+    prefix = f"worker-{pid}-"
+    names = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+    snapshots = {name: read_snapshot(os.path.join(directory, name)) for name in names if name.endswith(".json")}
+    snapshots = {name: snapshot for name, snapshot in snapshots.items() if snapshot is not None}
+
+    retired = read_retired(directory)
+    now = time.time()
+    if snapshots:
+        for snapshot in snapshots.values():
+            for model_name, state in snapshot["models"].items():
+                previous = retired["models"].get(model_name)
+                metrics = ModelMetrics(model_name)
+                hits, misses = state["cache"]["hits"], state["cache"]["misses"]
+                if previous is not None:
+                    metrics.merge(previous["metrics"])
+                    hits += previous["cache"]["hits"]
+                    misses += previous["cache"]["misses"]
+                metrics.merge(state["metrics"])
+                retired["models"][model_name] = {
+                    "metrics": metrics.state(),
+                    "queue_depth": 0,
+                    "loaded": True,
+                    "cache": {"hits": hits, "misses": misses, "entries": 0, "bytes": 0},
+                }
+        # A scrape reads the directory in far less than METRICS_STALE_AFTER,
+        # so older entries can no longer be racing one
+        retired["folded"] = {name: folded_at for name, folded_at in retired["folded"].items()
+                             if now - folded_at < METRICS_STALE_AFTER}
+        retired["folded"].update({name: now for name in snapshots})
+        retired["updated_at"] = now
+        write_snapshot(os.path.join(directory, RETIRED_METRICS_FILE), retired)
+
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+class MetricsPublisher:
+    """Writes this worker's metrics to a directory shared with the other workers.
+
+    Counters and histograms from every file in the directory are summed, so a
+    scrape that lands on any worker sees the whole service, and totals never
+    go down when a worker exits or restarts (the master folds its last
+    snapshot into retired.json, see retire_worker_metrics). Gauges only count
+    workers whose snapshot is fresh.
+    """
+
+    def __init__(self, registry, directory, interval=METRICS_PUBLISH_INTERVAL):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"worker-{os.getpid()}-{time.time_ns()}.json")
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+
+    def start(self):
+        global _publisher
+        _publisher = self
+        self.publish()
+        self._thread.start()
+
+    def stop(self):
+        """Write the final snapshot, marked as stopped"""
+        self._stopping.set()
+        self._thread.join()
+        self.publish(stopped=True)
+
+    def publish(self, stopped=False):
+        snapshot = {
+            "pid": os.getpid(),
+            "updated_at": time.time(),
+            "stopped": stopped,
+            "models": {name: served_state(served) for name, served in self.registry.models.items()},
+        }
+        write_snapshot(self.path, snapshot)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.publish()
+            except OSError as e:
+                print(f"⚠️ Could not publish worker metrics: {e}")
+
+    def other_snapshots(self):
+        snapshots = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not (name.startswith("worker-") and name.endswith(".json")) or path == self.path:
+                continue
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                snapshots[name] = snapshot
+        # Read last: a worker folded in since its file was read is skipped
+        # here rather than counted twice
+        retired = read_retired(self.directory)
+        return [snapshot for name, snapshot in snapshots.items() if name not in retired["folded"]] + [retired]
+
+# This process's publisher, when it is a serve.py worker
+_publisher = None
+
+def collect(served_models):
+    """name -> (ModelMetrics, gauges) summed over this process and, under serve.py, every other worker"""
+    now = time.time()
+    states = [(True, {name: served_state(served) for name, served in served_models.items()})]
+    if _publisher is not None:
+        for snapshot in _publisher.other_snapshots():
+            live = not snapshot["stopped"] and now - snapshot["updated_at"] < METRICS_STALE_AFTER
+            states.append((live, snapshot["models"]))
+
+    totals = {}
+    for name in served_models:
+        metrics = ModelMetrics(name)
+        gauges = {"workers": 0, "queue_depth": 0, "loaded": 1, "cache_hits": 0, "cache_misses": 0,
+                  "cache_entries": 0, "cache_bytes": 0}
+        for live, models in states:
+            state = models.get(name)
+            if state is None:
+                continue
+            metrics.merge(state["metrics"])
+            gauges["cache_hits"] += state["cache"]["hits"]
+            gauges["cache_misses"] += state["cache"]["misses"]
+            if live:
+                gauges["workers"] += 1
+                gauges["queue_depth"] += state["queue_depth"]
+                gauges["loaded"] = min(gauges["loaded"], int(state["loaded"]))
+                gauges["cache_entries"] += state["cache"]["entries"]
+                gauges["cache_bytes"] += state["cache"]["bytes"]
+        totals[name] = (metrics, gauges)
+    return totals
+
+# ====================================================================
+# PROMETHEUS EXPOSITION
+# ====================================================================
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def _histogram_lines(name, histogram, **labels):
+    for upper, count in histogram.cumulative():
+        le = "+Inf" if upper == float("inf") else repr(upper)
+        yield f"{name}_bucket{_labels(**labels, le=le)} {count}"
+    yield f"{name}_sum{_labels(**labels)} {histogram.sum}"
+    yield f"{name}_count{_labels(**labels)} {histogram.count}"
+
+def render_prometheus(registry):
+    """Prometheus text exposition for every model in a ModelRegistry, summed over the serve.py workers"""
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    totals = list(collect(registry.models).items())
+
+    family("agri_ml_stage_seconds", "histogram", "Time spent in each /predict stage")
+    for name, (metrics, _) in totals:
+        for stage, histogram in metrics.stages.items():
+            lines.extend(_histogram_lines("agri_ml_stage_seconds", histogram, model=name, stage=stage))
+
+    family("agri_ml_request_seconds", "histogram", "End-to-end handler time per route")
+    for name, (metrics, _) in totals:
+        for route, histogram in metrics.routes.items():
+            lines.extend(_histogram_lines("agri_ml_request_seconds", histogram, model=name, route=route))
+
+    family("agri_ml_batch_size", "histogram", "Images per forward pass")
+    for name, (metrics, _) in totals:
+        lines.extend(_histogram_lines("agri_ml_batch_size", metrics.batch_sizes, model=name))
+
+    family("agri_ml_requests_total", "counter", "Requests by route and HTTP status")
+    for name, (metrics, _) in totals:
+        for (route, status), count in sorted(metrics.requests.items()):
+            lines.append(f"agri_ml_requests_total{_labels(model=name, route=route, status=status)} {count}")
+
+    family("agri_ml_errors_total", "counter", "Failures by kind (decode, forward, prediction)")
+    for name, (metrics, _) in totals:
+        for kind, count in sorted(metrics.errors.items()):
+            lines.append(f"agri_ml_errors_total{_labels(model=name, kind=kind)} {count}")
+
+    family("agri_ml_workers", "gauge", "Worker processes serving the model")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_workers{_labels(model=name)} {gauges['workers']}")
+
+    family("agri_ml_queue_depth", "gauge", "Images waiting for the batch scheduler")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_queue_depth{_labels(model=name)} {gauges['queue_depth']}")
+
+    family("agri_ml_model_loaded", "gauge", "1 when the model is loaded in every worker")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_model_loaded{_labels(model=name)} {gauges['loaded']}")
+
+    family("agri_ml_cache_hits_total", "counter", "Prediction cache hits")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_cache_hits_total{_labels(model=name)} {gauges['cache_hits']}")
+    family("agri_ml_cache_misses_total", "counter", "Prediction cache misses")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_cache_misses_total{_labels(model=name)} {gauges['cache_misses']}")
+    family("agri_ml_cache_entries", "gauge", "Entries in the prediction caches")
+    for name, (_, gauges) in totals:
+        lines.append(f"agri_ml_cache_entries{_labels(model=name)} {gauges['cache_entries']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,148 @@
+"""Mixed precision, gradient accumulation and activation checkpointing for the trainers.
+
+TRAIN_PRECISION:
+  fp32  plain float32 training (default)
+  amp   float16 + GradScaler on CUDA, bfloat16 autocast on CPU
+  fp16  float16 autocast (+ GradScaler on CUDA)
+  bf16  bfloat16 autocast; no scaler needed (same exponent range as float32)
+
+Weights and optimizer state stay in float32 in every mode; only the forward
+pass (and therefore the activations kept for backward) runs in low precision.
+
+Gradient accumulation sums the gradients of several micro-batches before each
+optimizer step, so the effective batch size is no longer limited by how many
+images fit through the network at once.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+from contextlib import contextmanager
+
+import torch
+from torch import nn
+from torch.utils.checkpoint import checkpoint
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+TRAIN_PRECISION = os.environ.get("TRAIN_PRECISION", "fp32")
+PRECISIONS = ("fp32", "amp", "fp16", "bf16")
+
+# Trade compute for memory: recompute block activations during backward
+ACTIVATION_CHECKPOINTING = os.environ.get("ACTIVATION_CHECKPOINTING", "0") == "1"
+
+# ====================================================================
+# PRECISION AND ACCUMULATION
+# ====================================================================
+
+def autocast_dtype(precision, device):
+    """Low-precision dtype for the forward pass, or None for float32"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"TRAIN_PRECISION must be one of {', '.join(PRECISIONS)}, got '{precision}'")
+    if precision == "fp32":
+        return None
+    if precision == "amp":
+        return torch.float16 if device.type == "cuda" else torch.bfloat16
+    return torch.float16 if precision == "fp16" else torch.bfloat16
+
+def accumulation_steps(batch_size, micro_batch_size):
+    """Micro-batches per optimizer step for an effective batch of batch_size"""
+    return max(1, -(-batch_size // micro_batch_size))
+
+class MixedPrecision:
+    """Autocast, loss scaling and accumulated optimizer steps for one training run"""
+
+    def __init__(self, precision, device, accumulation_steps=1):
+        self.device = device
+        self.dtype = autocast_dtype(precision, device)
+        self.accumulation_steps = accumulation_steps
+        # float16 gradients underflow without loss scaling; bfloat16 ones don't
+        self.scaler = torch.amp.GradScaler(
+            device.type, enabled=self.dtype == torch.float16 and device.type == "cuda"
+        )
+
+    def autocast(self):
+        return torch.autocast(self.device.type, dtype=self.dtype, enabled=self.dtype is not None)
+
+    def group_size(self, micro_step, micro_steps_in_epoch):
+        """Micro-batches in the accumulation group of micro_step (1-based); the last one may be short"""
+        group_start = (micro_step - 1) // self.accumulation_steps * self.accumulation_steps
+        return min(self.accumulation_steps, micro_steps_in_epoch - group_start)
+
+    def backward(self, loss, micro_step, micro_steps_in_epoch):
+        """Accumulate the gradients of one micro-batch, averaged over its group"""
+        self.scaler.scale(loss / self.group_size(micro_step, micro_steps_in_epoch)).backward()
+
+    def should_step(self, micro_step, micro_steps_in_epoch):
+        """True after every accumulation_steps micro-batches and after the last one"""
+        return micro_step % self.accumulation_steps == 0 or micro_step == micro_steps_in_epoch
+
+    def step(self, optimizer):
+        self.scaler.step(optimizer)
+        self.scaler.update()
+        optimizer.zero_grad(set_to_none=True)
+
+    def describe(self):
+        dtype = "float32" if self.dtype is None else str(self.dtype).replace("torch.", "")
+        scaler = " + GradScaler" if self.scaler.is_enabled() else ""
+        return f"{dtype}{scaler}, {self.accumulation_steps} micro-batch(es) per optimizer step"
+
+# ====================================================================
+# ACTIVATION CHECKPOINTING
+# ====================================================================
+
+@contextmanager
+def preserved_batchnorm_stats(module):
+    """Restore the running statistics of module's BatchNorm layers on exit"""
+    norms = [layer for layer in module.modules()
+             if isinstance(layer, nn.modules.batchnorm._BatchNorm) and layer.track_running_stats]
+    saved = [(layer.running_mean.clone(), layer.running_var.clone(), layer.num_batches_tracked.clone())
+             for layer in norms]
+    try:
+        yield
+    finally:
+        with torch.no_grad():
+            for layer, (mean, var, batches) in zip(norms, saved):
+                layer.running_mean.copy_(mean)
+                layer.running_var.copy_(var)
+                layer.num_batches_tracked.copy_(batches)
+
+def checkpoint_blocks(blocks):
+    """Recompute each block's activations during backward instead of storing them.
+
+    Patches the forward of each module in place, so parameter names and
+    checkpoints are unchanged. Only active in training mode with gradients
+    enabled. The recomputation runs with the block's BatchNorm running
+    statistics saved and restored, so they are updated once per batch, as
+    without checkpointing.
+    """
+    count = 0
+    for block in blocks:
+        forward = block.forward
+
+        def checkpointed_forward(*args, _forward=forward, _block=block):
+            if not (_block.training and torch.is_grad_enabled()):
+                return _forward(*args)
+            calls = []
+
+            def run(*inputs):
+                # The first call is the forward pass; any later one is the recomputation
+                calls.append(None)
+                if len(calls) == 1:
+                    return _forward(*inputs)
+                with preserved_batchnorm_stats(_block):
+                    return _forward(*inputs)
+
+            return checkpoint(run, *args, use_reentrant=False)
+
+        block.forward = checkpointed_forward
+        count += 1
+    return count
+
+def efficientnet_blocks(model):
+    """The MBConv blocks of a torchvision EfficientNet (features[1:-1])"""
+    return [block for stage in model.features[1:-1] for block in stage]
@@ -0,0 +1,491 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+import io
+import threading
+import time
+from dataclasses import dataclass
+from types import ModuleType
+
+from PIL import Image
+
+import torch
+import torch.nn as nn
+from torchvision import models, transforms
+
+import crop_rules
+import cattle_rules
+from batching import BatchScheduler
+from preprocessing import FastPreprocessor
+from checkpoint_bundle import (
+    load_checkpoint, is_bundle, bundle_metadata, make_metadata, dataset_class_names
+)
+from cpu_tuning import OPTIMIZE_CPU, TORCH_COMPILE, TORCH_COMPILE_MODE, warm_up, pin_to_cores
+from inference_backends import (
+    BACKENDS, EagerBackend, TorchScriptBackend, OnnxRuntimeBackend, artifact_path
+)
+from prediction_cache import PredictionCache, checkpoint_identity
+from metrics import ModelMetrics, collect
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Dynamic micro-batching: concurrent /predict calls are grouped into one forward pass
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 16))
+MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+
+# Reduced-scale JPEG decode + fused uint8 crop/normalize instead of torchvision transforms
+FAST_PREPROCESS = os.environ.get("FAST_PREPROCESS", "1") != "0"
+
+# Back parameters with a memory-mapped checkpoint instead of private copies (CPU only)
+MMAP_WEIGHTS = os.environ.get("MMAP_WEIGHTS", "1") != "0"
+
+# Runtime behind /predict: eager | torchscript | onnx (export_model.py) | quantized
+# (INT8 from quantize_model.py). Falls back to eager when the artifact is missing.
+# SERVE_QUANTIZED=1 is kept as a shorthand for INFERENCE_BACKEND=quantized.
+SERVE_QUANTIZED = os.environ.get("SERVE_QUANTIZED", "0") == "1"
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "quantized" if SERVE_QUANTIZED else "eager")
+if INFERENCE_BACKEND not in BACKENDS:
+    raise ValueError(f"INFERENCE_BACKEND must be one of {BACKENDS}, got '{INFERENCE_BACKEND}'")
+
+# How often (seconds) a served model checks whether its checkpoint file changed
+CHECKPOINT_CHECK_INTERVAL = float(os.environ.get("CHECKPOINT_CHECK_INTERVAL", 5))
+
+# Thread budget shared by every model served from this process. The machine's
+# cores are split evenly between WORKER_PROCESSES server processes; within a
+# process, forwards from different models queue for MAX_CONCURRENT_FORWARDS
+# slots and each slot gets an equal share of the intra-op threads, so neither
+# processes nor models fight over cores.
+CPU_THREADS = int(os.environ.get("CPU_THREADS", os.cpu_count() or 1))
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 1))
+MAX_CONCURRENT_FORWARDS = int(os.environ.get("MAX_CONCURRENT_FORWARDS", 1))
+INTEROP_THREADS = int(os.environ.get("INTEROP_THREADS", 1))
+# Pin each worker process to its own slice of cores (Linux); WORKER_INDEX picks the slice
+PIN_CPU_CORES = os.environ.get("PIN_CPU_CORES", "0") == "1"
+WORKER_INDEX = int(os.environ.get("WORKER_INDEX", 0))
+
+device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+# ====================================================================
+# MODEL SPECIFICATIONS
+# ====================================================================
+
+@dataclass
+class ModelSpec:
+    """Everything needed to load and serve one model"""
+    name: str
+    display_name: str
+    backbone: str
+    # Only consulted for legacy checkpoints that carry no class manifest
+    data_dir: str
+    checkpoint_path: str
+    quantized_path: str
+    rules: ModuleType
+    image_type: str
+    legacy_port: int
+
+    def artifact_path(self, backend):
+        if backend == "quantized":
+            return self.quantized_path
+        return artifact_path(self.checkpoint_path, backend)
+
+CROP_MODEL_PATH = os.environ.get("CROP_MODEL_PATH", "resnet50_crop_disease_best.pth")
+CATTLE_MODEL_PATH = os.environ.get(
+    "CATTLE_MODEL_PATH",
+    r"D:\Projects\Hackshetra1.0\hackkshetra1.0\agri-main\efficientnet_cattle_disease_best.pth"
+)
+
+MODEL_SPECS = {
+    "crop": ModelSpec(
+        name="crop",
+        display_name="Crop",
+        backbone="resnet50",
+        data_dir=os.environ.get(
+            "CROP_DATA_DIR",
+            r"D:\Projects\Hackshetra1.0\hackkshetra1.0\agri-main\ml-service\plant_disease_data"
+        ),
+        checkpoint_path=CROP_MODEL_PATH,
+        quantized_path=os.environ.get("CROP_QUANTIZED_MODEL_PATH", artifact_path(CROP_MODEL_PATH, "quantized")),
+        rules=crop_rules,
+        image_type="crop",
+        legacy_port=5001,
+    ),
+    "cattle": ModelSpec(
+        name="cattle",
+        display_name="Cattle",
+        backbone="efficientnet_b4",
+        data_dir=os.environ.get(
+            "CATTLE_DATA_DIR",
+            r"D:\Projects\Hackshetra1.0\hackkshetra1.0\agri-main\ml-service\livestock_data"
+        ),
+        checkpoint_path=CATTLE_MODEL_PATH,
+        quantized_path=os.environ.get("CATTLE_QUANTIZED_MODEL_PATH", artifact_path(CATTLE_MODEL_PATH, "quantized")),
+        rules=cattle_rules,
+        image_type="animal",
+        legacy_port=5002,
+    ),
+}
+
+# ====================================================================
+# THREAD BUDGET
+# ====================================================================
+
+_threads_configured = False
+
+def configure_thread_budget(worker_index=None, worker_processes=None, pin=None):
+    """Size torch's process-wide thread pools once for all served models.
+
+    Pre-forked workers (serve.py) call this again after fork with their own
+    index so each one takes its share of the cores.
+    """
+    global _threads_configured
+    if _threads_configured and worker_index is None:
+        return
+    _threads_configured = True
+
+    worker_index = WORKER_INDEX if worker_index is None else worker_index
+    worker_processes = WORKER_PROCESSES if worker_processes is None else worker_processes
+    pin = PIN_CPU_CORES if pin is None else pin
+
+    process_threads = max(1, CPU_THREADS // max(1, worker_processes))
+    if pin:
+        cores = pin_to_cores(worker_index, worker_processes)
+        if cores:
+            process_threads = len(cores)
+            print(f"📌 Worker {worker_index} pinned to cores {cores[0]}-{cores[-1]}")
+
+    intra_op_threads = max(1, process_threads // max(1, MAX_CONCURRENT_FORWARDS))
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(INTEROP_THREADS)
+    except RuntimeError:
+        # Inter-op pool can only be sized before the first parallel op
+        pass
+    print(f"🧵 Thread budget: {MAX_CONCURRENT_FORWARDS} concurrent forward(s) x {intra_op_threads} intra-op threads")
+
+# ====================================================================
+# MODEL LOADING
+# ====================================================================
+
+def build_backbone(backbone, num_classes):
+    """Create an untrained backbone with a classification head of num_classes"""
+    if backbone == "resnet50":
+        model = models.resnet50(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    elif backbone == "efficientnet_b4":
+        model = models.efficientnet_b4(weights=None)
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    else:
+        raise ValueError(f"Unknown backbone: {backbone}")
+    return model
+
+def build_model(backbone, num_classes, state_dict=None):
+    """Backbone with trained weights, or untrained when state_dict is None"""
+    if state_dict is None:
+        return build_backbone(backbone, num_classes)
+
+    if MMAP_WEIGHTS:
+        # Skip allocating and initializing weights that are about to be
+        # replaced, and adopt the (memory-mapped) checkpoint tensors directly
+        # instead of copying them into the module.
+        with torch.device("meta"):
+            model = build_backbone(backbone, num_classes)
+        model.load_state_dict(state_dict, assign=True)
+        return model
+
+    # Load the model even if training was stopped early
+    model = build_backbone(backbone, num_classes)
+    model.load_state_dict(state_dict)
+    return model
+
+def load_trained_model(checkpoint_path):
+    """Return (eval-mode FP32 module, metadata) from a checkpoint bundle, for offline tools"""
+    checkpoint = load_checkpoint(checkpoint_path)
+    if not is_bundle(checkpoint):
+        raise SystemExit(
+            f"❌ {checkpoint_path} is a legacy checkpoint. Convert it first with checkpoint_bundle.py convert."
+        )
+    metadata = bundle_metadata(checkpoint)
+    model = build_model(metadata["backbone"], len(metadata["class_names"]), checkpoint["state_dict"])
+    return model.eval(), metadata
+
+def build_inference_transform(metadata):
+    return transforms.Compose([
+        transforms.Resize(metadata["resize_size"]),
+        transforms.CenterCrop(metadata["input_size"]),
+        transforms.ToTensor(),
+        transforms.Normalize(metadata["mean"], metadata["std"])
+    ])
+
+def read_checkpoint(spec):
+    """Return (state_dict or None, metadata) for a model spec.
+
+    Bundles carry their own class manifest. Legacy weights-only checkpoints
+    (and untrained models) fall back to the class folder names in data_dir.
+    """
+    if os.path.exists(spec.checkpoint_path):
+        checkpoint = load_checkpoint(
+            spec.checkpoint_path, map_location=device, mmap=MMAP_WEIGHTS and device.type == "cpu"
+        )
+        if is_bundle(checkpoint):
+            return checkpoint["state_dict"], bundle_metadata(checkpoint)
+        print(f"⚠️ {spec.checkpoint_path} has no class manifest; reading classes from {spec.data_dir}. "
+              f"Convert it with: python checkpoint_bundle.py convert {spec.checkpoint_path} --backbone {spec.backbone} --data-dir <dir>")
+        state_dict = checkpoint
+    else:
+        print(f"⚠️ No saved {spec.name} model found. Using untrained model.")
+        state_dict = None
+
+    return state_dict, make_metadata(spec.backbone, dataset_class_names(spec.data_dir))
+
+def resolve_backend(spec):
+    """The configured backend if its artifact is available, otherwise eager"""
+    backend = INFERENCE_BACKEND
+    if backend == "eager":
+        return backend
+    if backend in ("onnx", "quantized") and device.type != "cpu":
+        return "eager"
+    return backend if os.path.exists(spec.artifact_path(backend)) else "eager"
+
+def served_artifact_path(spec):
+    """The file actually being served: an exported artifact or the checkpoint"""
+    return spec.artifact_path(resolve_backend(spec))
+
+def load_exported_backend(spec, backend):
+    path = spec.artifact_path(backend)
+    try:
+        if backend == "onnx":
+            runtime = OnnxRuntimeBackend(path)
+        else:
+            runtime = TorchScriptBackend(path, map_location=device)
+        print(f"✅ {spec.display_name} {backend} backend loaded from {path}")
+        return runtime, runtime.metadata
+    except Exception as e:
+        print(f"❌ Error loading {spec.name} {backend} backend: {e}")
+        return None, make_metadata(spec.backbone, [])
+
+def load_model(spec):
+    """Return (backend or None, metadata) for the spec's configured runtime"""
+    backend = resolve_backend(spec)
+    if backend != "eager":
+        return load_exported_backend(spec, backend)
+    if INFERENCE_BACKEND != "eager":
+        print(f"⚠️ INFERENCE_BACKEND={INFERENCE_BACKEND} but {spec.artifact_path(INFERENCE_BACKEND)} "
+              f"is missing (or not usable on {device}). Serving eager PyTorch.")
+
+    try:
+        state_dict, metadata = read_checkpoint(spec)
+    except Exception as e:
+        print(f"❌ Error reading {spec.name} checkpoint: {e}")
+        return None, make_metadata(spec.backbone, [])
+
+    num_classes = len(metadata["class_names"])
+    if num_classes == 0:
+        print(f"❌ Cannot load {spec.name} model: Class count is zero.")
+        return None, metadata
+    try:
+        print(f"Loading {metadata['backbone']} structure for {spec.name} ({num_classes} classes)...")
+        model = build_model(metadata["backbone"], num_classes, state_dict)
+        if state_dict is not None:
+            print(f"✅ {spec.display_name} model loaded successfully from {spec.checkpoint_path}")
+
+        model.to(device)
+        model.eval()
+        backend = EagerBackend(
+            model,
+            channels_last=OPTIMIZE_CPU,
+            compile_mode=TORCH_COMPILE_MODE if TORCH_COMPILE else None
+        )
+        return backend, metadata
+    except Exception as e:
+        print(f"❌ Error loading {spec.name} model: {e}")
+        return None, metadata
+
+def warm_up_model(spec, model, metadata):
+    """Compile/warm up an optimized model before it serves; returns False if it cannot run"""
+    if model is None or not (OPTIMIZE_CPU or TORCH_COMPILE):
+        return True
+    try:
+        start = time.perf_counter()
+        warm_up(model, metadata["input_size"], batch_sizes=(1, MAX_BATCH_SIZE), device=device)
+        print(f"🔥 {spec.display_name} model warmed up in {time.perf_counter() - start:.1f}s "
+              f"({', '.join(model.optimizations) or 'no graph changes'})")
+        return True
+    except Exception as e:
+        print(f"❌ Error warming up {spec.name} model: {e}")
+        return False
+
+# ====================================================================
+# SERVED MODEL
+# ====================================================================
+
+class ServedModel:
+    """A loaded model plus the preprocessing, batching and caching needed to serve it"""
+
+    def __init__(self, spec, forward_slots, warm_up=True):
+        self.spec = spec
+        self.forward_slots = forward_slots
+        self.metrics = ModelMetrics(spec.name)
+        self.scheduler = BatchScheduler(
+            None, device,
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait_ms=MAX_BATCH_WAIT_MS,
+            name=spec.name,
+            forward_slots=forward_slots,
+            metrics=self.metrics
+        )
+        self.cache = PredictionCache()
+        self._reload_lock = threading.Lock()
+        self._next_checkpoint_check = time.monotonic() + CHECKPOINT_CHECK_INTERVAL
+
+        self.checkpoint_identity = checkpoint_identity(served_artifact_path(spec))
+        self._install(*load_model(spec))
+        if warm_up:
+            self.warm_up()
+
+    def _install(self, model, metadata):
+        self.model = model
+        self.metadata = metadata
+        self.class_names = metadata["class_names"]
+        self.transform = build_inference_transform(metadata)
+        self.fast_preprocessor = FastPreprocessor(
+            resize_size=metadata["resize_size"],
+            crop_size=metadata["input_size"],
+            mean=metadata["mean"],
+            std=metadata["std"]
+        ) if FAST_PREPROCESS else None
+        self.scheduler.model = model
+        self.cache.bind(self.checkpoint_identity)
+
+    def warm_up(self):
+        if not warm_up_model(self.spec, self.model, self.metadata):
+            self._install(None, self.metadata)
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def preprocess(self, image_bytes):
+        """Decode one encoded image into a normalized CHW tensor"""
+        try:
+            start = time.perf_counter()
+            if self.fast_preprocessor is not None:
+                image = self.fast_preprocessor.decode(image_bytes)
+            else:
+                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            decoded = time.perf_counter()
+            self.metrics.observe("decode", decoded - start)
+        except Exception:
+            self.metrics.count_error("decode")
+            raise
+
+        if self.fast_preprocessor is not None:
+            tensor = self.fast_preprocessor.crop_normalize(image)
+        else:
+            tensor = self.transform(image)
+        self.metrics.observe("transform", time.perf_counter() - decoded)
+        return tensor
+
+    def refresh_if_checkpoint_changed(self):
+        """Reload weights (and drop cached predictions) when the checkpoint file changes"""
+        now = time.monotonic()
+        if now < self._next_checkpoint_check:
+            return
+        with self._reload_lock:
+            if now < self._next_checkpoint_check:
+                return
+            self._next_checkpoint_check = now + CHECKPOINT_CHECK_INTERVAL
+
+            identity = checkpoint_identity(served_artifact_path(self.spec))
+            if identity == self.checkpoint_identity:
+                return
+
+            print(f"🔄 Checkpoint for {self.spec.name} changed, reloading weights...")
+            model, metadata = load_model(self.spec)
+            if model is None or not warm_up_model(self.spec, model, metadata):
+                return
+            self.checkpoint_identity = identity
+            self._install(model, metadata)
+
+    def cached_probabilities(self, image_bytes):
+        """Look up an image before decoding; returns (cache_key, probabilities or None)"""
+        self.refresh_if_checkpoint_changed()
+        with self.metrics.time("cache_lookup"):
+            # The cache is rebound only after the new model is installed, so the
+            # key's identity never names a checkpoint newer than the model used
+            key = self.cache.key(image_bytes)
+            return key, self.cache.get(key)
+
+    def top_prediction(self, probabilities):
+        confidence, predicted_index = torch.max(probabilities, 0)
+        return self.class_names[predicted_index.item()], confidence.item()
+
+    def predict(self, image_bytes):
+        """Return (predicted_class, confidence) for one encoded image"""
+        key, probabilities = self.cached_probabilities(image_bytes)
+        if probabilities is None:
+            probabilities = self.scheduler.predict(self.preprocess(image_bytes))
+            self.cache.put(key, probabilities)
+        return self.top_prediction(probabilities)
+
+    def status(self):
+        # Request metrics and cache counters summed over the serve.py workers
+        metrics, gauges = collect({self.spec.name: self})[self.spec.name]
+        lookups = gauges["cache_hits"] + gauges["cache_misses"]
+        cache = {
+            **self.cache.stats(),
+            "hits": gauges["cache_hits"],
+            "misses": gauges["cache_misses"],
+            "hit_rate": gauges["cache_hits"] / lookups if lookups else 0.0,
+            "entries": gauges["cache_entries"],
+            "bytes": gauges["cache_bytes"],
+        }
+        return {
+            "model_loaded": self.loaded,
+            "backbone": self.metadata["backbone"],
+            "classes_count": len(self.class_names),
+            "classes": self.class_names,
+            "device": str(device),
+            "batching": {
+                "max_batch_size": self.scheduler.max_batch_size,
+                "max_wait_ms": MAX_BATCH_WAIT_MS,
+                "queue_depth": self.scheduler.queue_depth()
+            },
+            "fast_preprocess": self.fast_preprocessor is not None,
+            "mmap_weights": MMAP_WEIGHTS and device.type == "cpu",
+            "backend": self.model.name if self.model is not None else None,
+            "precision": self.model.precision if self.model is not None else None,
+            "optimize_cpu": OPTIMIZE_CPU,
+            "optimizations": self.model.optimizations if self.model is not None else [],
+            "workers": gauges["workers"],
+            "cache": cache,
+            "metrics": metrics.summary()
+        }
+
+# ====================================================================
+# REGISTRY
+# ====================================================================
+
+class ModelRegistry:
+    """Loads a set of models into one process and routes requests by name"""
+
+    def __init__(self, names=None, warm_up=True):
+        configure_thread_budget()
+        self.forward_slots = threading.BoundedSemaphore(max(1, MAX_CONCURRENT_FORWARDS))
+        self.models = {}
+        for name in names or MODEL_SPECS.keys():
+            self.models[name] = ServedModel(MODEL_SPECS[name], self.forward_slots, warm_up=warm_up)
+
+    def warm_up(self):
+        """Warm up every model; pre-fork servers defer this until after fork"""
+        for served in self.models.values():
+            served.warm_up()
+
+    def get(self, name):
+        return self.models.get(name)
+
+    def names(self):
+        return list(self.models.keys())
@@ -1,16 +1,32 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.optim import lr_scheduler
 from torchvision import models, transforms, datasets
 from torchvision.models import efficientnet_b4, EfficientNet_B4_Weights
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import Subset
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
 import time
 import os
-import copy
+
+from checkpoint_bundle import load_weights
+from batch_augment import BATCH_AUGMENT, BatchAugment, batch_input_transform, load_batch_input
+from checkpoint_writer import CheckpointWriter
+from dataset_cache import CachedImageDataset, cache_is_current, cached_transforms
+from dataset_index import (DATASET_INDEX_REFRESH, DatasetIndex, IndexedImageDataset, dataset_index_path,
+                           load_dataset_index, sample_keys, split_without_quarantined)
+from distributed_training import (barrier, log, broadcast_module, cleanup, device_for, gradient_sync, init_distributed,
+                                  broadcast_flag, main_process_first, make_dataloaders, set_epoch,
+                                  unwrap_model, wrap_model)
+from feature_cache import FeatureCacheDataset, build_feature_cache, split_frozen_model
+from mixed_precision import (TRAIN_PRECISION, ACTIVATION_CHECKPOINTING, MixedPrecision, accumulation_steps,
+                             checkpoint_blocks, efficientnet_blocks)
+from train_metrics import EpochMetrics, print_per_class_accuracy
+from training_schedule import (LR_SCHEDULE, EarlyStopping, LRSchedule, TimeBudget, current_lr,
+                               optimizer_steps_per_epoch)
+from training_state import (RESUME_TRAINING, STATE_SAVE_EVERY, capture_training_state, load_training_state,
+                            restore_training_state, split_indices, training_state_path)
 
 # ====================================================================
 # CONFIGURATION FOR PHASE 2: FULL FINE-TUNING
@@ -20,18 +36,40 @@ import copy
 DATA_DIR = r'D:\Projects\Hackshetra1.0\hackkshetra1.0\agri-main\ml-service\livestock_data' 
 MODEL_SAVE_PATH = 'efficientnet_cattle_disease_best.pth'
 NUM_EPOCHS = 30  # Increased epochs for better accuracy in fine-tuning
-BATCH_SIZE = 8
+BATCH_SIZE = 32 # Images per optimizer step
+# Images per forward pass: EfficientNet-B4 fully unfrozen runs out of memory above
+# 8 on small GPUs, so gradients are accumulated up to BATCH_SIZE
+MICRO_BATCH_SIZE = int(os.environ.get("CATTLE_MICRO_BATCH_SIZE", 8))
 LEARNING_RATE = 0.00001 # CRUCIAL: Very low learning rate for fine-tuning
 FREEZE_LAYERS = False   # CRUCIAL: Unfreeze all layers
 VALIDATION_SPLIT_RATIO = 0.2 # FIX: This variable was missing, causing NameError
 
+# Optional: directory built by `python dataset_cache.py build DATA_DIR <dir>`.
+# Training then reads pre-decoded, pre-resized pixels instead of the source images.
+DATASET_CACHE_DIR = os.environ.get("CATTLE_DATASET_CACHE_DIR")
+
+# Paths, labels and content hashes of DATA_DIR (see dataset_index.py): loaded
+# instead of walking the tree, and the source of the hash-keyed train/val split
+DATASET_INDEX_PATH = os.environ.get("CATTLE_DATASET_INDEX", dataset_index_path(DATA_DIR))
+
+# Optional, with FREEZE_LAYERS: cache the frozen layers' activations here once
+# and train only the unfrozen layers from them (see feature_cache.py)
+FEATURE_CACHE_DIR = os.environ.get("CATTLE_FEATURE_CACHE_DIR")
+
+# Optimizer/scheduler/RNG/split state written every STATE_SAVE_EVERY epochs;
+# RESUME_TRAINING=1 (or --resume) continues an interrupted run from it
+TRAIN_STATE_PATH = training_state_path(MODEL_SAVE_PATH)
+
 # ImageNet statistics for normalization
 IMAGENET_MEAN = [0.485, 0.456, 0.406]
 IMAGENET_STD = [0.229, 0.224, 0.225]
 
+# Joins the DDP process group when started by train_distributed.py (or torchrun)
+dist_context = init_distributed()
+
 # Set device
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
+device = device_for(dist_context)
+log(f"Using device: {device}")
 
 # ====================================================================
 # DATA LOADING AND SPLIT
@@ -52,49 +90,87 @@ data_transforms = {
     ]),
 }
 
-print("\nLoading dataset and performing Train/Validation split...")
-# Ensure the ImageFolder path is correct
-full_dataset = datasets.ImageFolder(DATA_DIR, data_transforms['train'])
-
-total_size = len(full_dataset)
-val_size = int(VALIDATION_SPLIT_RATIO * total_size) # This line is now safe
-train_size = total_size - val_size
-
-train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size])
-val_dataset.dataset.transform = data_transforms['val']
+# BATCH_AUGMENT=1: the workers only decode to uint8 squares; crop, flip and
+# normalize run on whole batches on the device (see batch_augment.py)
+batch_augment = BatchAugment(mean=IMAGENET_MEAN, std=IMAGENET_STD) if BATCH_AUGMENT else None
+
+log("\nLoading dataset and performing Train/Validation split...")
+# A resumed run reuses the saved split, so no validation image moves into training
+resume_state = load_training_state(TRAIN_STATE_PATH) if RESUME_TRAINING else None
+
+if DATASET_CACHE_DIR:
+    # Pre-decoded shards from dataset_cache.py: separate datasets per split,
+    # so the train and val transforms stay independent. The cache may be on a
+    # machine without the source images, so the index is optional here.
+    data_index = DatasetIndex.load(DATASET_INDEX_PATH, DATA_DIR) if os.path.exists(DATASET_INDEX_PATH) else None
+    if not cache_is_current(DATASET_CACHE_DIR, DATA_DIR, data_index):
+        log(f"⚠️ {DATASET_CACHE_DIR} is older than {DATA_DIR}; rebuild it with dataset_cache.py build.")
+    full_dataset = CachedImageDataset(DATASET_CACHE_DIR)
+    cache_transforms = cached_transforms(full_dataset.short_side, mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    if batch_augment is not None:
+        input_transform = batch_input_transform(full_dataset.short_side, tensor_input=True)
+        cache_transforms = {'train': input_transform, 'val': input_transform}
+
+    relative_paths = [path for path, _ in full_dataset.samples]
+    split_keys = sample_keys(relative_paths, data_index)
+    train_indices, val_indices = split_indices(split_keys, full_dataset.targets, VALIDATION_SPLIT_RATIO, resume_state)
+    # Images flagged by validate_dataset.py stay in the cache but are not used
+    train_indices, val_indices = split_without_quarantined(DATA_DIR, relative_paths, train_indices, val_indices)
+
+    train_dataset = Subset(CachedImageDataset(DATASET_CACHE_DIR, cache_transforms['train']), train_indices)
+    val_dataset = Subset(CachedImageDataset(DATASET_CACHE_DIR, cache_transforms['val']), val_indices)
+else:
+    # Rank 0 builds (or refreshes) the index; the other ranks then load it
+    with main_process_first(dist_context):
+        data_index = load_dataset_index(DATA_DIR, DATASET_INDEX_PATH,
+                                        refresh=DATASET_INDEX_REFRESH and dist_context.is_main)
+    full_dataset = IndexedImageDataset(data_index)
+
+    # Keyed on content hashes: the same split every run, stable as images come and go
+    split_keys = data_index.keys()
+    train_indices, val_indices = split_indices(split_keys, data_index.labels, VALIDATION_SPLIT_RATIO, resume_state)
+    # Images flagged by validate_dataset.py are dropped after the split, as it analysed them
+    train_indices, val_indices = split_without_quarantined(DATA_DIR, data_index.paths, train_indices, val_indices)
+
+    # One dataset per split, so the val transform doesn't replace the train augmentation
+    if batch_augment is not None:
+        # Same uint8 squares for both splits; BatchAugment crops them per phase
+        input_dataset = IndexedImageDataset(data_index, batch_input_transform(), loader=load_batch_input)
+        train_dataset, val_dataset = Subset(input_dataset, train_indices), Subset(input_dataset, val_indices)
+    else:
+        train_dataset = Subset(IndexedImageDataset(data_index, data_transforms['train']), train_indices)
+        val_dataset = Subset(IndexedImageDataset(data_index, data_transforms['val']), val_indices)
 
 image_datasets = {'train': train_dataset, 'val': val_dataset}
 
 NUM_CLASSES = len(full_dataset.classes)
 CLASS_NAMES = full_dataset.classes
 
-print(f"Detected **{NUM_CLASSES}** classes dynamically: {CLASS_NAMES}")
+log(f"Detected **{NUM_CLASSES}** classes dynamically: {CLASS_NAMES}")
 
-dataloaders = {
-    'train': DataLoader(image_datasets['train'], batch_size=BATCH_SIZE, shuffle=True, num_workers=4),
-    'val': DataLoader(image_datasets['val'], batch_size=BATCH_SIZE, shuffle=False, num_workers=4)
-}
+# Sharded across processes under DDP
+dataloaders = make_dataloaders(image_datasets, MICRO_BATCH_SIZE, dist_context, num_workers=4, device=device)
 
 dataset_sizes = {x: len(image_datasets[x]) for x in ['train', 'val']}
-print(f"Training samples: {dataset_sizes['train']}, Validation samples: {dataset_sizes['val']}")
+log(f"Training samples: {dataset_sizes['train']}, Validation samples: {dataset_sizes['val']}")
 
 # ====================================================================
 # MODEL SETUP AND OPTIMIZATION (EfficientNet-B4)
 # ====================================================================
 
-print("\nInitializing EfficientNet-B4 model...")
+log("\nInitializing EfficientNet-B4 model...")
 model_ft = efficientnet_b4(weights=EfficientNet_B4_Weights.IMAGENET1K_V1)
 
 if FREEZE_LAYERS: 
     for param in model_ft.parameters():
         param.requires_grad = False
-    print("Fine-tuning: Unfreezing the final classification layer.")
+    log("Fine-tuning: Unfreezing the final classification layer.")
     for param in model_ft.classifier.parameters():
         param.requires_grad = True
 else: # This path is executed for the full fine-tuning run
     for param in model_ft.parameters():
         param.requires_grad = True
-    print("Fine-tuning: ALL layers are unfrozen for continued training.")
+    log("Fine-tuning: ALL layers are unfrozen for continued training.")
 
 
 # Replace the final fully connected layer
@@ -104,24 +180,70 @@ model_ft.classifier[-1] = nn.Linear(num_ftrs, NUM_CLASSES)
 # *** LOAD THE BEST WEIGHTS FROM PREVIOUS RUN ***
 try:
     if os.path.exists(MODEL_SAVE_PATH):
-        model_ft.load_state_dict(torch.load(MODEL_SAVE_PATH, map_location=device))
-        print(f"✅ Loaded previous best model weights ({MODEL_SAVE_PATH}) to continue training.")
+        model_ft.load_state_dict(load_weights(MODEL_SAVE_PATH, map_location=device))
+        log(f"✅ Loaded previous best model weights ({MODEL_SAVE_PATH}) to continue training.")
     else:
-        print("⚠️ Saved model not found. Starting from ImageNet pre-trained weights.")
+        log("⚠️ Saved model not found. Starting from ImageNet pre-trained weights.")
 except Exception as e:
-    print(f"❌ Error loading saved model weights: {e}")
+    log(f"❌ Error loading saved model weights: {e}")
 
 model_ft = model_ft.to(device)
 
 params_to_update = [param for param in model_ft.parameters() if param.requires_grad]
-print(f"Total trainable parameters: {sum(p.numel() for p in params_to_update):,}")
+log(f"Total trainable parameters: {sum(p.numel() for p in params_to_update):,}")
 
 # Optimizer uses the new, low LEARNING_RATE
 optimizer_ft = optim.Adam(params_to_update, lr=LEARNING_RATE)
 criterion = nn.CrossEntropyLoss() 
-exp_lr_scheduler = lr_scheduler.StepLR(optimizer_ft, step_size=7, gamma=0.1)
 
-print("Model and Optimization setup complete.")
+if ACTIVATION_CHECKPOINTING and not FREEZE_LAYERS:
+    log(f"Activation checkpointing enabled for {checkpoint_blocks(efficientnet_blocks(model_ft))} MBConv blocks.")
+
+# Autocast dtype, loss scaling and gradient accumulation (see mixed_precision.py)
+precision = MixedPrecision(TRAIN_PRECISION, device, accumulation_steps(BATCH_SIZE, MICRO_BATCH_SIZE))
+log(f"Precision: {precision.describe()} (micro-batch {MICRO_BATCH_SIZE}, effective batch {BATCH_SIZE})")
+
+# StepLR, ReduceLROnPlateau or OneCycleLR (see training_schedule.py)
+exp_lr_scheduler = LRSchedule(optimizer_ft, LR_SCHEDULE, NUM_EPOCHS,
+                              optimizer_steps_per_epoch(dataloaders['train'], precision.accumulation_steps))
+log(f"LR schedule: {exp_lr_scheduler.describe()}")
+
+log("Model and Optimization setup complete.")
+
+# ====================================================================
+# FROZEN-LAYER FEATURE CACHE (optional)
+# ====================================================================
+
+training_model = model_ft
+if FEATURE_CACHE_DIR and FREEZE_LAYERS:
+    # Same image order as full_dataset, so the split indices carry over
+    cached_train_indices, cached_val_indices = train_dataset.indices, val_dataset.indices
+    if DATASET_CACHE_DIR:
+        source_dataset = CachedImageDataset(DATASET_CACHE_DIR)
+    else:
+        # Only the images in the split: quarantined ones may not even decode
+        kept = sorted(cached_train_indices + cached_val_indices)
+        source_dataset = IndexedImageDataset(data_index.subset(kept))
+        renumbered = {position: new_position for new_position, position in enumerate(kept)}
+        cached_train_indices = [renumbered[position] for position in cached_train_indices]
+        cached_val_indices = [renumbered[position] for position in cached_val_indices]
+    frozen_prefix, training_model, prefix_names = split_frozen_model(model_ft, "efficientnet_b4")
+    # Every rank must agree on the frozen weights (and so on the cache key)
+    broadcast_module(frozen_prefix, dist_context)
+    with main_process_first(dist_context):
+        build_feature_cache(frozen_prefix, prefix_names, source_dataset, FEATURE_CACHE_DIR, device,
+                            mean=IMAGENET_MEAN, std=IMAGENET_STD)
+
+    image_datasets = {
+        'train': Subset(FeatureCacheDataset(FEATURE_CACHE_DIR, random_view=True), cached_train_indices),
+        'val': Subset(FeatureCacheDataset(FEATURE_CACHE_DIR), cached_val_indices)
+    }
+    dataloaders = make_dataloaders(image_datasets, MICRO_BATCH_SIZE, dist_context, num_workers=4, device=device)
+    # The cached features already include the augmentation views
+    batch_augment = None
+    log(f"Training {', '.join(training_model.names)} from cached features.")
+elif FEATURE_CACHE_DIR:
+    log("⚠️ FEATURE_CACHE_DIR ignored: FREEZE_LAYERS is off, so there are no frozen layers to cache.")
 
 # ====================================================================
 # PLOTTING FUNCTION
@@ -139,7 +261,7 @@ def plot_history(train_history, val_history, metric='accuracy'):
     plt.grid(True)
     plt.savefig(f'{metric}_history_finetune.png') 
     plt.close() 
-    print(f"\nSaved {metric} history plot to {metric}_history_finetune.png")
+    log(f"\nSaved {metric} history plot to {metric}_history_finetune.png")
 
 # ====================================================================
 # TRAINING LOOP
@@ -147,7 +269,8 @@ def plot_history(train_history, val_history, metric='accuracy'):
 
 def train_model(model, criterion, optimizer, scheduler, num_epochs=NUM_EPOCHS):
     since = time.time()
-    best_model_wts = copy.deepcopy(model.state_dict())
+    # Best weights are written in the background and reloaded from disk at the end
+    checkpoints = CheckpointWriter(MODEL_SAVE_PATH, device=device)
     best_acc = 0.0
 
     train_loss_history = []
@@ -155,9 +278,26 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=NUM_EPOCHS):
     train_acc_history = []
     val_acc_history = []
 
-    for epoch in range(num_epochs):
-        print(f'\nEpoch {epoch+1}/{num_epochs}')
-        print('-' * 20)
+    # Val-metric patience and wall-clock limit; either can end the run before num_epochs
+    early_stopping = EarlyStopping()
+    time_budget = TimeBudget()
+
+    start_epoch = 0
+    if resume_state is not None:
+        start_epoch, best_acc, history = restore_training_state(
+            resume_state, unwrap_model(model), optimizer, scheduler, precision, early_stopping
+        )
+        train_loss_history = history.get('train_loss', [])
+        val_loss_history = history.get('val_loss', [])
+        train_acc_history = history.get('train_acc', [])
+        val_acc_history = history.get('val_acc', [])
+
+    for epoch in range(start_epoch, num_epochs):
+        epoch_start = time.time()
+        stop_early = False
+        log(f'\nEpoch {epoch+1}/{num_epochs} (lr {current_lr(optimizer):.1e})')
+        log('-' * 20)
+        set_epoch(dataloaders['train'], epoch)
 
         for phase in ['train', 'val']:
             if phase == 'train':
@@ -165,66 +305,109 @@ def train_model(model, criterion, optimizer, scheduler, num_epochs=NUM_EPOCHS):
             else:
                 model.eval()
 
-            running_loss = 0.0
-            running_corrects = 0
+            # Loss and confusion counts stay on the device until the epoch ends
+            metrics = EpochMetrics(NUM_CLASSES, device, phase)
 
-            for inputs, labels in dataloaders[phase]:
-                inputs = inputs.to(device)
-                labels = labels.to(device)
+            optimizer.zero_grad(set_to_none=True)
+            micro_steps = len(dataloaders[phase])
+            # Evaluate without the DDP wrapper: ranks can have different numbers of val batches
+            phase_model = model if phase == 'train' else unwrap_model(model)
 
-                optimizer.zero_grad()
+            for micro_step, (inputs, labels) in enumerate(dataloaders[phase], 1):
+                inputs = inputs.to(device, non_blocking=True)
+                labels = labels.to(device, non_blocking=True)
+                if batch_augment is not None:
+                    inputs = batch_augment(inputs, train=phase == 'train')
 
-                with torch.set_grad_enabled(phase == 'train'):
-                    outputs = model(inputs)
+                stepping = phase == 'train' and precision.should_step(micro_step, micro_steps)
+
+                with torch.set_grad_enabled(phase == 'train'), gradient_sync(phase_model, stepping):
+                    with precision.autocast():
+                        outputs = phase_model(inputs)
+                        loss = criterion(outputs, labels)
                     _, preds = torch.max(outputs, 1)
-                    loss = criterion(outputs, labels)
 
                     if phase == 'train':
-                        loss.backward()
-                        optimizer.step()
+                        precision.backward(loss, micro_step, micro_steps)
+                        if stepping:
+                            precision.step(optimizer)
+                            scheduler.after_optimizer_step()
 
-                running_loss += loss.item() * inputs.size(0)
-                running_corrects += torch.sum(preds == labels.data)
+                metrics.update(loss, preds, labels)
 
             if phase == 'train':
-                scheduler.step()
+                scheduler.after_train_phase()
 
-            epoch_loss = running_loss / dataset_sizes[phase]
-            epoch_acc = running_corrects.double() / dataset_sizes[phase]
+            metrics.all_reduce()
+            summary = metrics.compute()
+            epoch_loss = summary['loss']
+            epoch_acc = summary['accuracy']
 
-            print(f'{phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            log(f'{phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            if phase == 'val':
+                print_per_class_accuracy(summary, CLASS_NAMES)
+                scheduler.after_validation(summary)
+                stop_early = early_stopping.update(summary, epoch + 1)
 
             # Record history
             if phase == 'train':
                 train_loss_history.append(epoch_loss)
-                train_acc_history.append(epoch_acc.item())
+                train_acc_history.append(epoch_acc)
             else:
                 val_loss_history.append(epoch_loss)
-                val_acc_history.append(epoch_acc.item())
+                val_acc_history.append(epoch_acc)
 
 
             # Save best model
             if phase == 'val' and epoch_acc > best_acc:
                 best_acc = epoch_acc
-                best_model_wts = copy.deepcopy(model.state_dict())
-                torch.save(best_model_wts, MODEL_SAVE_PATH)
-                print(f"New best model saved to {MODEL_SAVE_PATH} with Acc: {best_acc:.4f}")
+                if dist_context.is_main:
+                    checkpoints.save(
+                        unwrap_model(model).state_dict(), epoch + 1, CLASS_NAMES, backbone="efficientnet_b4",
+                        input_size=224, resize_size=256, mean=IMAGENET_MEAN, std=IMAGENET_STD
+                    )
+                log(f"New best model queued for {MODEL_SAVE_PATH} with Acc: {best_acc:.4f}")
+
+        # Full state for RESUME_TRAINING, written behind the next epoch like the best model
+        if dist_context.is_main and STATE_SAVE_EVERY and (epoch + 1) % STATE_SAVE_EVERY == 0:
+            checkpoints.save_state(capture_training_state(
+                epoch + 1, unwrap_model(model), optimizer, scheduler, precision, best_acc,
+                split_keys[train_indices], split_keys[val_indices],
+                history={
+                    'train_loss': train_loss_history, 'val_loss': val_loss_history,
+                    'train_acc': train_acc_history, 'val_acc': val_acc_history
+                },
+                early_stopping=early_stopping
+            ), TRAIN_STATE_PATH)
+
+        # Rank 0 decides, so every rank leaves the loop after the same epoch
+        out_of_time = not time_budget.allows_another_epoch(time.time() - epoch_start)
+        if broadcast_flag(stop_early or out_of_time, dist_context) and epoch + 1 < num_epochs:
+            reason = "early stopping" if stop_early else "time budget"
+            log(f"⏹️ Stopping after epoch {epoch+1}/{num_epochs} ({reason})")
+            break
 
     time_elapsed = time.time() - since
-    print(f'\nTraining complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s')
-    print(f'Best val Acc: {best_acc:.4f}')
-
-    model.load_state_dict(best_model_wts)
+    log(f'\nTraining complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s')
+    log(f'Best val Acc: {best_acc:.4f}')
+
+    checkpoints.close()
+    # Every rank reloads the best weights once rank 0 has written them
+    barrier(dist_context)
+    if best_acc > 0:
+        unwrap_model(model).load_state_dict(checkpoints.load_latest(map_location=device))
     return model, train_acc_history, val_acc_history, train_loss_history, val_loss_history
 
 # --- EXECUTE TRAINING ---
 if __name__ == '__main__':
-    model_ft, train_acc, val_acc, train_loss, val_loss = train_model(model_ft, criterion, optimizer_ft, exp_lr_scheduler, num_epochs=NUM_EPOCHS)
+    # The best weights end up in model_ft either way (TrainableSuffix loads into it)
+    _, train_acc, val_acc, train_loss, val_loss = train_model(wrap_model(training_model, dist_context, device), criterion, optimizer_ft, exp_lr_scheduler, num_epochs=NUM_EPOCHS)
     
     # Plotting the results
     plot_history(train_acc, val_acc, metric='accuracy')
     plot_history(train_loss, val_loss, metric='loss')
     
-    print("\n--- Training Completed ---")
-    print(f"Best model weights are saved at: {MODEL_SAVE_PATH}")
-    print("Next: Rerun the Flask API (app_cattle.py) to load the newly optimized model!")
\ No newline at end of file
+    log("\n--- Training Completed ---")
+    log(f"Best model weights are saved at: {MODEL_SAVE_PATH}")
+    log("Next: Rerun the Flask API (app_cattle.py) to load the newly optimized model!")
+    cleanup(dist_context)
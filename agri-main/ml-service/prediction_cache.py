@@ -0,0 +1,148 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", 10000))
+PREDICTION_CACHE_MAX_MB = float(os.environ.get("PREDICTION_CACHE_MAX_MB", 64))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", 3600))
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, tensor header)
+_ENTRY_OVERHEAD_BYTES = 256
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def image_digest(image_bytes):
+    """Content address of an uploaded image"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def checkpoint_identity(path):
+    """Identify a checkpoint file by location, size and modification time"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "untrained"
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+# ====================================================================
+# PREDICTION CACHE
+# ====================================================================
+
+class PredictionCache:
+    """Bounded LRU/TTL cache of per-image probabilities.
+
+    Keys are (checkpoint identity, image digest) pairs taken when a request
+    starts (see key()). Binding the cache to a different checkpoint drops
+    everything, and a put for a key whose identity is no longer the bound
+    one is ignored: a request that was in flight during a reload must not
+    store the old model's probabilities under the new checkpoint.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+                 max_mb=PREDICTION_CACHE_MAX_MB, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = float(ttl_seconds)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.identity = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def bind(self, identity):
+        """Attach the cache to a checkpoint, clearing it if the checkpoint changed"""
+        with self._lock:
+            if identity == self.identity:
+                return
+            if self.identity is not None:
+                self.invalidations += 1
+            self.identity = identity
+            self._entries.clear()
+            self._bytes = 0
+
+    def key(self, image_bytes):
+        """Cache key for an image under the currently bound checkpoint"""
+        return self.identity, image_digest(image_bytes)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        identity, digest = key
+        with self._lock:
+            entry = self._entries.get(digest) if identity == self.identity else None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, stored_at = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                self._drop(digest)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return value
+
+    def put(self, key, probabilities):
+        if not self.enabled:
+            return
+        identity, digest = key
+        # A row of a batch result is a view that would keep the whole batch alive
+        probabilities = probabilities.detach().clone()
+        size = probabilities.numel() * probabilities.element_size() + len(digest) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if identity != self.identity:
+                return
+            if digest in self._entries:
+                self._drop(digest)
+            self._entries[digest] = (probabilities, size, time.monotonic())
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "checkpoint": self.identity
+            }
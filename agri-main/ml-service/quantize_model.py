@@ -0,0 +1,199 @@
+"""Offline INT8 quantization for the crop and cattle models.
+
+Produces a TorchScript INT8 artifact from a trained checkpoint bundle and an
+accuracy-regression report against the FP32 model:
+
+    python quantize_model.py crop
+    python quantize_model.py cattle --calibration-samples 512 --report cattle_int8_report.json
+    python quantize_model.py crop --mode dynamic
+
+Static post-training quantization (FX graph mode) is calibrated on a sample of
+the training split; if it fails for a backbone, dynamic quantization of the
+Linear layers is used instead. Serve the result with SERVE_QUANTIZED=1.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import time
+import warnings
+
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from checkpoint_bundle import save_scripted
+from dataset_index import IndexedImageDataset, hash_split, load_dataset_index, split_without_quarantined
+from model_registry import MODEL_SPECS, load_trained_model, build_inference_transform
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+VALIDATION_SPLIT_RATIO = 0.2
+SPLIT_SEED = 42
+BATCH_SIZE = 32
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def build_splits(data_dir, metadata):
+    """The trainers' train/val split (from the dataset index), so the report is on held-out images"""
+    index = load_dataset_index(data_dir)
+    dataset = IndexedImageDataset(index, build_inference_transform(metadata))
+    if dataset.classes != metadata["class_names"]:
+        raise SystemExit(f"❌ Class folders in {data_dir} do not match the checkpoint's class manifest.")
+
+    train_indices, val_indices = hash_split(index.keys(), index.labels, VALIDATION_SPLIT_RATIO)
+    train_indices, val_indices = split_without_quarantined(data_dir, index.paths, train_indices, val_indices)
+    return Subset(dataset, train_indices), Subset(dataset, val_indices)
+
+def loader(dataset, num_workers):
+    return DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=num_workers)
+
+def quantize_static(model, calibration_loader):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = torch.backends.quantized.engine
+    example_inputs = (next(iter(calibration_loader))[0],)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs)
+
+    with torch.no_grad():
+        for inputs, _ in calibration_loader:
+            prepared(inputs)
+    return convert_fx(prepared)
+
+def quantize_dynamic(model):
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def evaluate(fp32_model, int8_model, val_loader, num_classes):
+    """Top-1 agreement, accuracy and per-class accuracy of both models, plus timings"""
+    agree = 0
+    total = 0
+    correct = {"fp32": torch.zeros(num_classes), "int8": torch.zeros(num_classes)}
+    per_class_total = torch.zeros(num_classes)
+    seconds = {"fp32": 0.0, "int8": 0.0}
+
+    with torch.no_grad():
+        for inputs, labels in val_loader:
+            start = time.perf_counter()
+            fp32_preds = fp32_model(inputs).argmax(1)
+            seconds["fp32"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            int8_preds = int8_model(inputs).argmax(1)
+            seconds["int8"] += time.perf_counter() - start
+
+            agree += (fp32_preds == int8_preds).sum().item()
+            total += labels.numel()
+            per_class_total += torch.bincount(labels, minlength=num_classes)
+            correct["fp32"] += torch.bincount(labels[fp32_preds == labels], minlength=num_classes)
+            correct["int8"] += torch.bincount(labels[int8_preds == labels], minlength=num_classes)
+
+    def accuracy(counts):
+        return (counts.sum() / max(total, 1)).item()
+
+    def per_class(counts):
+        return [(c / n).item() if n else None for c, n in zip(counts, per_class_total)]
+
+    return {
+        "samples": total,
+        "top1_agreement": agree / max(total, 1),
+        "fp32_accuracy": accuracy(correct["fp32"]),
+        "int8_accuracy": accuracy(correct["int8"]),
+        "fp32_per_class_accuracy": per_class(correct["fp32"]),
+        "int8_per_class_accuracy": per_class(correct["int8"]),
+        "fp32_images_per_second": total / seconds["fp32"] if seconds["fp32"] else None,
+        "int8_images_per_second": total / seconds["int8"] if seconds["int8"] else None,
+    }
+
+def print_report(report, class_names):
+    print("\n--- INT8 Accuracy Report ---")
+    print(f"Quantization: {report['quantization']}  ({report['samples']} validation images)")
+    print(f"Top-1 agreement with FP32: {report['top1_agreement']:.4f}")
+    print(f"Accuracy FP32: {report['fp32_accuracy']:.4f}  INT8: {report['int8_accuracy']:.4f}")
+    if report["fp32_images_per_second"] and report["int8_images_per_second"]:
+        speedup = report["int8_images_per_second"] / report["fp32_images_per_second"]
+        print(f"Throughput FP32: {report['fp32_images_per_second']:.1f} img/s  "
+              f"INT8: {report['int8_images_per_second']:.1f} img/s  (x{speedup:.2f})")
+    print(f"\n{'class':<40}{'fp32':>8}{'int8':>8}")
+    for name, fp32, int8 in zip(class_names, report["fp32_per_class_accuracy"], report["int8_per_class_accuracy"]):
+        fp32_text = f"{fp32:.3f}" if fp32 is not None else "-"
+        int8_text = f"{int8:.3f}" if int8 is not None else "-"
+        print(f"{name:<40}{fp32_text:>8}{int8_text:>8}")
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", choices=sorted(MODEL_SPECS.keys()))
+    parser.add_argument("--checkpoint", help="FP32 bundle (defaults to the model's checkpoint path)")
+    parser.add_argument("--data-dir", help="Labelled image folder (defaults to the model's data dir)")
+    parser.add_argument("--output", help="INT8 TorchScript artifact (defaults to the model's quantized path)")
+    parser.add_argument("--mode", choices=["auto", "static", "dynamic"], default="auto")
+    parser.add_argument("--calibration-samples", type=int, default=256)
+    parser.add_argument("--val-samples", type=int, default=0, help="Limit evaluated images (0 = whole split)")
+    parser.add_argument("--num-workers", type=int, default=2)
+    parser.add_argument("--report", help="Write the accuracy report as JSON to this path")
+    args = parser.parse_args()
+
+    spec = MODEL_SPECS[args.model]
+    checkpoint_path = args.checkpoint or spec.checkpoint_path
+    data_dir = args.data_dir or spec.data_dir
+    output_path = args.output or spec.quantized_path
+
+    torch.manual_seed(SPLIT_SEED)
+    fp32_model, metadata = load_trained_model(checkpoint_path)
+    train_split, val_split = build_splits(data_dir, metadata)
+    print(f"✅ Loaded {metadata['backbone']} with {len(metadata['class_names'])} classes "
+          f"({len(train_split)} train / {len(val_split)} val images)")
+
+    # The splits are in class order: sample them at random so every class is represented
+    calibration = Subset(train_split, torch.randperm(len(train_split))[:args.calibration_samples].tolist())
+    if args.val_samples:
+        val_split = Subset(val_split, torch.randperm(len(val_split))[:args.val_samples].tolist())
+
+    # Quantization works on a copy; the FP32 model stays the reference
+    int8_model = None
+    quantization = None
+    if args.mode in ("auto", "static"):
+        try:
+            print(f"Calibrating static INT8 on {len(calibration)} images ({torch.backends.quantized.engine})...")
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                int8_model = quantize_static(load_trained_model(checkpoint_path)[0], loader(calibration, args.num_workers))
+            quantization = "static"
+        except Exception as e:
+            if args.mode == "static":
+                raise
+            print(f"⚠️ Static quantization failed ({e}); falling back to dynamic quantization.")
+
+    if int8_model is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            int8_model = quantize_dynamic(load_trained_model(checkpoint_path)[0])
+        quantization = "dynamic"
+
+    report = evaluate(fp32_model, int8_model, loader(val_split, args.num_workers), len(metadata["class_names"]))
+    report = {"quantization": quantization, "checkpoint": checkpoint_path, **report}
+    print_report(report, metadata["class_names"])
+
+    example_inputs = next(iter(loader(calibration, 0)))[0]
+    with torch.no_grad():
+        scripted = torch.jit.trace(int8_model, example_inputs, check_trace=False)
+    save_scripted(output_path, scripted, metadata, quantization=quantization, precision="int8")
+    print(f"\n✅ INT8 model saved to {output_path}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({**report, "class_names": metadata["class_names"]}, f, indent=2)
+        print(f"📄 Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Production pre-fork runner for the ML services.
+
+The master process loads the models once, binds the listening sockets, and
+forks --workers processes that share the weights copy-on-write (on top of the
+page-cache sharing from memory-mapped checkpoints). Each worker gets its own
+share of the cores for torch's thread pools and serves every socket with a
+threaded WSGI server. Nothing runs a forward pass in the master; warm-up and
+torch.compile happen in each worker after fork.
+
+    python serve.py                      # multi-model API on :5000 (+ legacy ports)
+    python serve.py crop --workers 4     # crop service only, on :5001
+    python serve.py cattle --workers 2 --pin
+
+Signals to the master:
+  SIGTERM / SIGINT  stop accepting, let in-flight requests finish, exit
+  SIGHUP            reload the models and replace the workers one by one;
+                    an old worker is only stopped once its replacement is
+                    serving, so a bad checkpoint never costs capacity
+  SIGTTIN / SIGTTOU add / remove one worker
+
+Each worker publishes its metrics to a directory the master creates, and
+/metrics and /status on any worker report the sum over all of them (see
+metrics.MetricsPublisher). When a worker exits the master folds its last
+snapshot into one retired.json, so the directory stays at one file per live
+worker. Prometheus can scrape the service address as a single target;
+counters keep counting across worker restarts and reloads.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import gc
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+import model_registry
+from metrics import MetricsPublisher, retire_worker_metrics
+from model_registry import MODEL_SPECS, ModelRegistry, configure_thread_budget
+from server import SERVER_HOST, SERVER_PORT, SERVE_LEGACY_PORTS, create_app
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Seconds a stopping worker gets to finish in-flight requests before SIGKILL
+GRACEFUL_TIMEOUT = float(os.environ.get("GRACEFUL_TIMEOUT", 30))
+LISTEN_BACKLOG = int(os.environ.get("LISTEN_BACKLOG", 128))
+# Seconds a replacement worker gets to load, warm up and start serving during
+# a reload before it is killed and the rollout stops
+WORKER_READY_TIMEOUT = float(os.environ.get("WORKER_READY_TIMEOUT", 300))
+
+# ====================================================================
+# SOCKETS AND APPS
+# ====================================================================
+
+def bind_socket(host, port):
+    """Listening socket created in the master and inherited by every worker"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+def service_ports(service, names, port=None):
+    """Ports to listen on: one legacy service, or the multi-model API (+ legacy ports)"""
+    if service != "all":
+        return [port or MODEL_SPECS[service].legacy_port]
+    ports = [port or SERVER_PORT]
+    if SERVE_LEGACY_PORTS:
+        ports += [MODEL_SPECS[name].legacy_port for name in names]
+    return ports
+
+def build_apps(registry, service):
+    """Flask apps in the same order as service_ports()"""
+    if service != "all":
+        return [create_app(registry, legacy_model=service)]
+    apps = [create_app(registry)]
+    if SERVE_LEGACY_PORTS:
+        apps += [create_app(registry, legacy_model=name) for name in registry.names()]
+    return apps
+
+# ====================================================================
+# WORKER PROCESS
+# ====================================================================
+
+def run_worker(index, worker_count, pin, registry, apps, sockets, host, ready_fd, metrics_dir):
+    """Serve until SIGTERM, then drain in-flight requests and exit"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    for signum in (signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(signum, signal.SIG_IGN)
+
+    configure_thread_budget(worker_index=index, worker_processes=worker_count, pin=pin)
+    registry.warm_up()
+    publisher = MetricsPublisher(registry, metrics_dir)
+    publisher.start()
+
+    servers = []
+    for sock, app in zip(sockets, apps):
+        server = make_server(host, sock.getsockname()[1], app, threaded=True, fd=sock.fileno())
+        # Track request threads so server_close() waits for them on shutdown
+        server.daemon_threads = False
+        threading.Thread(target=server.serve_forever, name=f"http-{server.port}", daemon=True).start()
+        servers.append(server)
+
+    print(f"👷 Worker {index} (pid {os.getpid()}) serving", flush=True)
+    if ready_fd is not None:
+        os.write(ready_fd, b"1")
+        os.close(ready_fd)
+
+    stopping.wait()
+    for server in servers:
+        server.shutdown()
+    for server in servers:
+        server.server_close()
+    publisher.stop()
+
+# ====================================================================
+# MASTER PROCESS
+# ====================================================================
+
+class Master:
+    """Forks, watches and replaces the worker processes"""
+
+    def __init__(self, service, host, worker_count, pin, port=None):
+        self.service = service
+        self.host = host
+        self.worker_count = worker_count
+        self.pin = pin
+        self.workers = {}  # pid -> worker index
+        self.pending_signals = []
+        # Shared by the workers' metrics publishers; outlives worker restarts and reloads
+        self.metrics_dir = tempfile.mkdtemp(prefix="agri-ml-metrics-")
+
+        self.registry = self.load_registry()
+        self.apps = build_apps(self.registry, service)
+        self.sockets = [bind_socket(host, port) for port in service_ports(service, self.registry.names(), port)]
+
+    def load_registry(self):
+        # No forward passes here: the workers warm up after fork
+        registry = ModelRegistry(None if self.service == "all" else [self.service], warm_up=False)
+        # Freeze everything loaded so far so the garbage collector never
+        # writes to (and un-shares) those pages in the workers
+        gc.collect()
+        gc.freeze()
+        return registry
+
+    def spawn(self, index, wait=False):
+        """Fork one worker and return its pid.
+
+        With wait=True, return only once it is serving; if it dies or is not
+        ready within WORKER_READY_TIMEOUT it is reaped and None is returned.
+        """
+        ready_read, ready_write = os.pipe() if wait else (None, None)
+        # Anything still buffered would otherwise be printed by both processes
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            if wait:
+                os.close(ready_read)
+            status = 0
+            try:
+                run_worker(index, self.worker_count, self.pin, self.registry, self.apps,
+                           self.sockets, self.host, ready_write, self.metrics_dir)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+
+        if wait:
+            os.close(ready_write)
+            readable, _, _ = select.select([ready_read], [], [], WORKER_READY_TIMEOUT)
+            # Empty read: the worker died before it started serving
+            ready = bool(readable) and os.read(ready_read, 1) == b"1"
+            os.close(ready_read)
+            if not ready:
+                if not readable:
+                    print(f"⚠️ Worker {index} (pid {pid}) not serving after {WORKER_READY_TIMEOUT}s; killing it.")
+                    os.kill(pid, signal.SIGKILL)
+                _, status = os.waitpid(pid, 0)
+                retire_worker_metrics(self.metrics_dir, pid)
+                print(f"⚠️ Worker {index} (pid {pid}) exited with status {status} before serving.")
+                return None
+        self.workers[pid] = index
+        return pid
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    remaining.discard(pid)
+            time.sleep(0.1)
+
+        for pid in remaining:
+            print(f"⚠️ Worker pid {pid} did not stop within {GRACEFUL_TIMEOUT}s; killing it.")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        for pid in pids:
+            self.workers.pop(pid, None)
+            retire_worker_metrics(self.metrics_dir, pid)
+
+    def reload(self):
+        """Rolling restart: each old worker is stopped once its replacement is serving.
+
+        If a replacement fails to start, the rollout stops and the remaining
+        old workers keep serving; when no worker was replaced yet the
+        previous models are also kept for later restarts.
+        """
+        print("🔄 Reloading models and restarting workers...")
+        previous = (self.registry, self.apps)
+        gc.unfreeze()
+        self.registry = self.load_registry()
+        self.apps = build_apps(self.registry, self.service)
+
+        replaced = 0
+        for pid, index in list(self.workers.items()):
+            if self.spawn(index, wait=True) is None:
+                print(f"❌ Reload stopped: worker {index} could not be replaced; "
+                      f"{len(self.workers) - replaced} worker(s) still run the previous models.")
+                if not replaced:
+                    gc.unfreeze()
+                    self.registry, self.apps = previous
+                    gc.collect()
+                    gc.freeze()
+                return
+            self.stop_workers([pid])
+            replaced += 1
+        print("✅ All workers restarted")
+
+    def reap(self):
+        """Replace workers that exited on their own"""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index = self.workers.pop(pid, None)
+            retire_worker_metrics(self.metrics_dir, pid)
+            if index is not None:
+                print(f"⚠️ Worker {index} (pid {pid}) exited with status {status}; restarting it.")
+                self.spawn(index)
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, lambda signum, frame: self.pending_signals.append(signum))
+
+        for index in range(self.worker_count):
+            self.spawn(index)
+        for sock in self.sockets:
+            host, port = sock.getsockname()[:2]
+            print(f"🚀 Listening on http://{host}:{port} with {self.worker_count} worker(s)")
+
+        while True:
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    print("🛑 Shutting down: draining workers...")
+                    self.stop_workers(list(self.workers))
+                    shutil.rmtree(self.metrics_dir, ignore_errors=True)
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGTTIN:
+                    used = set(self.workers.values())
+                    self.worker_count += 1
+                    self.spawn(min(set(range(self.worker_count)) - used))
+                elif signum == signal.SIGTTOU and self.worker_count > 1:
+                    self.worker_count -= 1
+                    self.stop_workers([max(self.workers, key=self.workers.get)])
+            self.reap()
+            time.sleep(0.5)
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("service", nargs="?", default="all", choices=["all"] + sorted(MODEL_SPECS.keys()))
+    parser.add_argument("--workers", type=int, default=model_registry.WORKER_PROCESSES,
+                        help="Worker processes (default: WORKER_PROCESSES)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, help="Defaults to 5000, or the model's legacy port")
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its own cores (Linux)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("❌ serve.py needs fork(); on Windows run server.py instead.")
+
+    # The master's pools are sized as one worker's share, and only the
+    # workers pin themselves (they inherit the master's CPU affinity)
+    workers = max(1, args.workers)
+    pin = model_registry.PIN_CPU_CORES or args.pin
+    model_registry.WORKER_PROCESSES = workers
+    model_registry.PIN_CPU_CORES = False
+
+    Master(args.service, args.host, workers, pin, args.port).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+from werkzeug.serving import make_server
+
+from model_registry import ModelRegistry
+from batch_predict import predict_batch_response
+from metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+SERVER_HOST = os.environ.get("ML_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("ML_SERVER_PORT", 5000))
+# Keep serving the old per-model ports (5001 crop, 5002 cattle) from this process
+SERVE_LEGACY_PORTS = os.environ.get("SERVE_LEGACY_PORTS", "1") != "0"
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def allowed_file(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def model_not_found(name):
+    return jsonify({
+        "success": False,
+        "message": f"Unknown model '{name}'."
+    }), 404
+
+def predict_response(served):
+    if not served.loaded:
+        return jsonify({
+            "success": False,
+            "message": "Model is not loaded. Check model file path and class data."
+        }), 503
+
+    upload_start = time.perf_counter()
+    if "image" not in request.files:
+        return jsonify({
+            "success": False,
+            "message": "No image file uploaded"
+        }), 400
+
+    file = request.files["image"]
+    image_type = request.form.get('imageType', served.spec.image_type)
+
+    if file and allowed_file(file.filename):
+        try:
+            image_bytes = file.read()
+            served.metrics.observe("upload", time.perf_counter() - upload_start)
+            predicted_class, confidence = served.predict(image_bytes)
+            message, detection = served.spec.rules.build_detection(predicted_class, confidence)
+
+            with served.metrics.time("serialize"):
+                return jsonify({
+                    "success": True,
+                    "message": message,
+                    "filename": file.filename,
+                    "imageType": image_type,
+                    "detection": detection
+                })
+
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            served.metrics.count_error("prediction")
+            return jsonify({
+                "success": False,
+                "message": f"Prediction error: {str(e)}"
+            }), 500
+
+    else:
+        return jsonify({
+            "success": False,
+            "message": "Invalid file type. Only PNG, JPG, JPEG, GIF allowed."
+        }), 400
+
+def instrumented(served, route, handler):
+    """Run a route handler, recording its duration and status in the model's metrics"""
+    start = time.perf_counter()
+    response = handler()
+    status = response[1] if isinstance(response, tuple) else response.status_code
+    served.metrics.observe_request(route, status, time.perf_counter() - start)
+    return response
+
+def home_response(served):
+    return jsonify({
+        "success": True,
+        "message": f"{served.spec.display_name} Disease Detection API is running!",
+        "model_status": "Loaded" if served.loaded else "Not Loaded",
+        "classes_loaded": len(served.class_names),
+        "api_port": served.spec.legacy_port
+    })
+
+def status_response(served):
+    return jsonify({"success": True, **served.status()})
+
+# ====================================================================
+# APP FACTORY
+# ====================================================================
+
+def create_app(registry, legacy_model=None):
+    """Build a Flask app serving every model in the registry.
+
+    Models are routed by name under /models/<name>/. When `legacy_model` is
+    given, the old single-model routes (/, /predict, /predict_batch, /status)
+    are also bound to that model so existing clients keep working.
+    """
+    app = Flask(__name__)
+    CORS(app)  # ✅ Allow all origins for development
+
+    @app.route("/models", methods=["GET"])
+    def list_models():
+        return jsonify({
+            "success": True,
+            "models": {name: served.status() for name, served in registry.models.items()}
+        })
+
+    @app.route("/models/<name>/predict", methods=["POST"])
+    def model_predict(name):
+        served = registry.get(name)
+        if not served:
+            return model_not_found(name)
+        return instrumented(served, "predict", lambda: predict_response(served))
+
+    @app.route("/models/<name>/predict_batch", methods=["POST"])
+    def model_predict_batch(name):
+        served = registry.get(name)
+        if not served:
+            return model_not_found(name)
+        return instrumented(served, "predict_batch", lambda: predict_batch_response(request, served, allowed_file))
+
+    @app.route("/models/<name>/status", methods=["GET"])
+    def model_status(name):
+        served = registry.get(name)
+        return status_response(served) if served else model_not_found(name)
+
+    if legacy_model is None:
+        @app.route("/")
+        def home():
+            return jsonify({
+                "success": True,
+                "message": "Agri ML inference server is running!",
+                "models": registry.names()
+            })
+
+        @app.route("/status", methods=["GET"])
+        def status():
+            return jsonify({
+                "success": True,
+                "models": {name: served.status() for name, served in registry.models.items()}
+            })
+    else:
+        served = registry.get(legacy_model)
+
+        @app.route("/")
+        def home():
+            return home_response(served)
+
+        @app.route("/predict", methods=["POST"])
+        def predict():
+            return instrumented(served, "predict", lambda: predict_response(served))
+
+        @app.route("/predict_batch", methods=["POST"])
+        def predict_batch():
+            return instrumented(served, "predict_batch", lambda: predict_batch_response(request, served, allowed_file))
+
+        @app.route("/status", methods=["GET"])
+        def status():
+            return status_response(served)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render_prometheus(registry), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    @app.after_request
+    def after_request(response):
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+        return response
+
+    return app
+
+def serve_in_background(app, host, port):
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name=f"http-{port}", daemon=True)
+    thread.start()
+    return server
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+if __name__ == "__main__":
+    registry = ModelRegistry()
+
+    if SERVE_LEGACY_PORTS:
+        for name, served in registry.models.items():
+            serve_in_background(create_app(registry, legacy_model=name), SERVER_HOST, served.spec.legacy_port)
+            print(f"🔁 Compatibility API for '{name}' on http://{SERVER_HOST}:{served.spec.legacy_port}")
+
+    for name, served in registry.models.items():
+        print(f"📁 {name}: {'Loaded' if served.loaded else 'Not loaded'} ({len(served.class_names)} classes)")
+
+    print(f"🚀 Multi-model ML API starting on http://{SERVER_HOST}:{SERVER_PORT}")
+    make_server(SERVER_HOST, SERVER_PORT, create_app(registry), threaded=True).serve_forever()
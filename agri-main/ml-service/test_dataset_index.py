@@ -0,0 +1,76 @@
+"""Tests for the stratified hash split in dataset_index.py.
+
+    python -m pytest test_dataset_index.py
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import math
+
+import numpy as np
+
+from dataset_index import hash_split
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+VAL_RATIO = 0.2
+
+# Images per class: a large class, a small one and a singleton
+CLASS_SIZES = [200, 3, 1]
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def dataset(class_sizes, seed=0):
+    """(keys, labels) with random content-hash keys"""
+    rng = np.random.default_rng(seed)
+    labels = np.repeat(np.arange(len(class_sizes)), class_sizes)
+    keys = rng.integers(0, 2 ** 63, size=len(labels), dtype=np.int64).astype(np.uint64) * np.uint64(2)
+    return keys, labels
+
+def val_keys(keys, labels):
+    _, val_indices = hash_split(keys, labels, VAL_RATIO)
+    return set(keys[val_indices].tolist())
+
+# ====================================================================
+# TESTS
+# ====================================================================
+
+def test_every_class_gets_its_share_of_val():
+    keys, labels = dataset(CLASS_SIZES)
+    train_indices, val_indices = hash_split(keys, labels, VAL_RATIO)
+    assert sorted(train_indices + val_indices) == list(range(len(keys)))
+    val_counts = np.bincount(labels[val_indices], minlength=len(CLASS_SIZES)).tolist()
+    assert val_counts == [math.ceil(VAL_RATIO * 200), 1, 0]
+
+def test_three_image_class_gets_a_val_image():
+    keys, labels = dataset([3])
+    _, val_indices = hash_split(keys, labels, VAL_RATIO)
+    assert len(val_indices) == 1
+
+def test_split_is_deterministic():
+    keys, labels = dataset(CLASS_SIZES)
+    assert hash_split(keys, labels, VAL_RATIO) == hash_split(keys, labels, VAL_RATIO)
+    assert hash_split(keys, labels, VAL_RATIO, seed="other") != hash_split(keys, labels, VAL_RATIO)
+
+def test_adding_an_image_moves_at_most_one_other():
+    keys, labels = dataset(CLASS_SIZES)
+    before = val_keys(keys, labels)
+    for extra in range(20):
+        added_key = np.uint64(2 * extra + 1)  # odd, so never equal to an existing key
+        grown_keys = np.append(keys, added_key)
+        grown_labels = np.append(labels, 0)
+        after = val_keys(grown_keys, grown_labels) - {int(added_key)}
+        assert len(before ^ after) <= 1
+
+def test_identical_files_share_a_side():
+    keys, labels = dataset([50])
+    keys = np.concatenate([keys, keys])
+    labels = np.concatenate([labels, labels])
+    train_indices, val_indices = hash_split(keys, labels, VAL_RATIO)
+    assert set(keys[train_indices].tolist()).isdisjoint(keys[val_indices].tolist())
@@ -0,0 +1,99 @@
+"""Tests for the cross-worker metrics aggregation in metrics.py.
+
+    python -m pytest test_metrics.py
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+from metrics import ModelMetrics, MetricsPublisher, collect, retire_worker_metrics
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+MODEL_NAME = "crop"
+REQUESTS_PER_WORKER = 5
+WORKER_RESTARTS = 12
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def served_model():
+    """The parts of a ServedModel that metrics.served_state reads"""
+    cache_stats = {"hits": 1, "misses": 2, "entries": 3, "bytes": 4}
+    return SimpleNamespace(
+        metrics=ModelMetrics(MODEL_NAME),
+        cache=SimpleNamespace(stats=lambda: cache_stats),
+        scheduler=SimpleNamespace(queue_depth=lambda: 0),
+        loaded=True,
+    )
+
+def run_worker(directory):
+    """A serve.py worker in miniature: serve a few requests, publish, stop"""
+    registry = SimpleNamespace(models={MODEL_NAME: served_model()})
+    for _ in range(REQUESTS_PER_WORKER):
+        registry.models[MODEL_NAME].metrics.observe_request("predict", 200, 0.01)
+    publisher = MetricsPublisher(registry, directory, interval=3600)
+    publisher.start()
+    publisher.stop()
+
+def requests_served(served_models):
+    model_metrics, gauges = collect(served_models)[MODEL_NAME]
+    return sum(model_metrics.requests.values()), gauges["cache_hits"]
+
+@pytest.fixture
+def scraper(tmp_path):
+    """A live worker in this process whose /metrics view is collect()"""
+    registry = SimpleNamespace(models={MODEL_NAME: served_model()})
+    publisher = MetricsPublisher(registry, str(tmp_path), interval=3600)
+    publisher.start()
+    yield registry.models
+    publisher.stop()
+    metrics._publisher = None
+
+# ====================================================================
+# TESTS
+# ====================================================================
+
+def test_restarted_workers_keep_counters_and_a_bounded_directory(tmp_path, scraper):
+    context = multiprocessing.get_context("fork")
+    previous = requests_served(scraper)
+    for restart in range(WORKER_RESTARTS):
+        worker = context.Process(target=run_worker, args=(str(tmp_path),))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+
+        unfolded = requests_served(scraper)
+        assert unfolded[0] == previous[0] + REQUESTS_PER_WORKER
+
+        # What the serve.py master does when it reaps the worker
+        retire_worker_metrics(str(tmp_path), worker.pid)
+        folded = requests_served(scraper)
+        assert folded == unfolded
+        assert folded[0] == (restart + 1) * REQUESTS_PER_WORKER
+        # This process's own file plus retired.json, however many workers came and went
+        assert len(os.listdir(tmp_path)) == 2
+        previous = folded
+
+def test_a_folded_worker_read_before_the_fold_is_not_counted_twice(tmp_path, scraper):
+    worker = multiprocessing.get_context("fork").Process(target=run_worker, args=(str(tmp_path),))
+    worker.start()
+    worker.join()
+    name = next(name for name in os.listdir(tmp_path) if name.startswith(f"worker-{worker.pid}-"))
+    stale_copy = (tmp_path / name).read_text()
+
+    retire_worker_metrics(str(tmp_path), worker.pid)
+    # A scrape that read the worker's file just before the fold, then retired.json after it
+    (tmp_path / name).write_text(stale_copy)
+    assert requests_served(scraper)[0] == REQUESTS_PER_WORKER
@@ -0,0 +1,49 @@
+"""Parity tests for preprocessing.FastPreprocessor against the torchvision pipeline.
+
+    python -m pytest test_preprocessing.py
+
+The serving default (JPEG_DRAFT off) must reproduce Resize(256) /
+CenterCrop(224) / ToTensor / Normalize to float rounding; DCT-scaled
+decoding is only required to stay close.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import pytest
+
+from benchmark_preprocessing import EXACT_TOLERANCE, synthetic_photo, torchvision_pipeline
+from preprocessing import FastPreprocessor
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# (width, height, format): landscape, portrait, already at the resize size, PNG
+TEST_IMAGES = [(1600, 1200, "JPEG"), (900, 1600, "JPEG"), (256, 341, "JPEG"), (640, 480, "PNG")]
+
+# Mean absolute difference allowed for DCT-scaled decoding (normalized units)
+DRAFT_TOLERANCE = 0.05
+
+# ====================================================================
+# TESTS
+# ====================================================================
+
+@pytest.fixture(scope="module")
+def reference():
+    return torchvision_pipeline()
+
+@pytest.mark.parametrize("width, height, image_format", TEST_IMAGES)
+def test_fast_path_matches_torchvision(reference, width, height, image_format):
+    image_bytes = synthetic_photo(width, height, image_format)
+    fast = FastPreprocessor(draft=False)(image_bytes)
+    expected = reference(image_bytes)
+    assert fast.shape == expected.shape == (3, 224, 224)
+    assert (fast - expected).abs().max().item() <= EXACT_TOLERANCE
+
+@pytest.mark.parametrize("width, height, image_format", TEST_IMAGES)
+def test_draft_decoding_stays_close(reference, width, height, image_format):
+    image_bytes = synthetic_photo(width, height, image_format)
+    draft = FastPreprocessor(draft=True)(image_bytes)
+    assert (draft - reference(image_bytes)).abs().mean().item() <= DRAFT_TOLERANCE
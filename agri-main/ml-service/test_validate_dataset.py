@@ -0,0 +1,72 @@
+"""Tests for the near-duplicate search in validate_dataset.py.
+
+    python -m pytest test_validate_dataset.py
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import numpy as np
+import pytest
+
+import validate_dataset
+from validate_dataset import near_duplicate_groups, popcount64
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+IMAGES = 3000
+
+# Small enough that the clustered hashes below overflow it in every band
+MAX_BUCKET = 32
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def clustered_hashes(seed=0):
+    """dHashes where most images share their low 40 bits, plus flipped-bit near copies"""
+    rng = np.random.default_rng(seed)
+    high = rng.integers(0, 1 << 24, size=IMAGES, dtype=np.uint64) << np.uint64(40)
+    low = rng.choice(rng.integers(0, 1 << 40, size=4, dtype=np.uint64), size=IMAGES)
+    hashes = high | low
+    # Near copies of the first 300 images, 1 to 6 bits flipped
+    copies = hashes[:300].copy()
+    for position in range(len(copies)):
+        for bit in rng.choice(64, size=rng.integers(1, 7), replace=False):
+            copies[position] ^= np.uint64(1) << np.uint64(bit)
+    return np.concatenate([hashes, copies, hashes[:20]])
+
+def brute_force_groups(hashes, threshold):
+    unique = np.unique(hashes)
+    pairs = set()
+    for a in range(len(unique)):
+        distances = popcount64(unique[a] ^ unique[a + 1:])
+        for offset in np.flatnonzero(distances <= threshold).tolist():
+            pairs.add((int(unique[a]), int(unique[a + 1 + offset])))
+    return pairs
+
+def found_pairs(hashes, groups):
+    pairs = set()
+    for positions, distance in groups:
+        values = sorted({int(hashes[position]) for position in positions})
+        if distance:
+            pairs.add(tuple(values))
+    return pairs
+
+# ====================================================================
+# TESTS
+# ====================================================================
+
+@pytest.mark.parametrize("threshold", [2, 4])
+def test_oversized_buckets_keep_every_pair(monkeypatch, threshold):
+    monkeypatch.setattr(validate_dataset, "MAX_BUCKET", MAX_BUCKET)
+    hashes = clustered_hashes()
+    groups = near_duplicate_groups(hashes, threshold)
+    assert found_pairs(hashes, groups) == brute_force_groups(hashes, threshold)
+
+def test_identical_hashes_form_one_group():
+    hashes = np.array([5, 5, 5, (1 << 64) - 1], dtype=np.uint64)
+    assert near_duplicate_groups(hashes, 4) == [([0, 1, 2], 0)]
@@ -0,0 +1,99 @@
+"""Launch a trainer as N data-parallel processes (DDP over gloo).
+
+One host, 4 processes sharing its cores:
+
+    python train_distributed.py crop --nproc 4
+
+Two hosts with 8 processes each; run on every host with its own --node-rank:
+
+    python train_distributed.py cattle --nnodes 2 --node-rank 0 --nproc 8 --master-addr 10.0.0.1
+    python train_distributed.py cattle --nnodes 2 --node-rank 1 --nproc 8 --master-addr 10.0.0.1
+
+Every host needs the code, the dataset (or dataset/feature caches) at the
+same paths and the trainer's environment variables. Rank 0 prints progress
+and writes the checkpoint. This is a thin wrapper over torchrun; it also
+gives every process an equal share of the host's cores (torchrun alone
+defaults OMP_NUM_THREADS to 1). See distributed_training.py for what the
+trainers do in each process.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import os
+import subprocess
+import sys
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+TRAINERS = {
+    "crop": "model_trainer.py",
+    "cattle": "model_trainer_cattle.py",
+}
+
+MASTER_PORT = int(os.environ.get("MASTER_PORT", 29500))
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+def torchrun_command(script, nproc, nnodes=1, node_rank=0, master_addr="127.0.0.1", master_port=MASTER_PORT,
+                     script_args=()):
+    command = [
+        sys.executable, "-m", "torch.distributed.run",
+        f"--nproc-per-node={nproc}",
+        f"--nnodes={nnodes}",
+        f"--node-rank={node_rank}",
+        f"--master-addr={master_addr}",
+        f"--master-port={master_port}",
+    ]
+    if nnodes == 1:
+        # Isolated single-host rendezvous: no clash with other jobs on the same port
+        command.append("--standalone")
+        command = [part for part in command if not part.startswith(("--master-", "--node-rank"))]
+    return command + [script, *script_args]
+
+def process_environment(nproc, pin):
+    env = dict(os.environ)
+    env["OMP_NUM_THREADS"] = str(max(1, available_cores() // nproc))
+    env["DIST_BACKEND"] = env.get("DIST_BACKEND", "gloo")
+    if pin:
+        env["DDP_PIN_CORES"] = "1"
+    return env
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trainer", choices=sorted(TRAINERS), help="Which trainer to run")
+    parser.add_argument("--nproc", type=int, default=2, help="Processes on this host")
+    parser.add_argument("--nnodes", type=int, default=1, help="Hosts taking part")
+    parser.add_argument("--node-rank", type=int, default=0, help="This host's index (0 hosts the rendezvous)")
+    parser.add_argument("--master-addr", default="127.0.0.1", help="Address of the node-rank 0 host")
+    parser.add_argument("--master-port", type=int, default=MASTER_PORT)
+    parser.add_argument("--pin", action="store_true", help="Pin each process to its own cores (Linux)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the trainer's saved training state")
+    args = parser.parse_args()
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), TRAINERS[args.trainer])
+    command = torchrun_command(script, args.nproc, args.nnodes, args.node_rank,
+                               args.master_addr, args.master_port, ["--resume"] if args.resume else [])
+    env = process_environment(args.nproc, args.pin)
+
+    print(f"🚀 {args.trainer} trainer: {args.nproc} process(es) on this host x {args.nnodes} host(s), "
+          f"{env['OMP_NUM_THREADS']} threads each")
+    sys.exit(subprocess.call(command, env=env))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""On-device metric accumulation for the training loops.
+
+Calling loss.item() or summing correct predictions into a Python number on
+every batch forces the host to wait for the GPU each time. EpochMetrics keeps
+the loss sum and a confusion matrix on the training device and copies them to
+the host once per epoch, or every TRAIN_LOG_INTERVAL batches when progress
+logging is on. The correct-prediction and per-class counts come from the
+confusion matrix, accumulated with fixed-shape ops so update() never syncs.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+
+import torch
+import torch.distributed as dist
+
+from distributed_training import log
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Print running loss/accuracy every N batches (0: only at the end of each epoch)
+TRAIN_LOG_INTERVAL = int(os.environ.get("TRAIN_LOG_INTERVAL", 0))
+
+# ====================================================================
+# ACCUMULATOR
+# ====================================================================
+
+class EpochMetrics:
+    """Loss sum, sample count and confusion counts for one phase of one epoch"""
+
+    def __init__(self, num_classes, device, phase="train", log_interval=TRAIN_LOG_INTERVAL):
+        self.num_classes = num_classes
+        self.phase = phase
+        self.log_interval = log_interval
+        self.loss_sum = torch.zeros((), dtype=torch.float64, device=device)
+        # confusion[true, predicted]
+        self.confusion = torch.zeros(num_classes * num_classes, dtype=torch.int64, device=device)
+        self.samples = 0
+        self.batches = 0
+
+    def update(self, loss, preds, labels):
+        """Add one batch; loss is the batch mean, as CrossEntropyLoss returns it"""
+        count = labels.size(0)
+        self.loss_sum += loss.detach().double() * count
+        # index_add_ has a fixed output shape; bincount sizes its output from
+        # the data and would read max() back to the host every batch
+        ones = torch.ones_like(labels, dtype=self.confusion.dtype)
+        self.confusion.index_add_(0, labels * self.num_classes + preds, ones)
+        self.samples += count
+        self.batches += 1
+
+        if self.log_interval and self.batches % self.log_interval == 0:
+            summary = self.compute()
+            log(f"  [{self.phase} {self.batches}] Loss: {summary['loss']:.4f} Acc: {summary['accuracy']:.4f}")
+
+    def all_reduce(self):
+        """Sum the counters over every rank of the process group (no-op outside DDP)"""
+        if not (dist.is_available() and dist.is_initialized()):
+            return
+        samples = torch.tensor([self.samples], dtype=torch.int64, device=self.confusion.device)
+        for tensor in (self.loss_sum, self.confusion, samples):
+            dist.all_reduce(tensor)
+        self.samples = int(samples.item())
+
+    def compute(self):
+        """Copy the counters to the host (the only sync) and derive the metrics"""
+        loss_sum = self.loss_sum.item()
+        confusion = self.confusion.view(self.num_classes, self.num_classes).cpu()
+        per_class_total = confusion.sum(dim=1)
+        per_class_correct = confusion.diagonal()
+        samples = max(self.samples, 1)
+        return {
+            "loss": loss_sum / samples,
+            "accuracy": per_class_correct.sum().item() / samples,
+            "per_class_accuracy": [
+                correct / total if total else None
+                for correct, total in zip(per_class_correct.tolist(), per_class_total.tolist())
+            ],
+            "per_class_samples": per_class_total.tolist(),
+            "confusion": confusion.tolist(),
+            "samples": self.samples,
+        }
+
+def print_per_class_accuracy(summary, class_names):
+    """One line per class with samples in this phase"""
+    for name, accuracy, samples in zip(class_names, summary["per_class_accuracy"], summary["per_class_samples"]):
+        if samples:
+            log(f"    {name}: {accuracy:.4f} ({samples} images)")
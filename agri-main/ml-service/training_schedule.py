@@ -0,0 +1,181 @@
+"""Learning-rate schedules, early stopping and a time budget for the trainers.
+
+LR_SCHEDULE:
+  step      StepLR: multiply the LR by LR_GAMMA every LR_STEP_SIZE epochs (default,
+            the trainers' original 7 / 0.1)
+  plateau   ReduceLROnPlateau on EARLY_STOP_METRIC: multiply the LR by LR_GAMMA
+            after PLATEAU_PATIENCE epochs without improvement
+  onecycle  OneCycleLR stepped after every optimizer step; LEARNING_RATE is the
+            peak, reached after the first 30% of the run
+
+EARLY_STOP_PATIENCE > 0 stops training once EARLY_STOP_METRIC (val_loss or
+val_acc) has not improved by more than EARLY_STOP_MIN_DELTA for that many
+epochs. TRAIN_TIME_BUDGET_MIN > 0 stops before an epoch that would end past
+the budget, judged by the longest epoch so far. The best weights are saved
+on val accuracy as before, whichever condition ends the run.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import math
+import os
+import time
+
+from torch.optim import lr_scheduler
+
+from distributed_training import log
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+LR_SCHEDULE = os.environ.get("LR_SCHEDULE", "step")
+LR_SCHEDULES = ("step", "plateau", "onecycle")
+LR_STEP_SIZE = int(os.environ.get("LR_STEP_SIZE", 7))
+LR_GAMMA = float(os.environ.get("LR_GAMMA", 0.1))
+PLATEAU_PATIENCE = int(os.environ.get("PLATEAU_PATIENCE", 2))
+
+# Early stopping (0 disables it)
+EARLY_STOP_METRIC = os.environ.get("EARLY_STOP_METRIC", "val_loss")
+EARLY_STOP_PATIENCE = int(os.environ.get("EARLY_STOP_PATIENCE", 0))
+EARLY_STOP_MIN_DELTA = float(os.environ.get("EARLY_STOP_MIN_DELTA", 0.0))
+
+# Wall-clock limit for the training loop in minutes (0: none)
+TRAIN_TIME_BUDGET_MIN = float(os.environ.get("TRAIN_TIME_BUDGET_MIN", 0))
+
+# Metric name -> (key in the EpochMetrics summary, direction)
+MONITORED_METRICS = {
+    "val_loss": ("loss", "min"),
+    "val_acc": ("accuracy", "max"),
+}
+
+# ====================================================================
+# LEARNING-RATE SCHEDULE
+# ====================================================================
+
+def current_lr(optimizer):
+    return optimizer.param_groups[0]["lr"]
+
+class LRSchedule:
+    """One of LR_SCHEDULES behind the three points where the training loop can step it"""
+
+    def __init__(self, optimizer, schedule=LR_SCHEDULE, epochs=1, steps_per_epoch=1, metric=EARLY_STOP_METRIC):
+        if schedule not in LR_SCHEDULES:
+            raise ValueError(f"LR_SCHEDULE must be one of {', '.join(LR_SCHEDULES)}, got '{schedule}'")
+        if metric not in MONITORED_METRICS:
+            raise ValueError(f"EARLY_STOP_METRIC must be one of {', '.join(MONITORED_METRICS)}, got '{metric}'")
+        self.optimizer = optimizer
+        self.schedule = schedule
+        self.key, mode = MONITORED_METRICS[metric]
+        self.metric = metric
+
+        if schedule == "step":
+            self.scheduler = lr_scheduler.StepLR(optimizer, step_size=LR_STEP_SIZE, gamma=LR_GAMMA)
+        elif schedule == "plateau":
+            self.scheduler = lr_scheduler.ReduceLROnPlateau(
+                optimizer, mode=mode, factor=LR_GAMMA, patience=PLATEAU_PATIENCE
+            )
+        else:
+            self.max_lr = current_lr(optimizer)
+            self.total_steps = epochs * steps_per_epoch
+            self.scheduler = lr_scheduler.OneCycleLR(optimizer, max_lr=self.max_lr, total_steps=self.total_steps)
+
+    def after_optimizer_step(self):
+        # OneCycleLR raises past total_steps, e.g. when a resumed run has more batches
+        if self.schedule == "onecycle" and self.scheduler.last_epoch < self.total_steps:
+            self.scheduler.step()
+
+    def after_train_phase(self):
+        if self.schedule == "step":
+            self.scheduler.step()
+
+    def after_validation(self, summary):
+        if self.schedule == "plateau":
+            self.scheduler.step(summary[self.key])
+
+    def state_dict(self):
+        return self.scheduler.state_dict()
+
+    def load_state_dict(self, state_dict):
+        self.scheduler.load_state_dict(state_dict)
+
+    def describe(self):
+        if self.schedule == "step":
+            return f"StepLR (x{LR_GAMMA} every {LR_STEP_SIZE} epochs)"
+        if self.schedule == "plateau":
+            return f"ReduceLROnPlateau on {self.metric} (x{LR_GAMMA} after {PLATEAU_PATIENCE} flat epochs)"
+        return f"OneCycleLR (peak {self.max_lr:.1e} over {self.total_steps} steps)"
+
+# ====================================================================
+# STOPPING CONDITIONS
+# ====================================================================
+
+class EarlyStopping:
+    """Counts epochs since the monitored validation metric last improved"""
+
+    def __init__(self, metric=EARLY_STOP_METRIC, patience=EARLY_STOP_PATIENCE, min_delta=EARLY_STOP_MIN_DELTA):
+        if metric not in MONITORED_METRICS:
+            raise ValueError(f"EARLY_STOP_METRIC must be one of {', '.join(MONITORED_METRICS)}, got '{metric}'")
+        self.metric = metric
+        self.key, self.mode = MONITORED_METRICS[metric]
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.best_epoch = 0
+        self.bad_epochs = 0
+
+    @property
+    def enabled(self):
+        return self.patience > 0
+
+    def update(self, summary, epoch):
+        """Record the val summary of `epoch` (1-based); True once training should stop"""
+        value = summary[self.key]
+        if self.best is None:
+            improved = True
+        elif self.mode == "min":
+            improved = value < self.best - self.min_delta
+        else:
+            improved = value > self.best + self.min_delta
+
+        if improved:
+            self.best, self.best_epoch, self.bad_epochs = value, epoch, 0
+        else:
+            self.bad_epochs += 1
+        if self.enabled:
+            status = "improved" if improved else f"no improvement for {self.bad_epochs}/{self.patience} epoch(s)"
+            log(f"Early stopping: {self.metric} {value:.4f}, {status} (best {self.best:.4f} at epoch {self.best_epoch})")
+        return self.enabled and self.bad_epochs >= self.patience
+
+    def state_dict(self):
+        return {"best": self.best, "best_epoch": self.best_epoch, "bad_epochs": self.bad_epochs}
+
+    def load_state_dict(self, state_dict):
+        self.best = state_dict["best"]
+        self.best_epoch = state_dict["best_epoch"]
+        self.bad_epochs = state_dict["bad_epochs"]
+
+class TimeBudget:
+    """Stops before an epoch that would not finish within `minutes` of the start (0: no limit)"""
+
+    def __init__(self, minutes=TRAIN_TIME_BUDGET_MIN):
+        self.seconds = minutes * 60
+        self.start = time.time()
+        self.longest_epoch = 0.0
+
+    def allows_another_epoch(self, epoch_seconds):
+        """Record the epoch that just took epoch_seconds; False when the next one would overrun"""
+        self.longest_epoch = max(self.longest_epoch, epoch_seconds)
+        if not self.seconds:
+            return True
+        elapsed = time.time() - self.start
+        if elapsed + self.longest_epoch <= self.seconds:
+            return True
+        log(f"Time budget: {elapsed / 60:.1f} of {self.seconds / 60:.1f} min used and epochs take up to "
+              f"{self.longest_epoch / 60:.1f} min; stopping here.")
+        return False
+
+def optimizer_steps_per_epoch(dataloader, accumulation_steps):
+    return math.ceil(len(dataloader) / accumulation_steps)
@@ -0,0 +1,144 @@
+"""Resumable training: full-state checkpoints for the trainers.
+
+The best-model bundle only holds weights. Restarting from it loses the Adam
+moments, the LR schedule position, the epoch counter and the GradScaler,
+so every restart re-warms the optimizer.
+
+Every STATE_SAVE_EVERY epochs the trainers queue a state checkpoint next
+to MODEL_SAVE_PATH (<name>_state.pth). It holds the current weights,
+optimizer, scheduler, scaler, best accuracy, early-stopping counters,
+metric history, the train/val split and the RNG states (torch, CUDA,
+Python, NumPy). With RESUME_TRAINING=1 (or --resume) a trainer reloads all
+of it and continues with the next epoch.
+
+The split is saved as the images' split keys (content hashes), not as
+positions, so it survives images being added or removed. On resume every
+image keeps its saved side; images added since are split by the usual rule
+(dataset_index.hash_split), and removed ones are simply gone.
+
+Under DDP only rank 0's RNG state is saved. On resume every rank restores
+it; the DistributedSampler order only depends on the epoch.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import os
+import random
+import sys
+
+import numpy as np
+
+import torch
+
+from checkpoint_bundle import derived_artifact_path
+from dataset_index import hash_split
+from distributed_training import log
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+STATE_FORMAT = "agri-ml-training-state"
+STATE_VERSION = 2
+
+RESUME_TRAINING = os.environ.get("RESUME_TRAINING", "0") == "1" or "--resume" in sys.argv[1:]
+
+# Write the full training state every N epochs (0 disables it)
+STATE_SAVE_EVERY = int(os.environ.get("STATE_SAVE_EVERY", 1))
+
+# ====================================================================
+# HELPER FUNCTIONS
+# ====================================================================
+
+def training_state_path(model_save_path):
+    return derived_artifact_path(model_save_path, "_state.pth")
+
+def capture_rng_state():
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+    }
+
+def restore_rng_state(rng):
+    torch.set_rng_state(rng["torch"])
+    if rng["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng["cuda"])
+    random.setstate(rng["python"])
+    np.random.set_state(rng["numpy"])
+
+def load_training_state(path):
+    """The saved state, or None (with a warning) when there is nothing to resume from"""
+    if not os.path.exists(path):
+        log(f"⚠️ No training state at {path}; starting a new run.")
+        return None
+    # Not weights_only: the state holds Python and NumPy RNG states. Only
+    # resume from state files this trainer wrote.
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    if state.get("format") != STATE_FORMAT or state.get("version") != STATE_VERSION:
+        raise SystemExit(f"❌ {path} is not a version {STATE_VERSION} training state")
+    log(f"🔄 Resuming from {path} after epoch {state['epoch']} (best val Acc: {state['best_acc']:.4f})")
+    return state
+
+def split_indices(keys, labels, val_ratio, resume_state=None):
+    """(train_indices, val_indices) over keys: the saved sides when resuming, else the index-derived split"""
+    train_indices, val_indices = hash_split(keys, labels, val_ratio)
+    if resume_state is None:
+        return train_indices, val_indices
+
+    # A key saved on the train side stays in training, so nothing trained on moves into val
+    keys = np.asarray(keys, dtype=np.uint64)
+    split = resume_state["split"]
+    saved_train = np.isin(keys, split["train_keys"])
+    saved_val = np.isin(keys, split["val_keys"]) & ~saved_train
+    added = ~(saved_train | saved_val)
+    is_val = saved_val.copy()
+    is_val[val_indices] |= added[val_indices]
+
+    missing = len(split["train_keys"]) + len(split["val_keys"]) - int((saved_train | saved_val).sum())
+    if added.any() or missing > 0:
+        log(f"🔀 Kept the saved train/val split; {int(added.sum())} image(s) not in it were split by the index "
+              f"rule, {max(missing, 0)} saved image(s) are no longer present")
+    return np.flatnonzero(~is_val).tolist(), np.flatnonzero(is_val).tolist()
+
+# ====================================================================
+# SAVE / RESTORE
+# ====================================================================
+
+def capture_training_state(epoch, model, optimizer, scheduler, precision, best_acc, train_keys, val_keys,
+                           history=None, early_stopping=None):
+    """Everything needed to continue after `epoch` (1-based, completed).
+
+    train_keys and val_keys are the split keys of the images on each side.
+    """
+    return {
+        "format": STATE_FORMAT,
+        "version": STATE_VERSION,
+        "epoch": epoch,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "scaler": precision.scaler.state_dict(),
+        "best_acc": float(best_acc),
+        "history": history or {},
+        "early_stopping": early_stopping.state_dict() if early_stopping is not None else None,
+        "split": {
+            "train_keys": np.asarray(train_keys, dtype=np.uint64),
+            "val_keys": np.asarray(val_keys, dtype=np.uint64),
+        },
+        "rng": capture_rng_state(),
+    }
+
+def restore_training_state(state, model, optimizer, scheduler, precision, early_stopping=None):
+    """Load a captured state into the live objects; returns (start_epoch, best_acc, history)"""
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    scheduler.load_state_dict(state["scheduler"])
+    precision.scaler.load_state_dict(state["scaler"])
+    if early_stopping is not None and state.get("early_stopping"):
+        early_stopping.load_state_dict(state["early_stopping"])
+    restore_rng_state(state["rng"])
+    return state["epoch"], state["best_acc"], state["history"]
@@ -0,0 +1,298 @@
+"""Validate a class-folder dataset before training and quarantine bad images.
+
+    python validate_dataset.py plant_disease_data
+    python validate_dataset.py livestock_data --workers 16 --near-threshold 3
+
+Every image is decoded in a pool of worker processes (JPEGs at a reduced
+DCT scale, which still reads the whole compressed stream), so corrupt or
+truncated files show up here instead of as a DataLoader crash mid-epoch.
+Each image's color mode is recorded (CMYK, RGBA, palette and grayscale
+images are normalized by preprocessing.to_rgb at load time) and a 64-bit
+difference hash (dHash) is computed for near-duplicate search. Exact
+duplicates come from the content hashes in the dataset index
+(dataset_index.py), which is refreshed first.
+
+Writes <data_dir>.validation.json (the full report) and
+<data_dir>.quarantine.txt, which the trainers and quantize_model.py honor.
+The quarantine list holds:
+
+  - images that fail to decode
+  - every copy of an image (exact or near duplicate) found in more than one
+    class: its label is ambiguous
+  - extra exact copies within a class (the first copy is kept)
+  - the validation-side copies of near duplicates that straddle the
+    train/val split, which would otherwise leak training images into
+    validation
+
+The quarantine file is rewritten on every run. Other near duplicates within
+a class are only reported.
+"""
+
+# ====================================================================
+# IMPORTS
+# ====================================================================
+
+import argparse
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+from dataset_index import dataset_index_path, hash_split, quarantine_path, update_index
+from preprocessing import to_rgb
+
+# ====================================================================
+# CONFIGURATION
+# ====================================================================
+
+# Max differing dHash bits for two images to count as near duplicates
+NEAR_THRESHOLD = 4
+
+# Matches the trainers' VALIDATION_SPLIT_RATIO
+VAL_RATIO = 0.2
+
+# Hash buckets up to this size are compared pair by pair; larger ones are
+# split further on more hash bits
+MAX_BUCKET = 2048
+
+DHASH_SIZE = 8
+
+# ====================================================================
+# WORKER: DECODE ONE IMAGE
+# ====================================================================
+
+def inspect_image(path):
+    """(mode, format, width, height, dhash, error) for one image file"""
+    try:
+        with Image.open(path) as image:
+            mode, image_format, (width, height) = image.mode, image.format, image.size
+            if image_format == "JPEG":
+                # Decodes every scanline at 1/8 scale; truncation still raises
+                image.draft(image.mode, (DHASH_SIZE * 4, DHASH_SIZE * 4))
+            image.load()
+            gray = to_rgb(image).convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR)
+    except Exception as e:
+        return None, None, 0, 0, 0, f"{type(e).__name__}: {e}"
+
+    # dHash: is each pixel brighter than its right-hand neighbor
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    dhash = int(np.packbits(bits).view(">u8")[0])
+    return mode, image_format, width, height, dhash, None
+
+# ====================================================================
+# DUPLICATE SEARCH
+# ====================================================================
+
+def popcount64(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def add_close_pairs(pairs, candidates, values, left, right, threshold):
+    """Record the (left, right) candidate pairs that are at most threshold bits apart"""
+    distances = popcount64(values[left] ^ values[right])
+    close = distances <= threshold
+    left, right = candidates[left[close]].tolist(), candidates[right[close]].tolist()
+    for a, b, distance in zip(left, right, distances[close].tolist()):
+        pairs[min(a, b), max(a, b)] = distance
+
+def band_search(unique, candidates, free_bits, threshold, pairs):
+    """Add to pairs every pair of candidates within threshold bits.
+
+    The candidates agree on every bit outside free_bits, so two within
+    threshold bits agree exactly on at least one of threshold + 1 bands of
+    the free bits; only candidates sharing a band value are compared. A
+    bucket larger than MAX_BUCKET is searched again on its remaining free
+    bits, so no pair is ever skipped.
+    """
+    # Bits every candidate shares cannot tell them apart; leave them out of the bands
+    values = unique[candidates]
+    varying = int(np.bitwise_or.reduce(values ^ values[0]))
+    free_bits = np.array([bit for bit in free_bits.tolist() if varying >> bit & 1], dtype=np.int64)
+
+    if len(candidates) <= MAX_BUCKET or len(free_bits) <= threshold:
+        # Few enough to compare directly, or any two are within threshold anyway
+        left, right = np.triu_indices(len(candidates), 1)
+        add_close_pairs(pairs, candidates, values, left, right, threshold)
+        return
+
+    for band in np.array_split(free_bits, threshold + 1):
+        mask = np.uint64(sum(1 << int(bit) for bit in band))
+        band_values = values & mask
+        order = np.argsort(band_values, kind="stable")
+        ordered = band_values[order]
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(ordered)) + 1, [len(ordered)]])
+        sizes = np.diff(bounds)
+
+        oversized = sizes > MAX_BUCKET
+        remaining = np.setdiff1d(free_bits, band)
+        for begin, size in zip(bounds[:-1][oversized].tolist(), sizes[oversized].tolist()):
+            band_search(unique, candidates[order[begin:begin + size]], remaining, threshold, pairs)
+
+        # The other buckets all at once: sorted, so equal values `offset` apart
+        # bound a run of equal values
+        small = np.repeat(~oversized, sizes)
+        for offset in range(1, int(sizes[~oversized].max(initial=1))):
+            same = (ordered[offset:] == ordered[:-offset]) & small[offset:]
+            if not same.any():
+                break
+            add_close_pairs(pairs, candidates, values, order[:-offset][same], order[offset:][same], threshold)
+
+def near_duplicate_groups(hashes, threshold=NEAR_THRESHOLD):
+    """[(positions, differing bits)] for 64-bit hashes at most threshold bits apart.
+
+    Positions with identical hashes form one group (0 bits); each pair of
+    distinct hashes within the threshold gives a group of both hashes'
+    positions. Groups are not merged transitively, so a chain of small
+    differences never joins unrelated images. The search (band_search) finds
+    every such pair however many images share a hash band.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    members = defaultdict(list)
+    for position, group in enumerate(inverse.tolist()):
+        members[group].append(position)
+
+    # The band search runs over distinct values
+    unique_pairs = {}
+    band_search(unique, np.arange(len(unique)), np.arange(64), threshold, unique_pairs)
+
+    groups = [(positions, 0) for positions in members.values() if len(positions) > 1]
+    for (a, b), distance in sorted(unique_pairs.items()):
+        groups.append((sorted(members[a] + members[b]), distance))
+    return groups
+
+# ====================================================================
+# VALIDATION
+# ====================================================================
+
+def validate(data_dir, workers=None, near_threshold=NEAR_THRESHOLD, val_ratio=VAL_RATIO):
+    """Scan data_dir; returns (report, quarantine) with quarantine as {relative path: reason}"""
+    workers = workers or os.cpu_count()
+    index = update_index(data_dir, dataset_index_path(data_dir), workers)
+    paths = [os.path.join(data_dir, path) for path in index.paths]
+
+    print(f"Decoding {len(paths)} images with {workers} worker(s)...")
+    start = time.time()
+    results = []
+    with Pool(workers) as pool:
+        for count, result in enumerate(pool.imap(inspect_image, paths, chunksize=64), 1):
+            results.append(result)
+            if count % 10000 == 0:
+                print(f"  {count}/{len(paths)} images ({count / (time.time() - start):.0f} img/s)")
+    decode_seconds = time.time() - start
+
+    quarantine = {}
+    unreadable = []
+    readable = []
+    for position, (mode, _, _, _, _, error) in enumerate(results):
+        if error is None:
+            readable.append(position)
+        else:
+            unreadable.append({"path": index.paths[position], "error": error})
+            quarantine[index.paths[position]] = f"unreadable ({error})"
+
+    # Exact duplicates by content hash, near duplicates by dHash among decodable images
+    content = defaultdict(list)
+    for position in range(len(index)):
+        content[index.hashes[position].tobytes()].append(position)
+    exact_groups = [positions for positions in content.values() if len(positions) > 1]
+    dhashes = np.array([results[position][4] for position in readable], dtype=np.uint64)
+    near_groups = []
+    for members, distance in near_duplicate_groups(dhashes, near_threshold):
+        members = [readable[member] for member in members]
+        # Byte-identical files are already an exact group
+        if len({index.hashes[position].tobytes() for position in members}) > 1:
+            near_groups.append((members, distance))
+
+    _, val_indices = hash_split(index.keys(), index.labels, val_ratio)
+    is_val = np.zeros(len(index), dtype=bool)
+    is_val[val_indices] = True
+
+    groups = []
+    for kind, members, distance in ([("exact", members, 0) for members in exact_groups]
+                                    + [("near", members, distance) for members, distance in near_groups]):
+        member_paths = [index.paths[position] for position in members]
+        classes = sorted({index.class_names[index.labels[position]] for position in members})
+        crosses_split = bool(0 < is_val[members].sum() < len(members))
+        groups.append({"kind": kind, "distance": distance, "paths": member_paths, "classes": classes,
+                       "crosses_split": crosses_split})
+
+        if len(classes) > 1:
+            for path in member_paths:
+                quarantine.setdefault(path, f"{kind} duplicate across classes {', '.join(classes)}")
+        elif kind == "exact":
+            for path in member_paths[1:]:
+                quarantine.setdefault(path, f"exact duplicate of {member_paths[0]}")
+        elif crosses_split:
+            kept = next(position for position in members if not is_val[position])
+            for position in members:
+                if is_val[position]:
+                    quarantine.setdefault(index.paths[position],
+                                          f"near duplicate of training image {index.paths[kept]}")
+
+    modes = Counter(mode for mode, *_ in results if mode is not None)
+    report = {
+        "data_dir": os.path.abspath(data_dir),
+        "images": len(index),
+        "classes": index.class_names,
+        "workers": workers,
+        "decode_seconds": round(decode_seconds, 2),
+        "images_per_sec": round(len(paths) / max(decode_seconds, 1e-9), 1),
+        "modes": dict(modes),
+        "formats": dict(Counter(image_format for _, image_format, *_ in results if image_format is not None)),
+        "non_rgb": [
+            {"path": index.paths[position], "mode": results[position][0]}
+            for position in readable if results[position][0] != "RGB"
+        ],
+        "unreadable": unreadable,
+        "near_threshold": near_threshold,
+        "duplicate_groups": groups,
+        "quarantine": [{"path": path, "reason": reason} for path, reason in sorted(quarantine.items())],
+    }
+    return report, quarantine
+
+def write_quarantine(path, quarantine):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Written by validate_dataset.py; rewritten on every run. <relative path><TAB><reason>\n")
+        for image_path, reason in sorted(quarantine.items()):
+            f.write(f"{image_path}\t{reason}\n")
+
+# ====================================================================
+# MAIN ENTRY POINT
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_dir", help="Training folder whose sub-folders are the classes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Decoding processes")
+    parser.add_argument("--near-threshold", type=int, default=NEAR_THRESHOLD,
+                        help="Max differing dHash bits for near duplicates")
+    parser.add_argument("--val-ratio", type=float, default=VAL_RATIO, help="The trainers' validation ratio")
+    parser.add_argument("--report", help="Report path (default: <data_dir>.validation.json)")
+    args = parser.parse_args()
+
+    report, quarantine = validate(args.data_dir, args.workers, args.near_threshold, args.val_ratio)
+    report_path = args.report or os.path.normpath(args.data_dir) + ".validation.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    write_quarantine(quarantine_path(args.data_dir), quarantine)
+
+    groups = report["duplicate_groups"]
+    print(f"\n--- Dataset Validation: {report['images']} images ({report['images_per_sec']:.0f} img/s decoding) ---")
+    print(f"Color modes: {', '.join(f'{mode} {count}' for mode, count in sorted(report['modes'].items()))}")
+    print(f"Unreadable: {len(report['unreadable'])}")
+    print(f"Duplicate groups: {sum(group['kind'] == 'exact' for group in groups)} exact, "
+          f"{sum(group['kind'] == 'near' for group in groups)} near; "
+          f"{sum(len(group['classes']) > 1 for group in groups)} across classes, "
+          f"{sum(group['crosses_split'] for group in groups)} across the train/val split")
+    print(f"🚫 Quarantined {len(quarantine)} image(s) in {quarantine_path(args.data_dir)}")
+    print(f"✅ Report written to {report_path}")
+
+if __name__ == "__main__":
+    main()